@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Measure how long MAD takes to start, that is, to run 'python -m mad
+--version' and to parse a model for the first time, with parser tables
+either built from scratch ('cold') or loaded from the cache, once
+compiled ('warm').
+
+The same measures are taken on a baseline revision, extracted from git
+(the last commit by default), and the benchmark fails if the working
+tree is slower than this baseline, beyond the given tolerance. Note
+that building parser tables ('cold' first parse) takes longer as the
+grammar grows.
+
+    $> python benchmarks/startup.py [<runs>] [<mad-file>] [--baseline=<revision>] [--tolerance=<ratio>]
+"""
+
+from io import BytesIO
+from os import environ, remove
+from os.path import abspath, dirname, exists, join
+from statistics import median
+from subprocess import check_output
+from sys import argv, executable, exit
+from tarfile import open as open_tar
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+DEFAULT_MODEL = join(ROOT, "samples", "client_server.mad")
+DEFAULT_BASELINE = "HEAD"
+DEFAULT_TOLERANCE = 0.1
+
+FIRST_PARSE = "from time import perf_counter\n" \
+              "start = perf_counter()\n" \
+              "from mad.storage import FileSystem\n" \
+              "from mad.parsing import Parser\n" \
+              "Parser(FileSystem(), {model!r}).parse()\n" \
+              "print(perf_counter() - start)\n"
+
+# Older revisions write their parser tables next to the sources
+GENERATED_TABLES = [join("mad", "parsetab.py"), join("mad", "parser.out")]
+
+
+def environment(root, cache):
+    variables = dict(environ)
+    variables["MAD_CACHE_DIR"] = cache
+    variables["PYTHONPATH"] = root + ":" + variables.get("PYTHONPATH", "")
+    # Compiled modules are cached, as they are once MAD is installed
+    variables.pop("PYTHONDONTWRITEBYTECODE", None)
+    return variables
+
+
+def clear(root):
+    for each_table in GENERATED_TABLES:
+        if exists(join(root, each_table)):
+            remove(join(root, each_table))
+
+
+def version(root, cache):
+    start = perf_counter()
+    check_output([executable, "-m", "mad", "--version"], env=environment(root, cache), cwd=root)
+    return perf_counter() - start
+
+
+def first_parse(root, cache, model):
+    output = check_output([executable, "-c", FIRST_PARSE.format(model=model)], env=environment(root, cache), cwd=root)
+    return float(output)
+
+
+def measure(roots, runs, model):
+    """
+    The median timings of each root directory, whose runs alternate, so
+    that both suffer alike from the load of the machine
+    """
+    for each_root in roots:
+        version(each_root, each_root) # Compile the modules once for all
+    results = [{} for _ in roots]
+    for (name, run) in [("--version", version), ("first parse", lambda root, cache: first_parse(root, cache, model))]:
+        timings = [([], []) for _ in roots]
+        for _ in range(runs):
+            for (each_root, (cold, warm)) in zip(roots, timings):
+                clear(each_root)
+                with TemporaryDirectory() as cache:
+                    cold.append(run(each_root, cache))
+                    run(each_root, cache) # Compile the cached tables, as Python does with any module
+                    warm.append(run(each_root, cache))
+        for (each_result, (cold, warm)) in zip(results, timings):
+            each_result[name] = (median(cold), median(warm))
+    return results
+
+
+def extract(revision, directory):
+    archive = check_output(["git", "archive", "--format=tar", revision, "mad"], cwd=ROOT)
+    with open_tar(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    return directory
+
+
+def regressions(current, baseline, tolerance):
+    return [(name, kind, now, then)
+            for (name, timings) in current.items()
+            for (kind, now, then) in zip(("cold", "warm"), timings, baseline[name])
+            if now > then * (1 + tolerance)]
+
+
+def show(current, baseline):
+    print("{:<12s} {:>10s} {:>10s} {:>14s} {:>14s}".format("", "cold (ms)", "warm (ms)", "baseline cold", "baseline warm"))
+    for (name, (cold, warm)) in current.items():
+        (baseline_cold, baseline_warm) = baseline[name]
+        print("{:<12s} {:>10.1f} {:>10.1f} {:>14.1f} {:>14.1f}".format(
+            name, 1000 * cold, 1000 * warm, 1000 * baseline_cold, 1000 * baseline_warm))
+
+
+if __name__ == "__main__":
+    options = dict(each[2:].partition("=")[::2] for each in argv[1:] if each.startswith("--"))
+    positional = [each for each in argv[1:] if not each.startswith("--")]
+    runs = int(positional[0]) if len(positional) > 0 else 10
+    model = abspath(positional[1]) if len(positional) > 1 else DEFAULT_MODEL
+    tolerance = float(options.get("tolerance", DEFAULT_TOLERANCE))
+    with TemporaryDirectory() as directory:
+        baseline_root = extract(options.get("baseline", DEFAULT_BASELINE), directory)
+        (current, baseline) = measure([ROOT, baseline_root], runs, model)
+    show(current, baseline)
+    slower = regressions(current, baseline, tolerance)
+    for (name, kind, now, then) in slower:
+        print("'{:s}' ({:s}) is slower than the baseline: {:.1f} ms instead of {:.1f} ms".format(
+            name, kind, 1000 * now, 1000 * then))
+    exit(1 if slower else 0)
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from math import ceil
+from multiprocessing import Pool
+from re import compile
+
+from mad.log import BinaryTrace
+from mad.simulation.monitoring import MISSING_VALUE
+from mad.statistics import Accumulator, QuantileSketch
+
+
+ANY_OPERATION = "*"
+
+
+class ServiceSummary:
+    """
+    Summarise the metrics reported by one entity, one monitoring period
+    at a time. The monitor reports running values (counts and response
+    times since the start of the run), so the summary only needs the
+    latest period, but for the response time quantiles and maximum,
+    which cover each period: the summary gives the highest p95 and the
+    highest maximum over all periods, and the time above SLO, which
+    accumulates the periods whose p95 exceeds it.
+    """
+
+    THROUGHPUT = "throughput"
+    ARRIVAL_RATE = "arrival rate"
+    REJECTION_RATE = "rejection rate"
+    RELIABILITY = "reliability"
+    RESPONSE_TIME = "response time"
+    TAIL_RESPONSE_TIME = "response time p95"
+    MAXIMUM_RESPONSE_TIME = "response time max"
+    WINDOW_START = "window start"
+
+    def __init__(self, slo=None):
+        self.slo = slo
+        self.start = 0
+        self.end = 0
+        self.period = 0
+        self.latest = {}
+        self.worst_tail = None
+        self.maximum = None
+        self.time_above_slo = 0
+
+    def add_period(self, end, values):
+        start = values.get(self.WINDOW_START)
+        self.period = end - (self.end if start is None else start)
+        self.end = end
+        self.latest = values
+        tail = values.get(self.TAIL_RESPONSE_TIME)
+        if tail is not None and (self.worst_tail is None or tail > self.worst_tail):
+            self.worst_tail = tail
+        maximum = values.get(self.MAXIMUM_RESPONSE_TIME)
+        if maximum is not None and (self.maximum is None or maximum > self.maximum):
+            self.maximum = maximum
+        if self.slo is not None and tail is not None and tail > self.slo:
+            self.time_above_slo += self.period
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def _rate(self, count):
+        if count is None or self.duration <= 0:
+            return None
+        return count / self.duration
+
+    def _count(self, rate):
+        if rate is None:
+            return None
+        return rate * self.period
+
+    def metrics(self):
+        duration = self.duration
+        yield "throughput", self._rate(self.latest.get(self.THROUGHPUT))
+        yield "arrival rate", self._rate(self._count(self.latest.get(self.ARRIVAL_RATE)))
+        yield "rejection rate", self._rate(self._count(self.latest.get(self.REJECTION_RATE)))
+        yield "reliability", self.latest.get(self.RELIABILITY)
+        yield "response time", self.latest.get(self.RESPONSE_TIME)
+        yield "response time p95", self.worst_tail
+        yield "response time max", self.maximum
+        if self.slo is not None:
+            yield "time above SLO", self.time_above_slo
+            yield "fraction above SLO", self.time_above_slo / duration if duration > 0 else None
+
+
+class OperationSummary:
+    """
+    Summarise the requests sent to one operation, as observed by their
+    senders in the trace
+    """
+
+    QUANTILES = [("response time p50", 0.50), ("response time p90", 0.90), ("response time p99", 0.99)]
+
+    def __init__(self, slo=None):
+        self.slo = slo
+        self.requests = 0
+        self.rejections = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.above_slo = 0
+        self.response_times = Accumulator()
+        self.quantiles = QuantileSketch()
+
+    def sent(self):
+        self.requests += 1
+
+    def succeeded(self, response_time):
+        self.response_times.add(response_time)
+        self.quantiles.add(response_time)
+        if self.slo is not None and response_time > self.slo:
+            self.above_slo += 1
+
+    def rejected(self):
+        self.rejections += 1
+
+    def failed(self):
+        self.failures += 1
+
+    def timed_out(self):
+        self.timeouts += 1
+
+    def metrics(self, duration):
+        successes = self.response_times.count
+        complete = successes + self.rejections + self.failures + self.timeouts
+        yield "requests", self.requests
+        yield "throughput", successes / duration if duration > 0 else None
+        yield "reliability", successes / complete if complete > 0 else None
+        yield "rejection rate", self.rejections / self.requests if self.requests > 0 else None
+        yield "response time", self.response_times.mean
+        for (name, quantile) in self.QUANTILES:
+            yield name, self.quantiles.quantile(quantile)
+        yield "response time max", self.response_times.maximum
+        if self.slo is not None:
+            yield "fraction above SLO", self.above_slo / successes if successes > 0 else None
+
+
+class RunAnalysis:
+    """
+    Summarise one output directory in a single pass over its consolidated
+    report and its trace. Only the pending requests are kept in memory,
+    so the size of the outputs does not matter.
+    """
+
+    METRICS = "metrics.csv"
+    TEXT_TRACE = "trace.log"
+    BINARY_TRACE = "trace.bin"
+    PATH = "{directory:s}/{file:s}"
+
+    TRACE_LINE = compile(r"^\s*(\d+)\s+(\S+)\s+(.*)$")
+    SENT = compile(r"^Req\. (\d+) sent to (\S+)::(\S+)$")
+    OUTCOME = compile(r"^Req\. (\d+) (successful|failed!|rejected!|timeout!)$")
+
+    def __init__(self, file_system, directory, slo=None):
+        self.file_system = file_system
+        self.directory = directory
+        self.slo = slo
+        self.services = {}
+        self.operations = {}
+        self._pending = {}
+        self._last_event = 0
+
+    def _path(self, file):
+        return self.PATH.format(directory=self.directory, file=file)
+
+    def rows(self):
+        rows = self.service_rows()
+        self._read_trace()
+        duration = max([self._last_event] + [each.duration for each in self.services.values()])
+        for ((service, operation), summary) in sorted(self.operations.items()):
+            for (metric, value) in summary.metrics(duration):
+                rows.append((self.directory, service, operation, metric, value))
+        return rows
+
+    def service_rows(self):
+        """
+        Summarise the consolidated report only, without reading the trace
+        """
+        self._read_metrics()
+        rows = []
+        for (entity, summary) in sorted(self.services.items()):
+            for (metric, value) in summary.metrics():
+                rows.append((self.directory, entity, ANY_OPERATION, metric, value))
+        return rows
+
+    def _read_metrics(self):
+        location = self._path(self.METRICS)
+        if not self.file_system.exists(location):
+            return
+        period, values = None, {}
+        with self.file_system.open_input_stream(location) as source:
+            next(source, None)
+            for each_line in source:
+                (time, entity, metric, value) = [each.strip() for each in each_line.split(",")]
+                if (entity, time) != period:
+                    self._close_period(period, values)
+                    period, values = (entity, time), {}
+                values[metric] = None if value == MISSING_VALUE else float(value)
+        self._close_period(period, values)
+
+    def _close_period(self, period, values):
+        if period is None:
+            return
+        (entity, time) = period
+        if entity not in self.services:
+            self.services[entity] = ServiceSummary(self.slo)
+        self.services[entity].add_period(int(time), values)
+
+    def _read_trace(self):
+        for (time, message) in self._events():
+            self._last_event = time
+            match = self.SENT.match(message)
+            if match:
+                (request, service, operation) = match.groups()
+                key = (service, operation)
+                if key not in self.operations:
+                    self.operations[key] = OperationSummary(self.slo)
+                self.operations[key].sent()
+                self._pending[int(request)] = (key, time)
+                continue
+            match = self.OUTCOME.match(message)
+            if match and int(match.group(1)) in self._pending:
+                (key, sent_at) = self._pending.pop(int(match.group(1)))
+                self._record(self.operations[key], match.group(2), time - sent_at)
+
+    @staticmethod
+    def _record(summary, outcome, response_time):
+        if outcome == "successful":
+            summary.succeeded(response_time)
+        elif outcome == "rejected!":
+            summary.rejected()
+        elif outcome == "timeout!":
+            summary.timed_out()
+        else:
+            summary.failed()
+
+    def _events(self):
+        text = self._path(self.TEXT_TRACE)
+        binary = self._path(self.BINARY_TRACE)
+        if self.file_system.exists(text):
+            with self.file_system.open_input_stream(text) as source:
+                for each_line in source:
+                    match = self.TRACE_LINE.match(each_line)
+                    if match:
+                        yield int(match.group(1)), match.group(3).strip()
+        elif self.file_system.exists(binary):
+            with self.file_system.open_binary_input_stream(binary) as source:
+                for each_event in BinaryTrace(source):
+                    yield each_event.time, each_event.message
+
+
+def analyse_run(task):
+    (file_system, directory, slo) = task
+    return RunAnalysis(file_system, directory, slo).rows()
+
+
+def analyse(file_system, directories, slo=None, jobs=1):
+    """
+    Summarise the given output directories, in parallel when more than
+    one job is allowed
+    """
+    tasks = [(file_system, each_directory, slo) for each_directory in directories]
+    if jobs == 1 or len(tasks) == 1:
+        results = map(analyse_run, tasks)
+    else:
+        with Pool(min(jobs, len(tasks))) as pool:
+            results = pool.map(analyse_run, tasks)
+    return [each_row for each_result in results for each_row in each_result]
+
+
+class ReplicationSummary:
+    """
+    Merge the summaries of independent replications of the same run into
+    the mean of each metric, along with its confidence interval. Metrics
+    that some replications miss are averaged over the others. Antithetic
+    replications come in pairs, and each pair counts as one observation,
+    namely the average of its two replications. When given the response
+    time sketches of each replication, it also merges them, entity by
+    entity, into the quantiles of all the requests of all replications.
+    """
+
+    DEFAULT_LEVEL = 0.95
+    POOLED_QUANTILES = [("pooled response time p50", 0.50), ("pooled response time p90", 0.90),
+                        ("pooled response time p95", 0.95), ("pooled response time p99", 0.99)]
+
+    def __init__(self, level=DEFAULT_LEVEL, antithetic=False):
+        self.level = level
+        self.antithetic = antithetic
+        self._metrics = {}
+        self._samples = {}
+        self._observations = 0
+        self._first_of_pair = None
+        self._sketches = {}
+        self._pooled = {}
+
+    def add(self, rows, sketches=None):
+        for (entity, sketch) in (sketches or {}).items():
+            if entity not in self._sketches:
+                self._sketches[entity] = QuantileSketch(sketch.accuracy, sketch.bucket_limit)
+                self._pooled[entity] = 0
+            self._sketches[entity].merge(sketch)
+            self._pooled[entity] += 1
+        if self.antithetic:
+            if self._first_of_pair is None:
+                self._first_of_pair = rows
+                return
+            (rows, self._first_of_pair) = (self._average(self._first_of_pair, rows), None)
+        for (_, entity, operation, metric, value) in rows:
+            key = (entity, operation, metric)
+            if key not in self._metrics:
+                self._metrics[key] = Accumulator()
+                self._samples[key] = {}
+            if value is not None:
+                self._metrics[key].add(value)
+                self._samples[key][self._observations] = value
+        self._observations += 1
+
+    @staticmethod
+    def _average(first, second):
+        """
+        Average the rows of two replications, metric by metric
+        """
+        values = {}
+        for (_, entity, operation, metric, value) in first + second:
+            values.setdefault((entity, operation, metric), [])
+            if value is not None:
+                values[(entity, operation, metric)].append(value)
+        return [(None, entity, operation, metric, sum(each) / len(each) if each else None)
+                for ((entity, operation, metric), each) in sorted(values.items())]
+
+    def values_of(self, entity, metric, operation=ANY_OPERATION):
+        """
+        The accumulated values of the given metric, or None if no
+        replication reported it
+        """
+        return self._metrics.get((entity, operation, metric))
+
+    def pooled_quantile(self, entity, q):
+        """
+        The given quantile of the response times of the given entity, over
+        all replications, or None if none reported them
+        """
+        sketch = self._sketches.get(entity)
+        return None if sketch is None else sketch.quantile(q)
+
+    def rows(self):
+        rows = []
+        for ((entity, operation, metric), values) in self._metrics.items():
+            (mean, half_width) = (values.mean, values.half_width(self.level))
+            (lower, upper) = (None, None) if half_width is None else (mean - half_width, mean + half_width)
+            rows.append((entity, operation, metric, values.count, mean, values.standard_deviation, lower, upper))
+        for (entity, count) in self._pooled.items():
+            for (metric, quantile) in self.POOLED_QUANTILES:
+                rows.append((entity, ANY_OPERATION, metric, count, self.pooled_quantile(entity, quantile), None, None, None))
+        yield from sorted(rows, key=lambda row: row[:3])
+
+    def differences_from(self, baseline):
+        """
+        The mean difference between each metric and the same metric in the
+        given baseline, along with its confidence interval. Replications
+        are paired by rank, as those of the same rank share their seed and
+        thus their random numbers.
+        """
+        for key in sorted(self._samples.keys() & baseline._samples.keys()):
+            (samples, references) = (self._samples[key], baseline._samples[key])
+            differences = Accumulator()
+            for rank in sorted(samples.keys() & references.keys()):
+                differences.add(samples[rank] - references[rank])
+            (mean, half_width) = (differences.mean, differences.half_width(self.level))
+            (lower, upper) = (None, None) if half_width is None else (mean - half_width, mean + half_width)
+            yield key + (differences.count, mean, lower, upper)
+
+
+class StoppingRule:
+    """
+    Decide how many more replications are needed, so that the confidence
+    interval on the mean of each target metric is narrower than a given
+    fraction of that mean, within a budget of replications. The estimate
+    assumes the half-width decreases with the square root of the number
+    of replications, but at most doubles the replications at each round.
+    """
+
+    MINIMUM_REPLICATIONS = 5
+
+    def __init__(self, targets, precision, budget):
+        self.targets = targets
+        self.precision = precision
+        self.budget = budget
+
+    def relative_half_width(self, summary, entity, metric):
+        values = summary.values_of(entity, metric)
+        if values is None:
+            return None
+        half_width = values.half_width(summary.level)
+        if half_width is None:
+            return None
+        if half_width == 0:
+            return 0.
+        if values.mean == 0:
+            return float("inf")
+        return half_width / abs(values.mean)
+
+    def widest(self, summary):
+        """
+        The target whose relative half-width is the widest, along with this
+        half-width, which is None if it is not known yet
+        """
+        widths = [((entity, metric), self.relative_half_width(summary, entity, metric))
+                  for (entity, metric) in self.targets]
+        for (target, width) in widths:
+            if width is None:
+                return target, None
+        return max(widths, key=lambda each: each[1])
+
+    def is_met(self, summary):
+        (_, width) = self.widest(summary)
+        return width is not None and width <= self.precision
+
+    def next_count(self, summary, count):
+        """
+        The number of replications to run next, given the ones already run
+        """
+        if count == 0:
+            return min(self.MINIMUM_REPLICATIONS, self.budget)
+        if count >= self.budget or self.is_met(summary):
+            return 0
+        (_, width) = self.widest(summary)
+        if width is None or width == float("inf"):
+            needed = 2 * count
+        else:
+            needed = ceil(count * (width / self.precision) ** 2)
+        return min(max(needed - count, 1), count, self.budget - count)
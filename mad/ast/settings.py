@@ -95,13 +95,58 @@ class Autoscaling(Expression):
         return "Autoscaling(%1$d, %2$s)" % (self.period, str(self.limits))
 
 
+class Tracing(Expression):
+    """
+    Configuration of the simulation trace: its level of detail, the
+    services (or operations, as in 'DB/Select') that are included or
+    excluded, and the probability that a client request gets traced.
+    """
+
+    OFF = "off"
+    REQUESTS = "requests"
+    TASKS = "tasks"
+    ALL = "all"
+    LEVELS = (OFF, REQUESTS, TASKS, ALL)
+
+    def __init__(self, level=ALL, include=(), exclude=(), sampling=1.0):
+        super().__init__()
+        if level not in self.LEVELS:
+            raise ValueError("Expecting trace level in %s, but found '%s'" % (", ".join(self.LEVELS), str(level)))
+        self.level = level
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        if not 0 < sampling <= 1:
+            raise ValueError("Expecting sampling probability in ]0, 1], but found '%s'" % str(sampling))
+        self.sampling = sampling
+
+    @property
+    def is_enabled(self):
+        return self.level != self.OFF
+
+    def overridden_by(self, settings):
+        """
+        A copy of this tracing, where the given settings (e.g., {'sampling': 0.5})
+        replace the current ones
+        """
+        current = {"level": self.level, "include": self.include, "exclude": self.exclude, "sampling": self.sampling}
+        return Tracing(**dict(current, **settings))
+
+    def accept(self, evaluation):
+        return evaluation.of_tracing(self)
+
+    def __repr__(self):
+        return "Tracing(%s, include=%s, exclude=%s, sampling=%s)" % \
+               (self.level, str(self.include), str(self.exclude), str(self.sampling))
+
+
 class Settings(Expression):
 
-    def __init__(self, queue=None, autoscaling=None, throttling=None):
+    def __init__(self, queue=None, autoscaling=None, throttling=None, tracing=None):
         super().__init__()
         self.queue = queue or FIFO()
         self.autoscaling = autoscaling or Autoscaling()
         self.throttling = throttling or NoThrottlingSettings()
+        self.tracing = tracing
 
     def accept(self, evaluation):
         return evaluation.of_settings(self)
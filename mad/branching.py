@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from json import load
+from re import match
+
+from mad.simulation.reconfiguration import Reconfiguration, InvalidReconfiguration
+
+
+class Branching:
+    """
+    Variants of a run that share the same prefix, up to a given time, and
+    then each apply their own reconfiguration. Branches are read from a
+    JSON document such as:
+
+        {"at": 5000,
+         "branches": {"baseline": [],
+                      "scale-up": [{"service": "DB", "workers": 4}],
+                      "burst": [{"client": "Browser", "burst": 50, "at": 6000}]}}
+
+    where changes happen at the branching time, unless they say otherwise.
+    """
+
+    NAME = r"^[A-Za-z0-9_\-]+$"
+
+    @classmethod
+    def load(cls, source):
+        try:
+            document = load(source)
+        except ValueError as error:
+            raise InvalidReconfiguration("Invalid JSON ({!s})".format(error))
+        if not isinstance(document, dict) or not isinstance(document.get("branches"), dict):
+            raise InvalidReconfiguration("Expecting an object with 'at' and 'branches'")
+        time = document.get("at")
+        if not isinstance(time, int) or time <= 0:
+            raise InvalidReconfiguration("Expecting a strictly positive integer time 'at' (found '{!s}')".format(time))
+        branches = [(name, Reconfiguration.from_json(entries, time)) for (name, entries) in document["branches"].items()]
+        return cls(time, branches)
+
+    def __init__(self, time, branches):
+        if not branches:
+            raise InvalidReconfiguration("Expecting at least one branch")
+        for (name, reconfiguration) in branches:
+            if not match(self.NAME, name):
+                raise InvalidReconfiguration("Invalid branch name '{!s}' (expecting letters, digits, '-' or '_')".format(name))
+            if any(each_time < time for (each_time, _) in reconfiguration.changes):
+                raise InvalidReconfiguration("Branch '{!s}' changes the model before time {:d}".format(name, time))
+        self.time = time
+        self.branches = branches
+
+    def check(self, simulation):
+        for (_, each_reconfiguration) in self.branches:
+            each_reconfiguration.check(simulation)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from os import environ
+from os.path import expanduser, join
+from sys import platform
+
+
+CACHE_VARIABLE = "MAD_CACHE_DIR"
+
+
+def user_cache_directory():
+    """
+    The directory where MAD caches data from one run to the next, that is
+    $MAD_CACHE_DIR if set, or a 'mad' directory in the user cache
+    """
+    if environ.get(CACHE_VARIABLE):
+        return environ[CACHE_VARIABLE]
+    if platform.startswith("win"):
+        base = environ.get("LOCALAPPDATA", expanduser("~"))
+    elif platform == "darwin":
+        base = expanduser("~/Library/Caches")
+    else:
+        base = environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    return join(base, "mad")
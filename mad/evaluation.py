@@ -17,8 +17,6 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from random import random
-
 from mad.ast.settings import Settings
 import collections
 
@@ -34,6 +32,7 @@ class Symbols:
     SIMULATION = "!simulation"
     TASK = "!request"
     THROTTLING = "!throttling"
+    TRACING = "!tracing"
     QUEUE = "!queue"
     WORKER = "!worker"
     WORKER_POOL = "!worker_pool"
@@ -57,7 +56,7 @@ class SimulationFactory:
     def create_monitor(self, period):
         self._abort(self.create_monitor.__name__)
 
-    def create_logger(self, environment):
+    def create_logger(self, environment, tracing):
         self._abort(self.create_logger.__name__)
 
     def create_FIFO_task_pool(self, environment):
@@ -69,7 +68,7 @@ class SimulationFactory:
     def create_autoscaler(self, environment, strategy):
         self._abort(self.create_autoscaler.__name__)
 
-    def create_backoff(self, delay):
+    def create_backoff(self, delay, stream):
         self._abort(self.create_backoff.__name__)
 
     def create_operation(self, environment, definition):
@@ -135,14 +134,19 @@ class Evaluation:
         self._define(service.name, service)
         monitor = self.factory.create_monitor(Symbols.MONITOR, service_environment, None)
         service_environment.define(Symbols.MONITOR, monitor)
-        logger = self.factory.create_logger(service_environment)
-        service_environment.define(Symbols.LOGGER, logger)
+        self._create_logger(service_environment)
         return self.continuation(Success(service))
 
     def of_settings(self, settings):
         self._evaluation_of(settings.queue)
         self._evaluation_of(settings.throttling)
         self._evaluation_of(settings.autoscaling)
+        if settings.tracing:
+            self._evaluation_of(settings.tracing)
+        return self.continuation(Success(None))
+
+    def of_tracing(self, tracing):
+        self._define(Symbols.TRACING, tracing)
         return self.continuation(Success(None))
 
     def of_fifo(self, fifo):
@@ -181,14 +185,31 @@ class Evaluation:
         client_environment = self.environment.create_local_environment()
         client_environment.define(Symbols.LISTENER, self.factory.create_listener())
         client = self.factory.create_client_stub(client_environment, definition)
+        client.sampling = self._tracing_of(client_environment).sampling
         self._define(definition.name, client)
         client.initialize()
         monitor = self.factory.create_monitor(Symbols.MONITOR, client_environment, None)
         client_environment.define(Symbols.MONITOR, monitor)
-        logger = self.factory.create_logger(client_environment)
-        client_environment.define(Symbols.LOGGER, logger)
+        self._create_logger(client_environment)
         return self.continuation(Success(client))
 
+    def _create_logger(self, environment):
+        """
+        Register a logger, unless tracing is off. The tracing settings given
+        on the command line (if any) prevail over those of the model, one by
+        one.
+        """
+        tracing = self._tracing_of(environment)
+        if tracing.is_enabled:
+            logger = self.factory.create_logger(environment, tracing)
+            environment.define(Symbols.LOGGER, logger)
+
+    def _tracing_of(self, environment):
+        tracing = environment.look_up(Symbols.TRACING)
+        if self.simulation.tracing:
+            return tracing.overridden_by(self.simulation.tracing)
+        return tracing
+
     def of_sequence(self, sequence):
         def abort_on_error(previous):
             if previous.is_successful:
@@ -217,7 +238,7 @@ class Evaluation:
             after=self.continuation)
 
     def of_fail(self, fail):
-        if random() < fail.probability:
+        if fail.probability >= 1 or self._look_up(Symbols.SELF).random_stream("fail").random() < fail.probability:
             return self.continuation(Error())
         else:
             return self.continuation(Success(None))
@@ -225,7 +246,7 @@ class Evaluation:
     def of_retry(self, retry):
         task = self._look_up(Symbols.TASK)
         sender = self._look_up(Symbols.SELF)
-        backoff = self.factory.create_backoff(retry.delay)
+        backoff = self.factory.create_backoff(retry.delay, sender.random_stream("backoff"))
 
         def retry_on_error(remaining_tries):
             if remaining_tries <= 0:
@@ -240,7 +261,7 @@ class Evaluation:
 
                         delay = backoff.delay(retry.limit - remaining_tries)
                         sender.schedule.after(delay, lambda: task.resume_with(try_again))
-                        task.pause()
+                        task.pause(backing_off=True)
                         return Paused()
 
                 return continuation
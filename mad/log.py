@@ -18,6 +18,11 @@
 #
 
 
+from json import dump, load
+from re import compile
+from struct import Struct
+
+
 class Event:
     """
     An entry in the log
@@ -32,6 +37,50 @@ class Event:
         return "%4d %-20s %-40s" % (self.time, self.context, self.message)
 
 
+class EventCode:
+    """
+    The kinds of event found in a structured trace, and how they are
+    rendered as text
+    """
+    MESSAGE = 0
+    TASK_RECEIVED = 1
+    TASK_ACTIVATED = 2
+    TASK_PAUSED = 3
+    TASK_ASSIGNED = 4
+    ERROR_REPLIED = 5
+    SUCCESS_REPLIED = 6
+    REQUEST_SENT = 7
+    REQUEST_ACCEPTED = 8
+    REQUEST_REJECTED = 9
+    REQUEST_TIMEOUT = 10
+    REQUEST_FAILURE = 11
+    REQUEST_SUCCESS = 12
+
+    NONE = -1
+
+    TEMPLATES = {
+        MESSAGE: "{message:s}",
+        TASK_RECEIVED: "Task {request:d} received",
+        TASK_ACTIVATED: "Task {task:d} activated",
+        TASK_PAUSED: "Task {task:d} paused",
+        TASK_ASSIGNED: "Task {task:d} assigned to Worker {worker:d}",
+        ERROR_REPLIED: "Reply to Task. {request:d} (ERROR)",
+        SUCCESS_REPLIED: "Reply to Task. {request:d} (SUCCESS)",
+        REQUEST_SENT: "Req. {request:d} sent to {service:s}::{operation:s}",
+        REQUEST_ACCEPTED: "Req. {request:d} accepted",
+        REQUEST_REJECTED: "Req. {request:d} rejected!",
+        REQUEST_TIMEOUT: "Req. {request:d} timeout!",
+        REQUEST_FAILURE: "Req. {request:d} failed!",
+        REQUEST_SUCCESS: "Req. {request:d} successful"
+    }
+
+    @classmethod
+    def render(cls, code, request=NONE, worker=NONE, service="", operation="", message=""):
+        return cls.TEMPLATES[code].format(
+            request=request, task=request, worker=worker,
+            service=service, operation=operation, message=message)
+
+
 class Log:
     """
     The history of message logged recorded during a simulation
@@ -40,17 +89,282 @@ class Log:
     def record(self, time, context, message):
         pass
 
+    def trace(self, time, context, code, request=EventCode.NONE, worker=EventCode.NONE, service="", operation=""):
+        """
+        Record a structured event, rendered as text by default
+        """
+        self.record(time, context, EventCode.render(code, request, worker, service, operation))
+
+    def close(self):
+        pass
+
 
 class FileLog(Log):
     """
-    Dump the event into the given stream using the given format
+    Dump the event into the given stream using the given format. When
+    given an index, it also records where each event is written.
     """
 
-    def __init__(self, output, format):
+    def __init__(self, output, format, index=None):
         super().__init__()
         self.format = format
         self.output = output
+        self.index = index
+        self._offset = 0
+
+    def record(self, time, context, message, request=None):
+        line = self.format % (time, context, message)
+        if self.index is not None:
+            self.index.add(self._offset, time, context, request)
+            self._offset += len(line.encode("utf-8"))
+        self.output.write(line)
+
+    def trace(self, time, context, code, request=EventCode.NONE, worker=EventCode.NONE, service="", operation=""):
+        self.record(time, context, EventCode.render(code, request, worker, service, operation), request)
+
+    def close(self):
+        self.output.close()
+
+
+class TraceIndex:
+    """
+    Locate events in a text trace: the offsets of the first and last
+    events of each request, the offset of the first event of each time
+    bucket, and the buckets where each entity has recorded events. The
+    index thus grows with the number of requests and buckets, but not
+    with the number of events.
+    """
+
+    DEFAULT_BUCKET_SIZE = 100
+
+    def __init__(self, bucket_size=DEFAULT_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.requests = {}
+        self.entities = {}
+        self.buckets = []
+
+    def add(self, offset, time, entity, request=None):
+        bucket = time // self.bucket_size
+        while len(self.buckets) <= bucket:
+            self.buckets.append(offset)
+        buckets = self.entities.setdefault(entity, [])
+        if not buckets or buckets[-1] != bucket:
+            buckets.append(bucket)
+        if request is not None and request != EventCode.NONE:
+            self.requests[request] = (self.requests.get(request, (offset,))[0], offset)
+
+    def span_of(self, request):
+        """
+        The offsets of the first and last events of the given request, if
+        any
+        """
+        return self.requests.get(request)
+
+    def buckets_of(self, entity):
+        return self.entities.get(entity, [])
+
+    def bucket_of(self, time):
+        """
+        The bucket that holds the given time, bounded by the first and the
+        last buckets (i.e., times after the end of the trace, including an
+        infinite one, fall into the last bucket)
+        """
+        last = max(0, len(self.buckets) - 1)
+        if time >= (last + 1) * self.bucket_size:
+            return last
+        return max(0, int(time // self.bucket_size))
+
+    def range_of(self, first_bucket, last_bucket):
+        """
+        The offsets where the given buckets start and end (None stands for
+        the end of the trace)
+        """
+        start = self.buckets[first_bucket] if first_bucket < len(self.buckets) else None
+        end = self.buckets[last_bucket + 1] if last_bucket + 1 < len(self.buckets) else None
+        return start, end
+
+    def save(self, output):
+        dump({"bucket_size": self.bucket_size,
+              "buckets": self.buckets,
+              "entities": self.entities,
+              "requests": self.requests}, output)
+
+    @classmethod
+    def load(cls, source):
+        content = load(source)
+        index = cls(content["bucket_size"])
+        index.buckets = content["buckets"]
+        index.entities = content["entities"]
+        index.requests = {int(request): (offsets[0], offsets[-1]) for (request, offsets) in content["requests"].items()}
+        return index
+
+
+class TraceQuery:
+    """
+    Extract events from a text trace, using its index. The trace is only
+    expected to support slicing and 'find' (e.g., a memory-mapped file).
+    """
+
+    REQUEST = compile(r"(?:Req\.|Task|Reply to Task\.) (\d+)")
+
+    def __init__(self, trace, index):
+        self.trace = trace
+        self.index = index
+
+    def history_of(self, request):
+        """
+        The events of the given request, found between its first and last
+        events
+        """
+        span = self.index.span_of(request)
+        if span is None:
+            return []
+        (offset, last) = span
+        events = []
+        for each_line in self._lines(offset, None):
+            if self._request_of(each_line) == request:
+                events.append(each_line)
+            if offset >= last:
+                break
+            offset += len(each_line.encode("utf-8"))
+        return events
+
+    def between(self, start, end, entity=None):
+        first, last = self.index.bucket_of(start), self.index.bucket_of(end)
+        buckets = [first] if entity is None else \
+            [each for each in self.index.buckets_of(entity) if first <= each <= last]
+        lines = []
+        for each_bucket in buckets:
+            for each_line in self._lines(*self.index.range_of(each_bucket, last if entity is None else each_bucket)):
+                (time, context) = self._parse(each_line)
+                if time > end:
+                    break
+                if time >= start and (entity is None or context == entity):
+                    lines.append(each_line)
+        return lines
+
+    def _lines(self, start, end):
+        """
+        The lines found between the given offsets (None stands for the
+        end of the trace), which are read forward only
+        """
+        if start is None:
+            return
+        while end is None or start < end:
+            stop = self.trace.find(b"\n", start) if end is None else self.trace.find(b"\n", start, end)
+            if stop < 0:
+                line = self.trace[start:end]
+                if line:
+                    yield line.decode("utf-8")
+                return
+            yield self.trace[start:stop + 1].decode("utf-8")
+            start = stop + 1
+
+    def _request_of(self, line):
+        match = self.REQUEST.match(line.split(None, 2)[2])
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _parse(line):
+        (time, context) = line.split(None, 2)[:2]
+        return int(time), context
+
+
+class BinaryLog(Log):
+    """
+    Encode structured events as fixed-size binary records, which are
+    handed over, by chunks, to a writer (see storage.BackgroundWriter).
+    Names (of entities, services and operations) are defined once, by a
+    'name' record, and then referred to by their identifier.
+    """
+
+    RECORD = Struct("<BqIqqII")
+    NAME = Struct("<BII")
+    NAME_CODE = 255
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, writer, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__()
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self._names = {"": 0}
+        self._buffer = bytearray()
 
     def record(self, time, context, message):
-        self.output.write(self.format % (time, context, message))
+        self._append(EventCode.MESSAGE, time, context, EventCode.NONE, EventCode.NONE, message, "")
+
+    def trace(self, time, context, code, request=EventCode.NONE, worker=EventCode.NONE, service="", operation=""):
+        self._append(code, time, context, request, worker, service, operation)
+
+    def _append(self, code, time, context, request, worker, service, operation):
+        self._buffer += self.RECORD.pack(
+            code, time, self._name(context), request, worker, self._name(service), self._name(operation))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def _name(self, name):
+        identifier = self._names.get(name)
+        if identifier is None:
+            identifier = len(self._names)
+            self._names[name] = identifier
+            text = name.encode("utf-8")
+            self._buffer += self.NAME.pack(self.NAME_CODE, identifier, len(text))
+            self._buffer += text
+        return identifier
+
+    def flush(self):
+        if self._buffer:
+            self.writer.write(bytes(self._buffer))
+            self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class BinaryTrace:
+    """
+    Decode a binary trace (see BinaryLog) back into events
+    """
+
+    INVALID_RECORD = "Truncated or corrupted trace (found {:d} bytes, expecting {:d})"
+
+    def __init__(self, source):
+        self.source = source
+        self._names = {0: ""}
+
+    def __iter__(self):
+        while True:
+            code = self.source.read(1)
+            if not code:
+                return
+            if code[0] == BinaryLog.NAME_CODE:
+                self._read_name(code)
+            else:
+                yield self._read_event(code)
+
+    def _read(self, code, size):
+        data = code + self.source.read(size - 1)
+        if len(data) != size:
+            raise ValueError(self.INVALID_RECORD.format(len(data), size))
+        return data
+
+    def _read_name(self, code):
+        (_, identifier, length) = BinaryLog.NAME.unpack(self._read(code, BinaryLog.NAME.size))
+        self._names[identifier] = self.source.read(length).decode("utf-8")
+
+    def _read_event(self, code):
+        (code, time, context, request, worker, service, operation) = \
+            BinaryLog.RECORD.unpack(self._read(code, BinaryLog.RECORD.size))
+        if code == EventCode.MESSAGE:
+            message = self._names[service]
+        else:
+            message = EventCode.render(code, request, worker, self._names[service], self._names[operation])
+        return Event(time, self._names[context], message)
 
+    def decode(self, log):
+        """
+        Replay all the events into the given log (e.g., a FileLog)
+        """
+        for each_event in self:
+            log.record(each_event.time, each_event.context, each_event.message)
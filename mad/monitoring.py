@@ -17,6 +17,13 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from array import array
+from collections import deque
+from math import isnan
+from sys import byteorder
+
+from mad.statistics import Accumulator, QuantileSketch
+
 
 class CSVReport:
     """
@@ -44,3 +51,518 @@ class CSVReport:
         self.output.write(", ".join(texts))
         self.output.write("\n")
 
+    def close(self):
+        self.output.close()
+
+
+class LongFormatReport:
+    """
+    Gather the values monitored on all entities into a single CSV table,
+    with one row per entity, metric and sampling time. Rows are kept in a
+    shared buffer, which is written in bulk every 'flush_size' rows.
+    """
+
+    HEADERS = ["time", "entity", "metric", "value"]
+    ROW = "{time:s}, {entity:s}, {metric:s}, {value:s}\n"
+    TIME = "time"
+    WINDOW_START = "window start"
+    DEFAULT_FLUSH_SIZE = 4096
+
+    def __init__(self, output, flush_size=DEFAULT_FLUSH_SIZE):
+        assert flush_size > 0, "Flush size must be strictly positive (found {!s})".format(flush_size)
+        self.output = output
+        self.flush_size = flush_size
+        self._buffer = []
+        self.output.write(", ".join(self.HEADERS))
+        self.output.write("\n")
+
+    def record(self, time, entity, metric, value):
+        self._buffer.append(self.ROW.format(time=time, entity=entity, metric=metric, value=value))
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        self.output.write("".join(self._buffer))
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.output.close()
+
+
+class Column:
+    """
+    A growable array of floating point numbers, preallocated by chunks.
+    Missing values are stored as NaN.
+    """
+
+    DEFAULT_CAPACITY = 1024
+    MISSING = float("nan")
+
+    def __init__(self, name, capacity=DEFAULT_CAPACITY):
+        assert capacity > 0, "Column capacity must be strictly positive (found {!s})".format(capacity)
+        self.name = name
+        self._values = array("d", [self.MISSING]) * capacity
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self._values)
+
+    def append(self, value):
+        if self.size == len(self._values):
+            self._values.extend(array("d", [self.MISSING]) * len(self._values))
+        self._values[self.size] = self.MISSING if value is None else value
+        self.size += 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("Invalid index {:d} (column has {:d} values)".format(index, self.size))
+        return self._values[index]
+
+    @property
+    def values(self):
+        return self._values[:self.size]
+
+
+class ColumnarReport:
+    """
+    Hold the raw values monitored on an entity, one column per probe. It
+    accepts the same calls as a CSVReport. When given a callback, it
+    tells it how many values each row adds, so that rows can be exported
+    in bulk (see MetricStore).
+    """
+
+    def __init__(self, entity, probes, capacity=Column.DEFAULT_CAPACITY, on_row=None):
+        self.entity = entity
+        self.probes = probes
+        self.on_row = on_row
+        self.exported = 0
+        self.columns = [Column(each_probe.name, capacity) for each_probe in probes]
+        self._width = len([each for each in probes if each.name != LongFormatReport.TIME])
+
+    def __call__(self, *args, **kwargs):
+        for each_column in self.columns:
+            each_column.append(kwargs.get(each_column.name))
+        if self.on_row is not None:
+            self.on_row(self._width)
+
+    @property
+    def length(self):
+        return self.columns[0].size if self.columns else 0
+
+    def rows(self):
+        for index in range(self.length):
+            yield [each_column[index] for each_column in self.columns]
+
+    def export_long_format(self, long_report):
+        """
+        Push one row per value (but the time) in the given long-format report
+        """
+        for each_row in self.long_format_rows():
+            long_report.record(*each_row)
+
+    def long_format_rows(self, start=0, end=None):
+        time_index = self._index_of(LongFormatReport.TIME)
+        rows = self.rows()
+        if start > 0 or end is not None:
+            end = self.length if end is None else end
+            rows = ([each_column[index] for each_column in self.columns] for index in range(start, end))
+        for each_row in rows:
+            time = "{:d}".format(int(each_row[time_index])) if time_index is not None else ""
+            for (probe, value) in zip(self.probes, each_row):
+                if probe.name == LongFormatReport.TIME:
+                    continue
+                text = probe.format_value(None if isnan(value) else value).strip()
+                yield (time, self.entity, probe.name, text)
+
+    @property
+    def last_time(self):
+        time_index = self._index_of(LongFormatReport.TIME)
+        if time_index is None or self.length == 0:
+            return None
+        return self.columns[time_index][self.length - 1]
+
+    def end_before(self, time):
+        """
+        The index of the first row that is not exported yet, and whose time
+        is not before the given one
+        """
+        time_index = self._index_of(LongFormatReport.TIME)
+        end = self.length
+        if time_index is None or time is None:
+            return end
+        while end > self.exported and self.columns[time_index][end - 1] >= time:
+            end -= 1
+        return end
+
+    def _index_of(self, name):
+        for (index, each_probe) in enumerate(self.probes):
+            if each_probe.name == name:
+                return index
+        return None
+
+    def export(self, csv_report):
+        """
+        Push all the rows in the given CSV report, formatted by the probes
+        """
+        for each_row in self.rows():
+            texts = {}
+            for (probe, value) in zip(self.probes, each_row):
+                texts[probe.name] = probe.format_value(None if isnan(value) else value)
+            csv_report(**texts)
+
+
+class DerivedProbe:
+    """
+    A column computed by a report rather than measured, which formats its
+    values as the given probe does (rounding rather than truncating the
+    values of integer probes)
+    """
+
+    def __init__(self, name, probe):
+        self.name = name
+        self.probe = probe
+
+    def format_value(self, value):
+        if value is not None and self.probe.format.endswith("d}"):
+            value = round(value)
+        return self.probe.format_value(value)
+
+
+class Count:
+    """
+    A column of counts computed by a report
+    """
+
+    WIDTH = 6
+
+    def __init__(self, name):
+        self.name = name
+
+    def format_value(self, value):
+        return "{:>{width}d}".format(int(value), width=self.WIDTH)
+
+
+class Window:
+    """
+    A row of a round-robin report, which covers 'length' consecutive
+    monitoring periods, starting from the 'first' one, i.e., the time
+    interval ]start, end]. Its values are either raw values, or tuples
+    (minimum, mean, maximum, 95th percentile).
+    """
+
+    def __init__(self, first, length, start, end, values):
+        self.first = first
+        self.length = length
+        self.start = start
+        self.end = end
+        self.values = values
+
+    @property
+    def last(self):
+        return self.first + self.length
+
+
+class Rollup:
+    """
+    Consolidate consecutive windows of a finer level ('factor' of them)
+    into a single window, which summarises each probe by its minimum,
+    mean, maximum and 95th percentile (assuming non-negative values).
+    Only the last 'capacity' windows are kept.
+    """
+
+    QUANTILE = 0.95
+
+    def __init__(self, width, factor, capacity):
+        assert factor > 1, "Rollup factor must be greater than 1 (found {!s})".format(factor)
+        assert capacity >= factor, "Rollup capacity must be at least {:d} (found {!s})".format(factor, capacity)
+        self.width = width
+        self.factor = factor
+        self.windows = deque(maxlen=capacity)
+        self._open(None)
+
+    def _open(self, window):
+        self._first = window
+        self._count = 0
+        self._values = [Accumulator() for _ in range(self.width)]
+        self._quantiles = [QuantileSketch() for _ in range(self.width)]
+
+    def add(self, window):
+        """
+        Add a raw window, and return the consolidated window that it
+        completes, if any
+        """
+        for (index, value) in enumerate(window.values):
+            if value is not None and not isnan(value):
+                self._values[index].add(value)
+                self._quantiles[index].add(value)
+        return self._close_if_complete(window)
+
+    def merge(self, window, values, quantiles):
+        """
+        Merge the summaries of a consolidated window of the finer level
+        """
+        for index in range(self.width):
+            self._values[index].merge(values[index])
+            self._quantiles[index].merge(quantiles[index])
+        return self._close_if_complete(window)
+
+    def _close_if_complete(self, window):
+        if self._first is None:
+            self._first = window
+        self._count += 1
+        if self._count < self.factor:
+            return None
+        closed = Window(self._first.first, window.last - self._first.first, self._first.start, window.end,
+                        [self._summary(index) for index in range(self.width)])
+        (values, quantiles) = (self._values, self._quantiles)
+        self.windows.append(closed)
+        self._open(None)
+        return (closed, values, quantiles)
+
+    def _summary(self, index):
+        values = self._values[index]
+        if values.is_empty:
+            return None
+        quantile = self._quantiles[index].quantile(self.QUANTILE)
+        return (values.minimum, values.mean, values.maximum, min(max(quantile, values.minimum), values.maximum))
+
+
+class RoundRobinReport(ColumnarReport):
+    """
+    Hold the values monitored on an entity in bounded memory, as does a
+    round-robin database: the last 'capacity' rows at full resolution,
+    and older rows consolidated at coarser resolutions (by default, every
+    10 and every 100 rows), whose last 'capacity' rows are kept as well.
+    Consolidated rows hold the minimum, mean, maximum and 95th percentile
+    of each probe, and exports combine all levels into a single series
+    where each row covers a distinct time window.
+    """
+
+    DEFAULT_CAPACITY = 1000
+    DEFAULT_FACTORS = (10, 10)
+    MINIMUM_CAPACITY = max(DEFAULT_FACTORS)
+    RESOLUTION = "resolution"
+    AGGREGATES = ["min({:s})", "{:s}", "max({:s})", "p95({:s})"]
+
+    def __init__(self, entity, probes, capacity=DEFAULT_CAPACITY, factors=DEFAULT_FACTORS):
+        assert capacity > 0, "Report capacity must be strictly positive (found {!s})".format(capacity)
+        self.entity = entity
+        self.measured = probes
+        self.recent = deque(maxlen=capacity)
+        self.rollups = [Rollup(len(probes), each_factor, capacity) for each_factor in factors]
+        self._time_index = self._index_of_probe(LongFormatReport.TIME)
+        self._start_index = self._index_of_probe(LongFormatReport.WINDOW_START)
+        self._count = 0
+        self._last_time = 0
+        self.probes = self._exported_probes()
+
+    def _index_of_probe(self, name):
+        for (index, each_probe) in enumerate(self.measured):
+            if each_probe.name == name:
+                return index
+        return None
+
+    def _exported_probes(self):
+        probes = [Count(self.RESOLUTION)]
+        for each_probe in self.measured:
+            if each_probe.name in (LongFormatReport.TIME, LongFormatReport.WINDOW_START):
+                probes.append(each_probe)
+                continue
+            for each_aggregate in self.AGGREGATES:
+                probes.append(DerivedProbe(each_aggregate.format(each_probe.name), each_probe))
+        return probes
+
+    def __call__(self, *args, **kwargs):
+        values = [kwargs.get(each_probe.name) for each_probe in self.measured]
+        end = values[self._time_index] if self._time_index is not None else self._count + 1
+        start = values[self._start_index] if self._start_index is not None else self._last_time
+        window = Window(self._count, 1, start, end, values)
+        self.recent.append(window)
+        self._count += 1
+        self._last_time = end
+        self._roll_up(window)
+
+    def _roll_up(self, window):
+        completed = self.rollups[0].add(window) if self.rollups else None
+        for each_rollup in self.rollups[1:]:
+            if completed is None:
+                break
+            completed = each_rollup.merge(*completed)
+
+    @property
+    def length(self):
+        return len(self._windows())
+
+    def _windows(self):
+        """
+        The windows of all levels, oldest first, so that coarser windows
+        cover the periods that finer levels no longer hold
+        """
+        finer = list(self.recent)
+        selected = []
+        for each_rollup in self.rollups:
+            coarser = list(each_rollup.windows)
+            if finer:
+                boundary = min([each.last for each in coarser if each.last >= finer[0].first], default=finer[0].first)
+                coarser = [each for each in coarser if each.last <= boundary]
+                finer = [each for each in finer if each.first >= boundary]
+            selected = finer + selected
+            finer = coarser
+        return finer + selected
+
+    def rows(self):
+        for each_window in self._windows():
+            yield self._row_of(each_window)
+
+    def _row_of(self, window):
+        row = [window.length]
+        for (index, value) in enumerate(window.values):
+            if index == self._time_index:
+                row.append(window.end)
+            elif index == self._start_index:
+                row.append(window.start)
+            elif window.length == 1:
+                row.extend([Column.MISSING if value is None else value] * len(self.AGGREGATES))
+            elif value is None:
+                row.extend([Column.MISSING] * len(self.AGGREGATES))
+            else:
+                row.extend(value)
+        return row
+
+    @property
+    def columns(self):
+        columns = [Column(each_probe.name, max(self.length, 1)) for each_probe in self.probes]
+        for each_row in self.rows():
+            for (column, value) in zip(columns, each_row):
+                column.append(value)
+        return columns
+
+
+class MetricStore:
+    """
+    Keep in memory the values monitored on all entities during a simulation,
+    and save them in bulk as a NumPy '.npz' archive where each column is an
+    array named '<entity>/<probe>'. When given a rollup capacity, it keeps
+    instead a bounded number of rows per entity (see RoundRobinReport).
+    When given a sink (i.e., a LongFormatReport), the rows are exported
+    there, at full resolution, by chunks of about the flush size of the
+    sink, which hold all the rows but those of the last time reported,
+    as other entities may not have reported it yet. With a rollup, the
+    sink only gets the rows that remain once the store is closed.
+    """
+
+    def __init__(self, capacity=Column.DEFAULT_CAPACITY, rollup=None, sink=None):
+        self.capacity = capacity
+        self.rollup = rollup
+        self.sink = sink
+        self._reports = {}
+        self._pending = 0
+
+    def report_for(self, entity, probes):
+        if self.rollup:
+            report = RoundRobinReport(entity, probes, self.rollup)
+        else:
+            report = ColumnarReport(entity, probes, self.capacity, on_row=self._count)
+        self._reports[entity] = report
+        return report
+
+    def _count(self, values):
+        if self.sink is None:
+            return
+        self._pending += values
+        if self._pending >= self.sink.flush_size:
+            self.flush()
+
+    def flush(self, complete=False):
+        """
+        Export in the sink the rows reported since the last flush, in the
+        order of their time, but those of the last time reported, unless
+        the run is complete
+        """
+        latest = None if complete else max([each.last_time for each in self._reports.values()
+                                            if each.last_time is not None], default=None)
+        rows = []
+        for each_report in self._reports.values():
+            end = each_report.end_before(latest)
+            rows.extend(each_report.long_format_rows(each_report.exported, end))
+            each_report.exported = end
+        for (time, entity, metric, value) in sorted(rows, key=lambda row: int(row[0]) if row[0] else 0):
+            self.sink.record(time, entity, metric, value)
+        self.sink.flush()
+        self._pending = 0
+
+    def stream_to(self, sink):
+        """
+        Export the rows held so far into the given sink, and then the new
+        ones as they come (e.g., when a branch continues from a prefix)
+        """
+        self.sink = sink
+        if self.rollup:
+            return
+        for each_report in self._reports.values():
+            each_report.exported = 0
+        self.flush()
+
+    def close(self):
+        """
+        Export the remaining rows in the sink, if any, and close it
+        """
+        if self.sink is None:
+            return
+        if self.rollup:
+            for each_report in self._reports.values():
+                each_report.export_long_format(self.sink)
+        else:
+            self.flush(complete=True)
+        self.sink.close()
+
+    @property
+    def entities(self):
+        return list(self._reports.keys())
+
+    def __getitem__(self, entity):
+        return self._reports[entity]
+
+    def export(self, entity, output):
+        report = self._reports[entity]
+        report.export(CSVReport(output, [(each_probe.name, "%s") for each_probe in report.probes]))
+
+    def export_all(self, output, flush_size=LongFormatReport.DEFAULT_FLUSH_SIZE):
+        """
+        Export the values of all entities into a single long-format CSV table
+        """
+        long_report = LongFormatReport(output, flush_size)
+        for each_report in self._reports.values():
+            each_report.export_long_format(long_report)
+        long_report.flush()
+
+    def save(self, output):
+        from zipfile import ZipFile, ZIP_STORED
+        with ZipFile(output, mode="w", compression=ZIP_STORED) as archive:
+            for (entity, report) in self._reports.items():
+                for each_column in report.columns:
+                    name = "{:s}/{:s}.npy".format(entity, each_column.name)
+                    archive.writestr(name, NPYFormat.encode(each_column.values))
+
+
+class NPYFormat:
+    """
+    Encode a one-dimensional array of doubles in the NumPy '.npy' format
+    (version 1.0), without depending on NumPy.
+    """
+
+    MAGIC = b"\x93NUMPY\x01\x00"
+    HEADER = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({:d},), }}"
+    ALIGNMENT = 64
+
+    @classmethod
+    def encode(cls, values):
+        header = cls.HEADER.format(len(values))
+        padding = cls.ALIGNMENT - (len(cls.MAGIC) + 2 + len(header) + 1) % cls.ALIGNMENT
+        header = (header + " " * padding + "\n").encode("latin1")
+        if byteorder == "big":
+            values = array("d", values)
+            values.byteswap()
+        return cls.MAGIC + len(header).to_bytes(2, "little") + header + values.tobytes()
@@ -17,8 +17,14 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import ply.lex as lex
-import ply.yacc as yacc
+from importlib.machinery import SourceFileLoader
+from os import makedirs, replace, getpid
+from os.path import join, exists
+from sys import modules
+from types import ModuleType
+from zlib import crc32
+
+from mad.cache import user_cache_directory
 
 from mad.ast.settings import *
 from mad.ast.definitions import *
@@ -30,10 +36,13 @@ reserved = {
     "client": "CLIENT",
     "delay": "DELAY",
     "every": "EVERY",
+    "exclude": "EXCLUDE",
     "fail": "FAIL",
     "FIFO":  "FIFO",
     "ignore": "IGNORE",
+    "include": "INCLUDE",
     "invoke": "INVOKE",
+    "level": "LEVEL",
     "LIFO": "LIFO",
     "limit": "LIMIT",
     "limits": "LIMITS",
@@ -49,7 +58,8 @@ reserved = {
     "tail-drop": "TAIL_DROP",
     "think": "THINK",
     "throttling": "THROTTLING",
-    "timeout": "TIMEOUT"
+    "timeout": "TIMEOUT",
+    "tracing": "TRACING"
 }
 
 # List of token names.   This is always required
@@ -107,9 +117,6 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-lexer = lex.lex()
-
-
 # -----------------------------
 # Parsing rules
 def p_unit(p):
@@ -142,8 +149,8 @@ def p_definition(p):
 
 def p_define_service(p):
     """
-    define_service : SERVICE IDENTIFIER OPEN_CURLY_BRACKET settings operation_list CLOSE_CURLY_BRACKET
-                   | SERVICE IDENTIFIER OPEN_CURLY_BRACKET operation_list CLOSE_CURLY_BRACKET
+    define_service : SERVICE name OPEN_CURLY_BRACKET settings operation_list CLOSE_CURLY_BRACKET
+                   | SERVICE name OPEN_CURLY_BRACKET operation_list CLOSE_CURLY_BRACKET
     """
     if len(p) == 7:
         body = p[4] + p[5]
@@ -177,6 +184,7 @@ def p_setting(p):
     setting : queue
             | autoscaling
             | throttling
+            | tracing
     """
     p[0] = p[1]
 
@@ -240,6 +248,87 @@ def p_autoscaling_setting(p):
         raise RuntimeError("Invalid product in 'autoscaling_setting'")
 
 
+def p_tracing(p):
+    """
+    tracing : TRACING COLON IDENTIFIER
+            | TRACING OPEN_CURLY_BRACKET tracing_setting_list CLOSE_CURLY_BRACKET
+    """
+    if len(p) == 4:
+        options = {"level": p[3]}
+    elif len(p) == 5:
+        options = p[3]
+    else:
+        raise RuntimeError("Invalid production in 'tracing'")
+    if options.get("level", Tracing.ALL) not in Tracing.LEVELS:
+        raise MADSyntaxError((p.lineno(1), p.lexpos(1)), options["level"])
+    p[0] = {"tracing": Tracing(**options)}
+
+
+def p_tracing_setting_list(p):
+    """
+    tracing_setting_list : tracing_setting tracing_setting_list
+                         | tracing_setting
+    """
+    if len(p) == 3:
+        p[0] = merge_map(p[1], p[2])
+    elif len(p) == 2:
+        p[0] = p[1]
+    else:
+        raise RuntimeError("Invalid production in 'tracing_setting_list'")
+
+
+def p_tracing_setting(p):
+    """
+    tracing_setting : LEVEL COLON IDENTIFIER
+                    | INCLUDE COLON OPEN_SQUARE_BRACKET trace_pattern_list CLOSE_SQUARE_BRACKET
+                    | EXCLUDE COLON OPEN_SQUARE_BRACKET trace_pattern_list CLOSE_SQUARE_BRACKET
+    """
+    if len(p) == 4:
+        p[0] = {"level": p[3]}
+    elif len(p) == 6:
+        p[0] = {p[1]: p[4]}
+    else:
+        raise RuntimeError("Invalid production in 'tracing_setting'")
+
+
+def p_trace_pattern_list(p):
+    """
+    trace_pattern_list : trace_pattern COMMA trace_pattern_list
+                       | trace_pattern
+    """
+    if len(p) == 4:
+        p[0] = [p[1]] + p[3]
+    elif len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        raise RuntimeError("Invalid production in 'trace_pattern_list'")
+
+
+def p_trace_pattern(p):
+    """
+    trace_pattern : name
+                  | name SLASH name
+    """
+    if len(p) == 4:
+        p[0] = p[1] + "/" + p[3]
+    elif len(p) == 2:
+        p[0] = p[1]
+    else:
+        raise RuntimeError("Invalid production in 'trace_pattern'")
+
+
+def p_name(p):
+    """
+    name : IDENTIFIER
+         | TRACING
+         | LEVEL
+         | INCLUDE
+         | EXCLUDE
+    """
+    # The keywords of tracing settings remain valid names elsewhere
+    p[0] = p[1]
+
+
 def p_operation_list(p):
     """
     operation_list : define_operation operation_list
@@ -255,14 +344,14 @@ def p_operation_list(p):
 
 def p_define_client(p):
     """
-    define_client : CLIENT IDENTIFIER OPEN_CURLY_BRACKET EVERY NUMBER OPEN_CURLY_BRACKET action_list CLOSE_CURLY_BRACKET CLOSE_CURLY_BRACKET
+    define_client : CLIENT name OPEN_CURLY_BRACKET EVERY NUMBER OPEN_CURLY_BRACKET action_list CLOSE_CURLY_BRACKET CLOSE_CURLY_BRACKET
     """
     p[0] = DefineClientStub(p[2], int(p[5]), p[7])
 
 
 def p_define_operation(p):
     """
-    define_operation : OPERATION IDENTIFIER OPEN_CURLY_BRACKET action_list CLOSE_CURLY_BRACKET
+    define_operation : OPERATION name OPEN_CURLY_BRACKET action_list CLOSE_CURLY_BRACKET
     """
     p[0] = DefineOperation(p[2], p[4])
 
@@ -311,8 +400,8 @@ def p_fail(p):
 
 def p_query(p):
     """
-    query : QUERY IDENTIFIER SLASH IDENTIFIER
-          | QUERY IDENTIFIER SLASH IDENTIFIER OPEN_CURLY_BRACKET query_option_list CLOSE_CURLY_BRACKET
+    query : QUERY name SLASH name
+          | QUERY name SLASH name OPEN_CURLY_BRACKET query_option_list CLOSE_CURLY_BRACKET
     """
     parameters = {"service": p[2], "operation": p[4]}
     if len(p) > 5:
@@ -357,8 +446,8 @@ def p_priority(p):
 
 def p_invoke(p):
     """
-    invoke : INVOKE IDENTIFIER SLASH IDENTIFIER
-           | INVOKE IDENTIFIER SLASH IDENTIFIER OPEN_CURLY_BRACKET PRIORITY COLON NUMBER CLOSE_CURLY_BRACKET
+    invoke : INVOKE name SLASH name
+           | INVOKE name SLASH name OPEN_CURLY_BRACKET PRIORITY COLON NUMBER CLOSE_CURLY_BRACKET
     """
     priority = None
     if len(p) > 5:
@@ -438,17 +527,141 @@ class MADSyntaxError(BaseException):
             hint=self.hint)
 
 
+class ParserTables:
+    """
+    Build the lexer and the parsers (one per entry rule) on first use
+    only, and reuse them afterwards. Their tables are cached in the user
+    cache directory, as Python modules named after the grammar, so that
+    other processes load them (compiled) instead of building them again,
+    and nothing is ever written into the package directory.
+    """
+
+    LEXER = "lexer_{signature:s}"
+    TABLES = "parser_{rule:s}_{signature:s}"
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lexer = None
+        self._parsers = {}
+        self._signature = None
+
+    @property
+    def module(self):
+        return modules[__name__]
+
+    @property
+    def lexer(self):
+        if self._lexer is None:
+            self._lexer = self._cached(self.LEXER.format(signature=self.signature), self._lex)
+        return self._lexer
+
+    @property
+    def signature(self):
+        """
+        A hash of the grammar (tokens, lexing and parsing rules), and of
+        the version of the PLY tables
+        """
+        if self._signature is None:
+            import ply.lex as lex
+            import ply.yacc as yacc
+            rules = [(name, rule.__doc__ if callable(rule) else rule) for (name, rule) in sorted(vars(self.module).items())
+                     if name.startswith(("t_", "p_"))]
+            grammar = repr((tokens, rules, lex.__tabversion__, yacc.__tabversion__))
+            self._signature = "{:08x}".format(crc32(grammar.encode("utf-8")))
+        return self._signature
+
+    def parser_for(self, entry_rule, logger):
+        if entry_rule not in self._parsers:
+            name = self.TABLES.format(rule=entry_rule, signature=self.signature)
+            self._parsers[entry_rule] = self._cached(
+                name, lambda *tables: self._yacc(entry_rule, logger, *tables))
+        return self._parsers[entry_rule]
+
+    def _cached(self, name, build):
+        """
+        Call 'build' with the tables cached under the given name if any,
+        or else with the name of a module where to write them
+        """
+        directory = self._directory()
+        if directory is None:
+            return build()
+        location = join(directory, name + ".py")
+        if exists(location):
+            try:
+                return build(self._import(name, location))
+            except Exception:
+                pass # Corrupted tables, overwritten below
+        # Write in a separate module first, as other processes may be loading the same tables
+        draft = "{:s}_{:d}".format(name, getpid())
+        result = build(draft, directory)
+        if exists(join(directory, draft + ".py")):
+            replace(join(directory, draft + ".py"), location)
+        return result
+
+    def _directory(self):
+        directory = self.directory or user_cache_directory()
+        try:
+            makedirs(directory, exist_ok=True)
+        except OSError:
+            return None
+        return directory
+
+    @staticmethod
+    def _import(name, location):
+        tables = ModuleType(name)
+        tables.__file__ = location
+        SourceFileLoader(name, location).exec_module(tables)
+        return tables
+
+    def _lex(self, tables=None, directory=None):
+        import ply.lex as lex
+        if tables is None:
+            return lex.lex(module=self.module)
+        return lex.lex(module=self.module, optimize=True, lextab=tables, outputdir=directory)
+
+    def _yacc(self, entry_rule, logger, tables=None, directory=None):
+        import ply.yacc as yacc
+        if tables is None:
+            return yacc.yacc(module=self.module, start=entry_rule, errorlog=logger, debug=False, write_tables=False)
+        return yacc.yacc(module=self.module, start=entry_rule, errorlog=logger, debug=False,
+                         tabmodule=tables, outputdir=directory, write_tables=directory is not None)
+
+
+class NullLogger:
+    """
+    Discard the warnings raised while building the tables, as the one of
+    PLY does, but without importing PLY until a model is parsed
+    """
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+TABLES = ParserTables()
+
+
 class Parser:
 
-    def __init__(self, file_system, root_file):
+    def __init__(self, file_system, root_file, tables=TABLES):
         self.root_file = root_file
         self.file_system = file_system
+        self.tables = tables
+        self._source = None
+
+    @property
+    def source(self):
+        if self._source is None:
+            self._source = self._content()
+        return self._source
 
-    def parse(self, entry_rule="unit", logger=yacc.NullLogger()):
+    def parse(self, entry_rule="unit", logger=NullLogger()):
+        lexer = self.tables.lexer
         lexer.lineno = 1
-        text = self._content()
-        parser = yacc.yacc(start=entry_rule, errorlog=logger)
-        return parser.parse(lexer=lexer, input=text)
+        parser = self.tables.parser_for(entry_rule, logger)
+        return parser.parse(lexer=lexer, input=self.source)
 
     def _content(self):
         lines = self.file_system.open_input_stream(self.root_file).readlines()
@@ -100,6 +100,7 @@ class Scheduler:
     def __init__(self, initial_time=0):
         self.schedule = EventPool()
         self.clock = Clock(initial_time)
+        self._stopped = False
 
     @property
     def time_now(self):
@@ -120,8 +121,15 @@ class Scheduler:
             self.after(period, recurrent_action)
         self.after(period, recurrent_action)
 
+    def stop(self):
+        """
+        Stop the simulation once the current event is over
+        """
+        self._stopped = True
+
     def simulate_until(self, end, display=None):
-        while not self.schedule.is_empty:
+        self._stopped = False
+        while not self.schedule.is_empty and not self._stopped:
             event = self.schedule.next_event()
             if event.is_scheduled_after(end):
                 break
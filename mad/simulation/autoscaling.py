@@ -35,13 +35,34 @@ class AutoScaler(SimulatedEntity):
         self.schedule.every(period, self.auto_scale)
         self.limits = limits
         self.strategy = strategy
+        self._integrals = (0, 0)
 
     def auto_scale(self):
         worker_pool = self.look_up(Symbols.WORKER_POOL)
-        new_worker_count = self._filter(self.strategy.adjust(worker_pool))
+        new_worker_count = self.clamp(self.strategy.adjust(worker_pool, self._utilisation()))
         worker_pool.set_capacity(new_worker_count)
 
-    def _filter(self, value):
+    def _utilisation(self):
+        """
+        The average utilisation since the last adjustment, as integrated by
+        the monitor, if any.
+        """
+        monitor = self.look_up(Symbols.MONITOR)
+        if monitor is None:
+            return None
+        now = self.schedule.time_now
+        busy = monitor.gauges.busy_workers.integral(now)
+        capacity = monitor.gauges.worker_count.integral(now)
+        (last_busy, last_capacity) = self._integrals
+        self._integrals = (busy, capacity)
+        if capacity <= last_capacity:
+            return None
+        return 100 * (busy - last_busy) / (capacity - last_capacity)
+
+    def clamp(self, value):
+        """
+        The given number of workers, brought within the limits
+        """
         if self._too_low(value):
             return self._minimum()
         if self._too_high(value):
@@ -90,8 +111,10 @@ class RuleBasedStrategy:
                  lambda count: count)
         ]
 
-    def adjust(self, worker_pool):
+    def adjust(self, worker_pool, utilisation=None):
         assert worker_pool, "Invalid worker_pool (found '%s')" % worker_pool
+        if utilisation is None:
+            utilisation = worker_pool.utilisation
         for any_rule in self._rules:
-            if any_rule.applies_to(worker_pool.utilisation):
+            if any_rule.applies_to(utilisation):
                 return any_rule.compute(worker_pool.capacity)
@@ -37,8 +37,9 @@ class ConstantBackoff(BackoffStrategy):
 
 class ExponentialBackoff(ConstantBackoff):
 
-    def __init__(self, base_delay):
+    def __init__(self, base_delay, stream=None):
         super().__init__(base_delay)
+        self.stream = stream
 
     def delay(self, attempts):
         if attempts == 0:
@@ -47,6 +48,7 @@ class ExponentialBackoff(ConstantBackoff):
             limit = 2 ** attempts - 1
             return self._pick_up_to(limit) * self.base_delay
 
-    @staticmethod
-    def _pick_up_to(limit):
-        return randint(0, limit)
\ No newline at end of file
+    def _pick_up_to(self, limit):
+        if self.stream is None:
+            return randint(0, limit)
+        return self.stream.randint(0, limit)
\ No newline at end of file
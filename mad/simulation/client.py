@@ -26,8 +26,9 @@ from mad.simulation.workers import Worker
 
 class ClientRequest:
 
-    def __init__(self):
+    def __init__(self, is_traced=True):
         self.identifier = -1
+        self.is_traced = is_traced
         self.operation = Symbols.CLIENT_OPERATION
         self.priority = 0
         self.is_pending = True
@@ -51,19 +52,35 @@ class ClientStub(SimulatedEntity):
         self.environment.define(Symbols.SERVICE, self)
         self._define_operation(body)
         self.period = period
+        self.sampling = 1.0
 
     def _define_operation(self, body):
         operation = Operation(Symbols.CLIENT_OPERATION, [], body, self.environment)
         self.environment.define(Symbols.CLIENT_OPERATION, operation)
 
     def initialize(self):
-        self.schedule.every(self.period, self.invoke)
+        self.schedule.after(self.period, self._invoke_periodically)
+
+    def _invoke_periodically(self):
+        """
+        Send a request, and schedule the next one using the current
+        period, which may change during the simulation
+        """
+        self.invoke()
+        self.schedule.after(self.period, self._invoke_periodically)
 
     def invoke(self):
-        task = Task(self, ClientRequest())
+        task = Task(self, ClientRequest(self._sample()))
         task.accept()
         task.assign_to(self._new_worker())
 
+    def _sample(self):
+        """
+        Decide whether the request about to be sent (and all the requests
+        it eventually triggers downstream) will be traced
+        """
+        return self.sampling >= 1 or self.random_stream("sampling").random() < self.sampling
+
     def _new_worker(self):
         env = self.environment.create_local_environment(self.environment)
         worker = Worker(identifier=-1, environment=env)
@@ -34,6 +34,9 @@ class SimulatedEntity:
     def schedule(self):
         return self.simulation.schedule
 
+    def random_stream(self, purpose):
+        return self.simulation.streams.stream_for(self.name, purpose)
+
     @property
     def listener(self):
         # TODO null-check should be part of the environment
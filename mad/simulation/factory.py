@@ -17,6 +17,9 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from random import getrandbits
+
+from mad.ast.settings import Tracing
 from mad.scheduling import Scheduler
 from mad.environment import Environment
 from mad.evaluation import Symbols, Evaluation, SimulationFactory
@@ -31,6 +34,7 @@ from mad.simulation.autoscaling import RuleBasedStrategy, AutoScaler
 from mad.simulation.requests import Request, Trigger, Query
 from mad.simulation.throttling import ThrottlingWrapper, NoThrottling, TailDrop
 from mad.simulation.backoff import ConstantBackoff, ExponentialBackoff
+from mad.simulation.randomness import RandomStreams
 
 
 class Factory(SimulationFactory):
@@ -38,8 +42,8 @@ class Factory(SimulationFactory):
     Instantiate all necessary elements for a simulation
     """
 
-    def create_simulation(self, data_store):
-        return Simulation(data_store)
+    def create_simulation(self, data_store, tracing=None, sampling=None, batch_means=None, streams=None):
+        return Simulation(data_store, tracing, sampling, batch_means, streams)
 
     def create_worker_pool(self, environment):
         workers = [ self.create_worker(id, environment) for id in range(1, 2) ]
@@ -48,8 +52,8 @@ class Factory(SimulationFactory):
     def create_monitor(self, name, environment, period):
         return Monitor(name, environment, period)
 
-    def create_logger(self, environment):
-        return Logger(environment)
+    def create_logger(self, environment, tracing):
+        return Logger(environment, tracing)
 
     def create_listener(self):
         return Dispatcher()
@@ -93,11 +97,11 @@ class Factory(SimulationFactory):
     def create_tail_drop(self, environment, capacity, task_pool):
         return ThrottlingWrapper(environment, TailDrop(task_pool, capacity))
 
-    def create_backoff(self, delay):
+    def create_backoff(self, delay, stream):
         if delay.strategy == delay.CONSTANT:
             return ConstantBackoff(delay.base_delay)
         elif delay.strategy == delay.EXPONENTIAL:
-            return ExponentialBackoff(delay.base_delay)
+            return ExponentialBackoff(delay.base_delay, stream)
         else:
             raise ValueError("Unknown backoff strategy '{0:s}' (options are 'constant' and 'exponential')")
 
@@ -108,17 +112,39 @@ class Simulation:
     """
     # TODO: This should inherits from SimulatedEntity as well
 
-    def __init__(self, storage):
+    def __init__(self, storage, tracing=None, sampling=None, batch_means=None, streams=None):
         self._storage = storage
         self._scheduler = Scheduler()
+        self.tracing = tracing
+        self.sampling = sampling
+        self.batch_means = batch_means
+        self.streams = streams or RandomStreams(getrandbits(64))
+        self.steady_at = None
         self.environment = Environment()
         self.environment.define(Symbols.SIMULATION, self)
+        self.environment.define(Symbols.TRACING, Tracing())
         self._next_request_id = 1
         self.factory = Factory()
 
+    # How often a run that stops at steady state checks the monitors
+    STEADINESS_PERIOD = 100
+
     def run_until(self, end, display=None):
         self._scheduler.simulate_until(end, display)
 
+    def run_until_steady(self, end, precision, display=None):
+        """
+        Run until every monitor has converged (see Monitor.has_converged),
+        but no longer than the given end
+        """
+        assert self.batch_means is not None, "Steady state can only be detected along with batch means"
+        def stop_if_steady():
+            if all(each.has_converged(precision) for each in self.monitors):
+                self.steady_at = self._scheduler.time_now
+                self._scheduler.stop()
+        self._scheduler.every(self.STEADINESS_PERIOD, stop_if_steady)
+        self.run_until(end, display)
+
     @property
     def log(self):
         return self._storage.log
@@ -143,6 +169,10 @@ class Simulation:
     def clients(self):
         return self._find_by_type(ClientStub)
 
+    @property
+    def monitors(self):
+        return [each_entity.look_up(Symbols.MONITOR) for each_entity in self.services + self.clients]
+
     def _find_by_type(self, type):
         return [each_value
                 for each_value in list(self.environment.bindings.values())
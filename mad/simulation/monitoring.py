@@ -17,9 +17,10 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from functools import reduce
-
 from mad.evaluation import Symbols
+from mad.ast.settings import Tracing
+from mad.log import EventCode
+from mad.statistics import Accumulator, QuantileSketch, TimeWeightedGauge, BatchMeans, MSER, PeriodBlocks
 from mad.simulation.service import Operation
 from mad.simulation.commons import SimulatedEntity
 from mad.simulation.events import Listener
@@ -61,8 +62,11 @@ class WorkersStatistics(Listener):
         self.busy += 1
 
     def worker_shutdown(self, worker):
-        self._assert_status(worker, [WorkerStatus.IDLE])
-        self.idle -= 1
+        self._assert_status(worker, [WorkerStatus.IDLE, WorkerStatus.BUSY])
+        if worker.status == WorkerStatus.IDLE:
+            self.idle -= 1
+        else: #worker.status == WorkerStatus.BUSY
+            self.busy -= 1
         self.shutdown += 1
 
     @property
@@ -170,6 +174,18 @@ class TasksStatistics(Listener):
     def rejection_of(self, request):
         pass
 
+    def worker_created(self, worker):
+        pass
+
+    def worker_busy(self, worker):
+        pass
+
+    def worker_idle(self, worker):
+        pass
+
+    def worker_shutdown(self, worker):
+        pass
+
     def __repr__(self):
         return "(C={0.created:d}, Rd={0.ready:d}, Rn={0.running:d}, B={0.blocked:d}| " \
                "S={0.successful:d}, F={0.failed:d})".format(self)
@@ -181,11 +197,18 @@ class OperationStatistics:
         self.call_count = 0
         self.error_count = 0
         self.rejection_count = 0
-        self.response_times = []
+        self.response_times = Accumulator()
+        self.period_response_times = Accumulator()
+        self.response_time_quantiles = QuantileSketch()
+        self.period_response_time_quantiles = QuantileSketch()
 
     def reset(self):
         self.__init__()
 
+    def new_period(self):
+        self.period_response_times.reset()
+        self.period_response_time_quantiles.reset()
+
     def call(self):
         self.call_count += 1
 
@@ -196,7 +219,10 @@ class OperationStatistics:
         self.error_count += 1
 
     def call_succeed(self, duration):
-        self.response_times.append(duration)
+        self.response_times.add(duration)
+        self.period_response_times.add(duration)
+        self.response_time_quantiles.add(duration)
+        self.period_response_time_quantiles.add(duration)
 
     @property
     def complete_call_count(self):
@@ -204,7 +230,7 @@ class OperationStatistics:
 
     @property
     def success_count(self):
-        return len(self.response_times)
+        return self.response_times.count
 
     @property
     def failure_count(self):
@@ -220,21 +246,44 @@ class OperationStatistics:
 
     @property
     def response_time(self):
-        if len(self.response_times) == 0:
-            return None
-        else:
-            return sum(self.response_times) / len(self.response_times)
+        return self.response_times.mean
+
+    @property
+    def period_response_time(self):
+        return self.period_response_times.mean
+
+    def response_time_quantile(self, q):
+        return self.response_time_quantiles.quantile(q)
+
+    def period_response_time_quantile(self, q):
+        return self.period_response_time_quantiles.quantile(q)
+
+    @property
+    def period_maximum_response_time(self):
+        return self.period_response_times.maximum
 
 
 class Statistics(Listener):
+    """
+    Collect statistics about each operation, as well as their aggregation
+    over the whole service, which is updated along with the operations so
+    that reading it does not depend on the number of operations.
+    """
 
     def __init__(self):
         super().__init__()
         self.total_request_count = 0
         self._operations = {}
+        self._service = OperationStatistics()
 
     def reset(self):
         self._operations.clear()
+        self._service.reset()
+
+    def new_period(self):
+        for each_operation in self._operations.values():
+            each_operation.new_period()
+        self._service.new_period()
 
     def _get(self, operation_name):
         operation = self._operations.get(operation_name)
@@ -252,39 +301,70 @@ class Statistics(Listener):
 
     @property
     def complete_request_count(self):
-        counts = (each_operation.complete_call_count for each_operation in list(self._operations.values()))
-        return reduce(lambda x,y: x+y, counts, 0)
+        return self._service.complete_call_count
 
     @property
     def arrival_count(self):
-        counts = (each_operation.call_count for each_operation in list(self._operations.values()))
-        return reduce(lambda x,y: x+y, counts, 0)
+        return self._service.call_count
 
     @property
     def rejection_count(self):
-        counts = (each_operation.rejection_count for each_operation in list(self._operations.values()))
-        return reduce(lambda x,y: x+y, counts, 0)
+        return self._service.rejection_count
 
     @property
     def success_count(self):
-        counts = (each_operation.success_count for each_operation in list(self._operations.values()))
-        return reduce(lambda x,y: x+y, counts, 0)
+        return self._service.success_count
 
     @property
     def failure_count(self):
-        counts = (each_operation.failure_count for each_operation in list(self._operations.values()))
-        return reduce(lambda x,y: x+y, counts, 0)
+        return self._service.failure_count
+
+    @property
+    def response_times(self):
+        return self._service.response_times
+
+    @property
+    def period_response_times(self):
+        return self._service.period_response_times
+
+    @property
+    def response_time_quantiles(self):
+        return self._service.response_time_quantiles
+
+    @property
+    def period_response_time_quantiles(self):
+        return self._service.period_response_time_quantiles
 
     @property
     def response_time(self):
-        (total, count) = (0, 0)
-        for (operation, statistics) in list(self._operations.items()):
-            total += sum(statistics.response_times)
-            count += len(statistics.response_times)
-        if count <= 0:
-            return None
-        else:
-            return total / count
+        return self._service.response_time
+
+    @property
+    def period_response_time(self):
+        return self._service.period_response_time
+
+    def response_time_quantile(self, q):
+        return self._service.response_time_quantile(q)
+
+    def period_response_time_quantile(self, q):
+        return self._service.period_response_time_quantile(q)
+
+    @property
+    def maximum_response_time(self):
+        return self._service.response_times.maximum
+
+    @property
+    def period_maximum_response_time(self):
+        return self._service.period_maximum_response_time
+
+    def period_maximum_response_time_for(self, operation):
+        return self._get(operation).period_maximum_response_time
+
+    def response_time_quantile_for(self, operation, q):
+        return self._get(operation).response_time_quantile(q)
+
+    def period_response_time_quantile_for(self, operation, q):
+        return self._get(operation).period_response_time_quantile(q)
 
     def response_time_for(self, operation):
         return self._get(operation).response_time
@@ -300,12 +380,14 @@ class Statistics(Listener):
     def task_created(self, task):
         self.total_request_count += 1
         self._get(task.request.operation).call()
+        self._service.call()
 
     def task_accepted(self, task):
         pass
 
     def task_rejected(self, task):
         self._get(task.request.operation).call_rejected()
+        self._service.call_rejected()
 
     def task_assigned_to(self, task, worker):
         pass
@@ -318,9 +400,12 @@ class Statistics(Listener):
 
     def task_failed(self, task):
         self._get(task.request.operation).call_failed()
+        self._service.call_failed()
 
     def task_successful(self, task):
-        self._get(task.request.operation).call_succeed(task.request.response_time)
+        response_time = task.request.response_time
+        self._get(task.request.operation).call_succeed(response_time)
+        self._service.call_succeed(response_time)
 
     def task_cancelled(self, task):
         pass
@@ -348,6 +433,258 @@ class Statistics(Listener):
     def timeout_of(self, request):
         pass
 
+    # Workers
+
+    def worker_created(self, worker):
+        pass
+
+    def worker_busy(self, worker):
+        pass
+
+    def worker_idle(self, worker):
+        pass
+
+    def worker_shutdown(self, worker):
+        pass
+
+
+class WorkloadGauges(Listener):
+    """
+    Integrate over time the number of tasks waiting in the task pool, the
+    number of busy workers and the number of workers alive, as they change.
+    """
+
+    def __init__(self, clock, worker_count=0):
+        super().__init__()
+        self._clock = clock
+        now = self._clock()
+        self.queue = TimeWeightedGauge(now)
+        self.busy_workers = TimeWeightedGauge(now)
+        self.worker_count = TimeWeightedGauge(now, worker_count)
+
+    def task_created(self, task):
+        self.queue.increment(self._clock())
+
+    def task_accepted(self, task):
+        pass
+
+    def task_rejected(self, task):
+        self.queue.decrement(self._clock())
+
+    def task_assigned_to(self, task, worker):
+        self.queue.decrement(self._clock())
+
+    def task_paused(self, task):
+        pass
+
+    def task_activated(self, task):
+        if task.status == TaskStatus.BLOCKED:
+            self.queue.increment(self._clock())
+
+    def task_successful(self, task):
+        pass
+
+    def task_failed(self, task):
+        pass
+
+    def task_cancelled(self, task):
+        if task.status in [TaskStatus.CREATED, TaskStatus.READY]:
+            self.queue.decrement(self._clock())
+
+    def resuming(self, request):
+        pass
+
+    def posting_of(self, service, request):
+        pass
+
+    def acceptance_of(self, request):
+        pass
+
+    def rejection_of(self, request):
+        pass
+
+    def success_of(self, request):
+        pass
+
+    def failure_of(self, request):
+        pass
+
+    def timeout_of(self, request):
+        pass
+
+    def worker_created(self, worker):
+        self.worker_count.increment(self._clock())
+
+    def worker_busy(self, worker):
+        self.busy_workers.increment(self._clock())
+
+    def worker_idle(self, worker):
+        if worker.status == WorkerStatus.BUSY:
+            self.busy_workers.decrement(self._clock())
+
+    def worker_shutdown(self, worker):
+        if worker.status == WorkerStatus.BUSY:
+            self.busy_workers.decrement(self._clock())
+        self.worker_count.decrement(self._clock())
+
+
+class Span:
+    """
+    The time a task spends in each phase, from its arrival at the service
+    until its reply: waiting in the task pool (queueing), running on a
+    worker (service), waiting for downstream requests (blocked), waiting
+    before a retry (back-off), plus the transmission delays (network).
+    """
+
+    QUEUEING, SERVICE, BLOCKED, BACKOFF, NETWORK = range(5)
+    PHASES = ["queueing", "service", "blocked", "back-off", "network"]
+
+    def __init__(self, time):
+        self.start = time
+        self.end = None
+        self.durations = [0] * len(self.PHASES)
+        self._phase = self.QUEUEING
+        self._since = time
+
+    def enter(self, phase, time):
+        self.durations[self._phase] += time - self._since
+        self._phase = phase
+        self._since = time
+
+    def close(self, time, network=0):
+        self.enter(self._phase, time)
+        self.durations[self.NETWORK] += network
+        self.end = time
+
+    @property
+    def total(self):
+        return sum(self.durations)
+
+
+class LatencyBreakdown(Listener):
+    """
+    Follow the span of each task processed by the service, and aggregate
+    the time spent in each phase, per operation. When given a report, it
+    also outputs the span of each traced request, which refers to its
+    parent request, so that complete request trees can be rebuilt.
+    """
+
+    SPAN_FORMATS = [("request", "%d"), ("parent", "%d"), ("entity", "%s"), ("operation", "%s"),
+                    ("start", "%d"), ("end", "%d")] + \
+                   [(each_phase.replace("-", "_"), "%d") for each_phase in Span.PHASES]
+
+    def __init__(self, clock, entity, report=None):
+        super().__init__()
+        self._clock = clock
+        self.entity = entity
+        self.report = report
+        self.operations = {}
+
+    def new_period(self):
+        for each_phases in self.operations.values():
+            for each_phase in each_phases:
+                each_phase.reset()
+
+    def average(self, operation, phase):
+        if operation not in self.operations:
+            return None
+        return self.operations[operation][phase].mean
+
+    def task_created(self, task):
+        task.span = Span(self._clock())
+
+    def task_accepted(self, task):
+        pass
+
+    def task_rejected(self, task):
+        pass
+
+    def task_assigned_to(self, task, worker):
+        self._enter(task, Span.SERVICE)
+
+    def task_paused(self, task):
+        self._enter(task, Span.BACKOFF if task.is_backing_off else Span.BLOCKED)
+
+    def task_activated(self, task):
+        self._enter(task, Span.QUEUEING)
+
+    def task_successful(self, task):
+        self._close(task)
+
+    def task_failed(self, task):
+        self._close(task)
+
+    def task_cancelled(self, task):
+        pass
+
+    def resuming(self, request):
+        pass
+
+    def posting_of(self, service, request):
+        pass
+
+    def acceptance_of(self, request):
+        pass
+
+    def rejection_of(self, request):
+        pass
+
+    def success_of(self, request):
+        pass
+
+    def failure_of(self, request):
+        pass
+
+    def timeout_of(self, request):
+        pass
+
+    def worker_created(self, worker):
+        pass
+
+    def worker_busy(self, worker):
+        pass
+
+    def worker_idle(self, worker):
+        pass
+
+    def worker_shutdown(self, worker):
+        pass
+
+    def _enter(self, task, phase):
+        if task.span is not None:
+            task.span.enter(phase, self._clock())
+
+    def _close(self, task):
+        span = task.span
+        if span is None:
+            return
+        request = task.request
+        span.close(self._clock(), self._network_delay(request, span))
+        self._record(request.operation, span)
+        if self.report and task.is_traced:
+            self._report(request, span)
+
+    @staticmethod
+    def _network_delay(request, span):
+        return (span.start - request.emission_time) + request.TRANSMISSION_DELAY
+
+    def _record(self, operation, span):
+        if operation not in self.operations:
+            self.operations[operation] = [Accumulator() for _ in Span.PHASES]
+        for (each_phase, each_duration) in zip(self.operations[operation], span.durations):
+            each_phase.add(each_duration)
+
+    def _report(self, request, span):
+        values = {"request": request.identifier,
+                  "parent": request.task.identifier,
+                  "entity": self.entity,
+                  "operation": request.operation,
+                  "start": span.start,
+                  "end": span.end}
+        for (each_phase, each_duration) in zip(Span.PHASES, span.durations):
+            values[each_phase.replace("-", "_")] = each_duration
+        self.report(**values)
+
 
 class Probe:
 
@@ -358,19 +695,121 @@ class Probe:
         self.probe = probe
 
     def formatted(self, context):
-        return ("{:>%d}" % self.width).format(self._as_text(context))
+        return self.format_value(self.measure(context))
 
-    def _as_text(self, context):
-        value = self.measure(context)
+    def format_value(self, value):
+        return ("{:>%d}" % self.width).format(self._as_text(value))
+
+    def _as_text(self, value):
         if value is None:
             return "{:s}".format(MISSING_VALUE)
-        else:
-            return self.format.format(value)
+        if self._expects_integer() and isinstance(value, float):
+            value = int(value)
+        return self.format.format(value)
+
+    def _expects_integer(self):
+        return self.format.endswith("d}")
 
     def measure(self, context):
         return self.probe(context)
 
 
+class AdaptiveSampling:
+    """
+    Configuration of adaptive monitoring, where the monitoring period
+    shrinks (down to 'finest') as soon as the queue length, the
+    utilisation or the rejection rate change by more than 'threshold'
+    (relatively) between two samples, and grows back (up to 'coarsest')
+    once they have been steady for 'patience' samples.
+    """
+
+    DEFAULT_FINEST = 1
+    DEFAULT_COARSEST = 100
+    DEFAULT_THRESHOLD = 0.25
+    DEFAULT_PATIENCE = 3
+
+    # Below these levels, changes are measured with respect to these levels
+    # (i.e., one task, 10 % of utilisation, one rejection every 10 time units)
+    SCALES = (1, 10, 0.1)
+
+    def __init__(self, finest=DEFAULT_FINEST, coarsest=DEFAULT_COARSEST, threshold=DEFAULT_THRESHOLD, patience=DEFAULT_PATIENCE):
+        assert 0 < finest <= coarsest, "Invalid sampling periods (found {!s} and {!s})".format(finest, coarsest)
+        assert threshold > 0, "Threshold must be strictly positive (found {!s})".format(threshold)
+        assert patience > 0, "Patience must be strictly positive (found {!s})".format(patience)
+        self.finest = finest
+        self.coarsest = coarsest
+        self.threshold = threshold
+        self.patience = patience
+
+    def rate(self, period):
+        return SamplingRate(self, min(max(period, self.finest), self.coarsest))
+
+    def __repr__(self):
+        return "AdaptiveSampling({!s}, {!s})".format(self.finest, self.coarsest)
+
+
+class SamplingRate:
+    """
+    The current monitoring period of a monitor, adjusted after each sample
+    according to the volatility of its indicators
+    """
+
+    def __init__(self, sampling, period):
+        self.sampling = sampling
+        self.period = period
+        self._previous = None
+        self._steady = 0
+
+    def adjust(self, indicators):
+        if self._previous is not None:
+            if self._is_volatile(self._previous, indicators):
+                self.period = max(self.sampling.finest, self.period // 2)
+                self._steady = 0
+            else:
+                self._steady += 1
+                if self._steady >= self.sampling.patience:
+                    self.period = min(self.sampling.coarsest, self.period * 2)
+                    self._steady = 0
+        self._previous = indicators
+        return self.period
+
+    def _is_volatile(self, previous, current):
+        for (before, now, scale) in zip(previous, current, self.sampling.SCALES):
+            if before is None or now is None:
+                continue
+            if abs(now - before) / max(abs(before), scale) > self.sampling.threshold:
+                return True
+        return False
+
+
+class BatchMeansAnalysis:
+    """
+    Configuration of the batch-means analysis of a single run, where each
+    monitor summarises the monitoring periods that start after the end of
+    the warm-up, as they come (see BatchMeans). The warm-up is either a
+    given time, or AUTOMATIC, in which case each monitor detects it (see
+    MSER).
+    """
+
+    AUTOMATIC = "auto"
+
+    def __init__(self, warm_up=0, capacity=BatchMeans.DEFAULT_CAPACITY, correlation=BatchMeans.DEFAULT_CORRELATION):
+        assert warm_up == self.AUTOMATIC or warm_up >= 0, "Warm-up must be positive (found {!s})".format(warm_up)
+        self.warm_up = warm_up
+        self.capacity = capacity
+        self.correlation = correlation
+
+    @property
+    def detects_warm_up(self):
+        return self.warm_up == self.AUTOMATIC
+
+    def batch_means(self, size=1):
+        return BatchMeans(self.capacity, self.correlation, size)
+
+    def __repr__(self):
+        return "BatchMeansAnalysis({!s})".format(self.warm_up)
+
+
 class Monitor(SimulatedEntity):
     """
     Monitors the various metrics from other components of the services (task pool, worker pool, etc.) and reports on
@@ -380,6 +819,7 @@ class Monitor(SimulatedEntity):
 
     DEFAULT_PROBES = [
         Probe("time", 6, "{:d}", lambda self: self.schedule.time_now),
+        Probe("window start", 6, "{:d}", lambda self: self._window_start),
         Probe("queue", 4, "{:d}", lambda self: self._queue_length()),
         Probe("queue blocked", 4, "{:d}", lambda self: self._queue_blocked()),
         Probe("utilisation", 10, "{:5.2f}", lambda self: self._utilisation()),
@@ -388,26 +828,195 @@ class Monitor(SimulatedEntity):
         Probe("rejection rate", 10, "{:5.2f}", lambda self: self._rejection_rate()),
         Probe("reliability", 10, "{:5.2f}", lambda self: self._reliability()),
         Probe("throughput", 10, "{:5.2f}", lambda self: self._throughput()),
-        Probe("response time", 10, "{:5.2f}", lambda self: self._response_time())
+        Probe("response time", 10, "{:5.2f}", lambda self: self._response_time()),
+        Probe("response time p50", 10, "{:5.2f}", lambda self: self._response_time_quantile(0.50)),
+        Probe("response time p90", 10, "{:5.2f}", lambda self: self._response_time_quantile(0.90)),
+        Probe("response time p95", 10, "{:5.2f}", lambda self: self._response_time_quantile(0.95)),
+        Probe("response time p99", 10, "{:5.2f}", lambda self: self._response_time_quantile(0.99)),
+        Probe("response time max", 10, "{:5.2f}", lambda self: self._maximum_response_time()),
+        Probe("queue average", 10, "{:5.2f}", lambda self: self._queue_average()),
+        Probe("queue maximum", 4, "{:d}", lambda self: self._queue_maximum()),
+        Probe("utilisation average", 10, "{:5.2f}", lambda self: self._average_utilisation()),
+        Probe("busy workers average", 10, "{:5.2f}", lambda self: self._busy_workers_average()),
+        Probe("busy workers maximum", 4, "{:d}", lambda self: self._busy_workers_maximum()),
+        Probe("worker count average", 10, "{:5.2f}", lambda self: self._worker_count_average()),
+        Probe("worker count maximum", 4, "{:d}", lambda self: self._worker_count_maximum())
     ]
 
+    # The response time quantiles (along with the maximum), over each
+    # monitoring period, of the service and of each of its operations
+    QUANTILES = [("p50", 0.50), ("p90", 0.90), ("p95", 0.95), ("p99", 0.99)]
+
+    # The metrics analysed using batch means, which are all observed over
+    # each monitoring period, rather than since the start of the run
+    BATCHED_METRICS = ["arrival rate", "rejection rate", "throughput", "reliability", "response time",
+                       "queue average", "utilisation average", "busy workers average", "worker count average"]
+
+    # The metrics that must be steady for the warm-up to be over, and that
+    # must be precise enough for the run to stop early
+    KEY_METRICS = ["response time", "queue average"]
+
     def __init__(self, name, environment, period):
         super().__init__(name, environment)
         self.period = period or self.DEFAULT_PERIOD
+        self._window_start = self.schedule.time_now
+        self._rejections = 0
+        self._counts = (0, 0, 0, 0)
         self.probes = list(self.DEFAULT_PROBES)
         self._add_custom_probes()
-        self.report = self._create_report(self._header_format())
+        self.report = self._create_report()
         self.statistics = Statistics()
         self.tasks = TasksStatistics()
+        self.gauges = WorkloadGauges(lambda: self.schedule.time_now, self._initial_worker_count())
+        self.latency = LatencyBreakdown(lambda: self.schedule.time_now, self._entity_name(), self._span_report())
+        self._open_windows()
+        self.batch_means = self._create_batch_means()
         self.listener.register(self.tasks)
         self.listener.register(self.statistics)
-        self.schedule.every(self.period, self.monitor)
+        self.listener.register(self.gauges)
+        self.listener.register(self.latency)
+        self._start_monitoring()
+
+    def _start_monitoring(self):
+        sampling = self.simulation.sampling
+        if sampling is None:
+            self.schedule.every(self.period, self.monitor)
+            return
+        self.sampling_rate = sampling.rate(self.period)
+        self.period = self.sampling_rate.period
+        self.schedule.after(self.period, self._monitor_adaptively)
+
+    def _monitor_adaptively(self):
+        indicators = self._volatility_indicators()
+        self.monitor()
+        self.period = self.sampling_rate.adjust(indicators)
+        self.schedule.after(self.period, self._monitor_adaptively)
+
+    def _volatility_indicators(self):
+        rejections = self.statistics.rejection_count - self._rejections
+        self._rejections = self.statistics.rejection_count
+        return (self._queue_average(), self._average_utilisation(), rejections / self.period)
+
+    def _create_batch_means(self):
+        analysis = self.simulation.batch_means
+        if analysis is None:
+            return None
+        if analysis.detects_warm_up:
+            self.warm_up = None
+            self._warm_up_detectors = {each_metric: MSER() for each_metric in self.KEY_METRICS}
+            self._warm_up_periods = PeriodBlocks()
+        else:
+            self.warm_up = analysis.warm_up
+        return {each_metric: analysis.batch_means() for each_metric in self.BATCHED_METRICS}
+
+    def _add_to_batch_means(self):
+        observations = self._period_observations()
+        if observations is None:
+            return
+        if self.warm_up is None:
+            self._detect_warm_up(observations)
+        elif self._window_start >= self.warm_up:
+            self._batch(observations)
+
+    def _batch(self, observations):
+        for (metric, (value, weight)) in observations.items():
+            self.batch_means[metric].add(value, weight)
+
+    def _detect_warm_up(self, observations):
+        """
+        Hold the periods, by blocks, until the key metrics look steady, and
+        then batch the blocks that follow the longest warm-up
+        """
+        self._warm_up_periods.add(self._window_start, observations)
+        truncations = []
+        for (metric, detector) in self._warm_up_detectors.items():
+            detector.add(*observations[metric])
+            if detector.count > 0:
+                truncations.append(detector.truncation())
+        if not truncations or None in truncations:
+            return
+        kept = list(self._warm_up_periods.since(max(truncations)))
+        self.warm_up = kept[0][0] if kept else self.schedule.time_now
+        self.batch_means = {each_metric: self.simulation.batch_means.batch_means(self._warm_up_periods.size)
+                            for each_metric in self.BATCHED_METRICS}
+        for (_, each_block) in kept:
+            for (metric, (mean, weight, count)) in each_block.items():
+                self.batch_means[metric].add(mean, weight, count)
+        self._warm_up_periods = None
+        self._warm_up_detectors = None
+
+    def _period_observations(self):
+        now = self.schedule.time_now
+        counts = (self.statistics.arrival_count, self.statistics.rejection_count,
+                  self.statistics.success_count, self.statistics.complete_request_count)
+        (arrivals, rejections, successes, completions) = [current - before for (current, before) in zip(counts, self._counts)]
+        self._counts = counts
+        duration = now - self._window_start
+        if duration <= 0:
+            return None
+        return {
+            "arrival rate": (arrivals / duration, duration),
+            "rejection rate": (rejections / duration, duration),
+            "throughput": (successes / duration, duration),
+            "reliability": (successes / completions if completions > 0 else None, completions),
+            "response time": (self.statistics.period_response_time, successes),
+            "queue average": (self._queue_average(), duration),
+            "utilisation average": (self._average_utilisation(), duration),
+            "busy workers average": (self._busy_workers_average(), duration),
+            "worker count average": (self._worker_count_average(), duration)
+        }
+
+    def has_converged(self, precision, level=0.95):
+        """
+        True once the warm-up is over and the confidence interval on each
+        key metric that was observed is narrower than the given fraction
+        of its mean
+        """
+        if self.batch_means is None or self.warm_up is None:
+            return False
+        for each_metric in self.KEY_METRICS:
+            batch_means = self.batch_means[each_metric]
+            if batch_means.count == 0:
+                continue
+            (mean, half_width, batches, _, _) = batch_means.estimate(level)
+            if half_width is None or batches < BatchMeans.MINIMUM_BATCHES or half_width > precision * abs(mean):
+                return False
+        return True
+
+    def batch_means_estimates(self, level=0.95):
+        """
+        The batch-means estimate of each batched metric, as tuples of the
+        metric, the number of periods observed, followed by the estimate
+        (see BatchMeans.estimate)
+        """
+        for each_metric in self.BATCHED_METRICS:
+            batch_means = self.batch_means[each_metric]
+            yield (each_metric, batch_means.count) + batch_means.estimate(level)
+
+    def _initial_worker_count(self):
+        worker_pool = self.look_up(Symbols.WORKER_POOL)
+        if worker_pool is None: return 0
+        return worker_pool.capacity
+
+    def _open_windows(self):
+        now = self.schedule.time_now
+        self._queue_window = self.gauges.queue.window(now)
+        self._busy_workers_window = self.gauges.busy_workers.window(now)
+        self._worker_count_window = self.gauges.worker_count.window(now)
+
+    def _restart_windows(self):
+        now = self.schedule.time_now
+        for each_window in [self._queue_window, self._busy_workers_window, self._worker_count_window]:
+            each_window.restart(now)
 
     def _add_custom_probes(self):
         for each_operation in self._all_operations():
             self._add_response_time(each_operation)
+            self._add_response_time_quantiles(each_operation)
+            self._add_maximum_response_time(each_operation)
             self._add_reliability(each_operation)
             self._add_arrival_rate(each_operation)
+            self._add_latency_breakdown(each_operation)
 
     def _add_response_time(self, operation):
         response_time = Probe("response time " + operation.name,
@@ -416,6 +1025,24 @@ class Monitor(SimulatedEntity):
                           lambda self: self.statistics.response_time_for(operation.name))
         self.probes.append(response_time)
 
+    def _add_response_time_quantiles(self, operation):
+        for (each_name, each_quantile) in self.QUANTILES:
+            self.probes.append(self._quantile_probe(operation.name, each_name, each_quantile))
+
+    @staticmethod
+    def _quantile_probe(operation, name, quantile):
+        return Probe("response time {:s} {:s}".format(name, operation),
+                     10,
+                     "{:5.2f}",
+                     lambda self: self.statistics.period_response_time_quantile_for(operation, quantile))
+
+    def _add_maximum_response_time(self, operation):
+        maximum = Probe("response time max " + operation.name,
+                        10,
+                        "{:5.2f}",
+                        lambda self: self.statistics.period_maximum_response_time_for(operation.name))
+        self.probes.append(maximum)
+
     def _add_reliability(self, operation):
         reliability = Probe("reliability " + operation.name,
                           10,
@@ -430,6 +1057,17 @@ class Monitor(SimulatedEntity):
                           lambda self: self.statistics.request_count_for(operation.name) / self.period)
         self.probes.append(arrival_rate)
 
+    def _add_latency_breakdown(self, operation):
+        for (each_phase, each_name) in enumerate(Span.PHASES):
+            self.probes.append(self._phase_probe(operation.name, each_phase, each_name))
+
+    @staticmethod
+    def _phase_probe(operation, phase, name):
+        return Probe(name + " time " + operation,
+                     10,
+                     "{:5.2f}",
+                     lambda self: self.latency.average(operation, phase))
+
     def _all_operations(self):
         for (symbol, entity) in list(self.environment.bindings.items()):
             if isinstance(entity, Operation):
@@ -438,21 +1076,28 @@ class Monitor(SimulatedEntity):
     def set_probes(self, probes):
         assert len(probes) > 0, "Invalid monitoring: No probes given!"
         self.probes = probes
-        self.report = self._create_report(self._header_format())
+        self.report = self._create_report()
+
+    def _create_report(self):
+        return self.simulation._storage.report_for(self._entity_name(), self.probes)
 
-    def _create_report(self, format):
-        name = self.look_up(Symbols.SERVICE).name
-        return self.simulation._storage.report_for(name, format)
+    def _entity_name(self):
+        return self.look_up(Symbols.SERVICE).name
 
-    def _header_format(self):
-        return [(each_probe.name, "%s") for each_probe in self.probes]
+    def _span_report(self):
+        return self.simulation._storage.spans
 
     def monitor(self):
         observations = {}
         for each_probe in self.probes:
-            observations[each_probe.name] = each_probe.formatted(self)
+            observations[each_probe.name] = each_probe.measure(self)
         self.report(**observations)
-        #self.statistics.reset()
+        if self.batch_means is not None:
+            self._add_to_batch_means()
+        self.statistics.new_period()
+        self.latency.new_period()
+        self._restart_windows()
+        self._window_start = self.schedule.time_now
 
     def _queue_length(self):
         return self.tasks.active
@@ -471,6 +1116,40 @@ class Monitor(SimulatedEntity):
 
         return worker_pool.capacity
 
+    def _is_client(self):
+        return isinstance(self.look_up(Symbols.SERVICE), ClientStub)
+
+    def _queue_average(self):
+        if self._is_client(): return None
+        return self._queue_window.average(self.schedule.time_now)
+
+    def _queue_maximum(self):
+        if self._is_client(): return None
+        return self._queue_window.maximum
+
+    def _average_utilisation(self):
+        if self._is_client(): return None
+        now = self.schedule.time_now
+        capacity = self._worker_count_window.integral(now)
+        if capacity <= 0: return None
+        return 100 * self._busy_workers_window.integral(now) / capacity
+
+    def _busy_workers_average(self):
+        if self._is_client(): return None
+        return self._busy_workers_window.average(self.schedule.time_now)
+
+    def _busy_workers_maximum(self):
+        if self._is_client(): return None
+        return self._busy_workers_window.maximum
+
+    def _worker_count_average(self):
+        if self._is_client(): return None
+        return self._worker_count_window.average(self.schedule.time_now)
+
+    def _worker_count_maximum(self):
+        if self._is_client(): return None
+        return self._worker_count_window.maximum
+
     def _arrival_rate(self):
         return self.statistics.arrival_count / self.period
 
@@ -486,25 +1165,32 @@ class Monitor(SimulatedEntity):
     def _response_time(self):
         return self.statistics.response_time
 
+    def _response_time_quantile(self, q):
+        return self.statistics.period_response_time_quantile(q)
+
+    def _maximum_response_time(self):
+        return self.statistics.period_maximum_response_time
+
 
 class Logger(SimulatedEntity, Listener):
-    REQUEST_RECEIVED = "Task {request:d} received"
-    TASK_ACTIVATED = "Task {task:d} activated"
-    TASK_PAUSED = "Task {task:d} paused"
-    TASK_ASSIGNED = "Task {task:d} assigned to Worker {worker:d}"
-    ERROR_REPLIED = "Reply to Task. {request:d} (ERROR)"
-    SUCCESS_REPLIED = "Reply to Task. {request:d} (SUCCESS)"
-
-    REQUEST_SENT = "Req. {request:d} sent to {service:s}::{operation:s}"
-    REQUEST_ACCEPTED = "Req. {request:d} accepted"
-    REQUEST_REJECTED = "Req. {request:d} rejected!"
-    REQUEST_TIMEOUT = "Req. {request:d} timeout!"
-    REQUEST_FAILURE = "Req. {request:d} failed!"
-    REQUEST_SUCCESS = "Req. {request:d} successful"
-
-    def __init__(self, environment):
+    REQUEST_RECEIVED = EventCode.TEMPLATES[EventCode.TASK_RECEIVED]
+    TASK_ACTIVATED = EventCode.TEMPLATES[EventCode.TASK_ACTIVATED]
+    TASK_PAUSED = EventCode.TEMPLATES[EventCode.TASK_PAUSED]
+    TASK_ASSIGNED = EventCode.TEMPLATES[EventCode.TASK_ASSIGNED]
+    ERROR_REPLIED = EventCode.TEMPLATES[EventCode.ERROR_REPLIED]
+    SUCCESS_REPLIED = EventCode.TEMPLATES[EventCode.SUCCESS_REPLIED]
+
+    REQUEST_SENT = EventCode.TEMPLATES[EventCode.REQUEST_SENT]
+    REQUEST_ACCEPTED = EventCode.TEMPLATES[EventCode.REQUEST_ACCEPTED]
+    REQUEST_REJECTED = EventCode.TEMPLATES[EventCode.REQUEST_REJECTED]
+    REQUEST_TIMEOUT = EventCode.TEMPLATES[EventCode.REQUEST_TIMEOUT]
+    REQUEST_FAILURE = EventCode.TEMPLATES[EventCode.REQUEST_FAILURE]
+    REQUEST_SUCCESS = EventCode.TEMPLATES[EventCode.REQUEST_SUCCESS]
+
+    def __init__(self, environment, tracing=None):
         SimulatedEntity.__init__(self, Symbols.LOGGER, environment)
         Listener.__init__(self)
+        self.filter = TraceFilter(tracing or Tracing())
         self.listener.register(self)
 
     def resuming(self, request):
@@ -517,45 +1203,101 @@ class Logger(SimulatedEntity, Listener):
         pass
 
     def task_created(self, request):
-        self._log(self.REQUEST_RECEIVED, request=request.identifier)
+        self._log(EventCode.TASK_RECEIVED, request)
 
     def task_assigned_to(self, task, worker):
-        self._log(self.TASK_ASSIGNED, task=task.identifier, worker=worker.identifier)
+        self._log(EventCode.TASK_ASSIGNED, task, worker=worker.identifier)
 
     def task_paused(self, task):
-        self._log(self.TASK_PAUSED, task=task.identifier)
+        self._log(EventCode.TASK_PAUSED, task)
 
     def task_activated(self, task):
-        self._log(self.TASK_ACTIVATED, task=task.identifier)
+        self._log(EventCode.TASK_ACTIVATED, task)
 
     def task_failed(self, task):
-        self._log(self.ERROR_REPLIED, request=task.identifier)
+        self._log(EventCode.ERROR_REPLIED, task)
 
     def task_successful(self, request):
-        self._log(self.SUCCESS_REPLIED, request=request.identifier)
+        self._log(EventCode.SUCCESS_REPLIED, request)
 
     def task_cancelled(self, task):
         pass
 
     def failure_of(self, request):
-        self._log(self.REQUEST_FAILURE, request=request.identifier)
+        self._log(EventCode.REQUEST_FAILURE, request)
 
     def success_of(self, request):
-        self._log(self.REQUEST_SUCCESS, request=request.identifier)
+        self._log(EventCode.REQUEST_SUCCESS, request)
 
     def posting_of(self, service, request):
-        self._log(self.REQUEST_SENT, request=request.identifier, service=service, operation=request.operation)
+        self._log(EventCode.REQUEST_SENT, request, service=service)
 
     def acceptance_of(self, request):
-        self._log(self.REQUEST_ACCEPTED, request=request.identifier)
+        self._log(EventCode.REQUEST_ACCEPTED, request)
 
     def rejection_of(self, request):
-        self._log(self.REQUEST_REJECTED, request=request.identifier)
+        self._log(EventCode.REQUEST_REJECTED, request)
 
     def timeout_of(self, request):
-        self._log(self.REQUEST_TIMEOUT, request=request.identifier)
+        self._log(EventCode.REQUEST_TIMEOUT, request)
 
-    def _log(self, message, **values):
-        now = self.schedule.time_now
+    def worker_created(self, worker):
+        pass
+
+    def worker_busy(self, worker):
+        pass
+
+    def worker_idle(self, worker):
+        pass
+
+    def worker_shutdown(self, worker):
+        pass
+
+    def _log(self, code, subject, **values):
+        if not subject.is_traced:
+            return
         caller = self.look_up(Symbols.SELF)
-        self.simulation.log.record(now, caller.name, message.format(**values))
+        if self.filter.accepts(code, caller.name, subject.operation):
+            now = self.schedule.time_now
+            self.simulation.log.trace(
+                now, caller.name, code, request=subject.identifier, operation=subject.operation, **values)
+
+
+class TraceFilter:
+    """
+    Select the events that are traced, according to the trace level, and
+    to the services (or operations) that are included or excluded. These
+    patterns apply to the entity that records the event.
+    """
+
+    EVENTS = {
+        Tracing.OFF: frozenset(),
+        Tracing.REQUESTS: frozenset([
+            EventCode.TASK_RECEIVED, EventCode.ERROR_REPLIED, EventCode.SUCCESS_REPLIED,
+            EventCode.REQUEST_SENT, EventCode.REQUEST_ACCEPTED, EventCode.REQUEST_REJECTED,
+            EventCode.REQUEST_TIMEOUT, EventCode.REQUEST_FAILURE, EventCode.REQUEST_SUCCESS]),
+    }
+    EVENTS[Tracing.TASKS] = EVENTS[Tracing.REQUESTS] | {EventCode.TASK_ACTIVATED, EventCode.TASK_PAUSED}
+    EVENTS[Tracing.ALL] = EVENTS[Tracing.TASKS] | {EventCode.TASK_ASSIGNED}
+
+    def __init__(self, tracing):
+        self.events = self.EVENTS[tracing.level]
+        self.include = [self._pattern(each) for each in tracing.include]
+        self.exclude = [self._pattern(each) for each in tracing.exclude]
+
+    @staticmethod
+    def _pattern(text):
+        (service, _, operation) = text.partition("/")
+        return service, operation or None
+
+    def accepts(self, code, entity, operation):
+        if code not in self.events:
+            return False
+        if self.include and not self._matches(self.include, entity, operation):
+            return False
+        return not self._matches(self.exclude, entity, operation)
+
+    @staticmethod
+    def _matches(patterns, entity, operation):
+        return any(service == entity and (expected is None or expected == operation)
+                   for (service, expected) in patterns)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from hashlib import sha256
+from random import Random
+
+
+class RandomStream:
+    """
+    A sequence of random numbers that only serves one purpose of one
+    entity. An antithetic stream draws 1-u wherever the regular stream
+    with the same seed draws u.
+    """
+
+    def __init__(self, seed, antithetic=False):
+        self._generator = Random(seed)
+        self.antithetic = antithetic
+
+    def random(self):
+        """
+        A number drawn uniformly in [0, 1[, or in ]0, 1] for antithetic
+        streams, which draw 1 - u instead of u
+        """
+        value = self._generator.random()
+        return 1 - value if self.antithetic else value
+
+    def randint(self, lower, upper):
+        """
+        An integer drawn uniformly in [lower, upper]
+        """
+        span = upper - lower + 1
+        return lower + min(int(self.random() * span), span - 1)
+
+
+class RandomStreams:
+    """
+    The random streams of a simulation, one for each entity and purpose
+    (e.g., 'DB' and 'fail'). Each stream is seeded from the seed of the
+    simulation and its key alone, so that two configurations of the same
+    model, run with the same seed, draw the same numbers for the same
+    entities, whatever the order in which their events happen (i.e.,
+    common random numbers).
+    """
+
+    def __init__(self, seed, antithetic=False):
+        self.seed = seed
+        self.antithetic = antithetic
+        self._streams = {}
+
+    def stream_for(self, entity, purpose):
+        key = (entity, purpose)
+        if key not in self._streams:
+            self._streams[key] = RandomStream(self._seed_of(entity, purpose), self.antithetic)
+        return self._streams[key]
+
+    def _seed_of(self, entity, purpose):
+        text = "{!s}/{!s}/{!s}".format(self.seed, entity, purpose)
+        return int.from_bytes(sha256(text.encode("utf-8")).digest()[:8], "big")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from copy import deepcopy
+from json import load
+
+from mad.ast.commons import Expression
+from mad.ast.actions import Query
+from mad.evaluation import Symbols
+from mad.simulation.service import Service, Operation
+from mad.simulation.client import ClientStub
+from mad.simulation.throttling import TailDrop
+
+
+class InvalidReconfiguration(Exception):
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Change:
+    """
+    A change to one entity of a running simulation, which the entity
+    applies in place. KIND is the kind of entity (i.e., 'service' or
+    'client') that the change applies to, if only one, and OPTIONS are
+    the other properties that the change needs.
+    """
+
+    KIND = None
+    KINDS = {"service": Service, "client": ClientStub}
+    OPTIONS = ()
+
+    def __init__(self, entity, value):
+        self.entity = entity
+        self.value = value
+
+    def __repr__(self):
+        return "{:s}({!s}, {!s})".format(type(self).__name__, self.entity, self.value)
+
+    @classmethod
+    def accepts(cls, value):
+        return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+    def check(self, simulation):
+        entity = simulation.environment.look_up(self.entity)
+        kinds = [self.KIND] if self.KIND else list(self.KINDS)
+        if not any(isinstance(entity, self.KINDS[each]) for each in kinds):
+            raise InvalidReconfiguration("No {:s} named '{!s}' in the model".format(" or ".join(kinds), self.entity))
+
+    def apply(self, simulation):
+        self._apply_to(simulation.environment.look_up(self.entity))
+
+    def _apply_to(self, entity):
+        raise NotImplementedError("Change::_apply_to is abstract!")
+
+
+class WorkerCount(Change):
+    """
+    Set the number of workers of a service, and pin its autoscaling
+    limits to this number, so that it does not scale back
+    """
+
+    KIND = "service"
+
+    def _apply_to(self, service):
+        service.look_up(Symbols.AUTOSCALING).limits = (self.value, self.value)
+        service.workers.set_capacity(self.value)
+
+
+class AutoscalingLimits(Change):
+    """
+    Set the autoscaling limits of a service, and bring its number of
+    workers within these limits right away
+    """
+
+    KIND = "service"
+
+    @classmethod
+    def accepts(cls, value):
+        return isinstance(value, list) and len(value) == 2 and all(Change.accepts(each) for each in value) \
+               and value[0] <= value[1]
+
+    def _apply_to(self, service):
+        autoscaler = service.look_up(Symbols.AUTOSCALING)
+        autoscaler.limits = tuple(self.value)
+        worker_count = autoscaler.clamp(service.workers.capacity)
+        if worker_count != service.workers.capacity:
+            service.workers.set_capacity(worker_count)
+
+
+class TailDropCapacity(Change):
+    """
+    Set the capacity of the tail-drop of a service, which starts
+    throttling if it did not
+    """
+
+    KIND = "service"
+
+    def _apply_to(self, service):
+        throttling = service.tasks
+        if isinstance(throttling.delegate, TailDrop):
+            throttling.delegate.capacity = self.value
+        else:
+            throttling.delegate = TailDrop(throttling.delegate.delegate, self.value)
+
+
+class ClientPeriod(Change):
+    """
+    Set the period of a client, from its next request on
+    """
+
+    KIND = "client"
+
+    def _apply_to(self, client):
+        client.period = self.value
+
+
+class QueryTimeout(Change):
+    """
+    Set the timeout of the queries that a service or a client sends to a
+    given operation (e.g., 'DB/Select'). Only the operations of that
+    entity are changed, on copies of their bodies, so that the model
+    itself remains as it was parsed.
+    """
+
+    OPTIONS = ("query",)
+
+    def __init__(self, entity, value, query):
+        super().__init__(entity, value)
+        self.query = query
+
+    def check(self, simulation):
+        super().check(simulation)
+        entity = simulation.environment.look_up(self.entity)
+        if not any(self._queries_in(each.body) for each in self._operations_of(entity)):
+            raise InvalidReconfiguration("'{!s}' never queries '{!s}'".format(self.entity, self.query))
+
+    def _apply_to(self, entity):
+        for each_operation in self._operations_of(entity):
+            body = deepcopy(each_operation.body)
+            for each_query in self._queries_in(body):
+                each_query.timeout = self.value
+            each_operation.body = body
+
+    @staticmethod
+    def _operations_of(entity):
+        return [each for each in entity.environment.bindings.values() if isinstance(each, Operation)]
+
+    def _queries_in(self, expression):
+        queries = []
+        if isinstance(expression, Query) and "{:s}/{:s}".format(expression.service, expression.operation) == self.query:
+            queries.append(expression)
+        for each_value in vars(expression).values():
+            children = each_value if isinstance(each_value, list) else [each_value]
+            for each_child in children:
+                if isinstance(each_child, Expression):
+                    queries.extend(self._queries_in(each_child))
+        return queries
+
+
+class Burst(Change):
+    """
+    Have a client send a given number of extra requests at once
+    """
+
+    KIND = "client"
+
+    def _apply_to(self, client):
+        for _ in range(self.value):
+            client.invoke()
+
+
+class Reconfiguration:
+    """
+    A list of changes, each scheduled at a given time, read from JSON
+    entries such as:
+
+        {"at": 5000, "service": "DB", "workers": 4}
+        {"at": 6000, "service": "DB", "autoscaling": [2, 10]}
+        {"at": 7000, "client": "Browser", "query": "DB/Select", "timeout": 50}
+
+    where the time defaults to the given one, if any.
+    """
+
+    CHANGES = {"workers": WorkerCount, "autoscaling": AutoscalingLimits, "tail-drop": TailDropCapacity,
+               "period": ClientPeriod, "timeout": QueryTimeout, "burst": Burst}
+
+    @classmethod
+    def load(cls, source):
+        """
+        Read a timeline of changes, as a JSON list of entries that all
+        give their time
+        """
+        try:
+            entries = load(source)
+        except ValueError as error:
+            raise InvalidReconfiguration("Invalid JSON ({!s})".format(error))
+        return cls.from_json(entries)
+
+    @classmethod
+    def from_json(cls, entries, default_time=None):
+        if not isinstance(entries, list):
+            raise InvalidReconfiguration("Expecting a list of changes (found '{!s}')".format(entries))
+        return cls([cls._change_from(each_entry, default_time) for each_entry in entries])
+
+    @classmethod
+    def _change_from(cls, entry, default_time):
+        if not isinstance(entry, dict):
+            raise InvalidReconfiguration("Expecting a change such as {{\"service\": \"DB\", \"workers\": 4}} (found '{!s}')".format(entry))
+        entry = dict(entry)
+        time = entry.pop("at", default_time)
+        if not isinstance(time, int) or time < 0:
+            raise InvalidReconfiguration("Expecting a positive integer time in {!s}".format(entry))
+        kinds = [each for each in Change.KINDS if each in entry]
+        changes = [each for each in cls.CHANGES if each in entry]
+        if len(kinds) != 1 or len(changes) != 1:
+            raise InvalidReconfiguration("Expecting one entity and one of {!s} (found {!s})".format(", ".join(cls.CHANGES), entry))
+        (kind, name) = (kinds[0], changes[0])
+        change_type = cls.CHANGES[name]
+        if set(entry) != {kind, name} | set(change_type.OPTIONS):
+            raise InvalidReconfiguration("'{!s}' expects {!s} (found {!s})".format(name, ", ".join((kind, name) + change_type.OPTIONS), entry))
+        if change_type.KIND not in (None, kind):
+            raise InvalidReconfiguration("'{!s}' only applies to a {!s}".format(name, change_type.KIND))
+        if not change_type.accepts(entry[name]):
+            raise InvalidReconfiguration("Invalid value for '{!s}' (found '{!s}')".format(name, entry[name]))
+        return time, change_type(entry[kind], entry[name], *[entry[each] for each in change_type.OPTIONS])
+
+    def __init__(self, changes):
+        self.changes = sorted(changes, key=lambda each: each[0])
+
+    def check(self, simulation):
+        for (_, each_change) in self.changes:
+            each_change.check(simulation)
+
+    def schedule(self, simulation):
+        """
+        Apply the changes due now, and schedule the others
+        """
+        for (time, each_change) in self.changes:
+            if time == simulation.schedule.time_now:
+                each_change.apply(simulation)
+            else:
+                simulation.schedule.at(time, lambda change=each_change: change.apply(simulation))
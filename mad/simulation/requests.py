@@ -36,6 +36,7 @@ class Request:
         self.priority = priority
         self.continuation = continuation
         self.identifier = self.sender.next_request_id()
+        self.is_traced = task.is_traced
         self.status = RequestStatus.PENDING
         self._response_time = None
         self._emission_time = None
@@ -52,6 +53,10 @@ class Request:
         assert self.status == RequestStatus.OK, "Only successful requests expose a 'response time'"
         return self._response_time
 
+    @property
+    def emission_time(self):
+        return self._emission_time
+
     @property
     def is_pending(self):
         return self.status == RequestStatus.PENDING
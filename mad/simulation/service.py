@@ -66,7 +66,7 @@ class Service(SimulatedEntity):
             self.tasks.put(task)
 
     def release(self, worker):
-        if self.tasks.are_pending:
+        if self.tasks.are_pending and not self.workers.is_stopped(worker):
             task = self.tasks.take()
             task.assign_to(worker)
         else:
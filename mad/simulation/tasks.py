@@ -204,6 +204,8 @@ class Task:
         self.worker = None
         self.request = request
         self.status = TaskStatus.CREATED
+        self.is_backing_off = False
+        self.span = None
 
     @property
     def priority(self):
@@ -221,6 +223,10 @@ class Task:
     def operation(self):
         return self.request.operation
 
+    @property
+    def is_traced(self):
+        return self.request is None or self.request.is_traced
+
     def accept(self):
         self._assert_status_is(TaskStatus.CREATED)
         self.service.listener.task_accepted(self)
@@ -257,8 +263,9 @@ class Task:
         operation = worker.look_up(self.operation)
         operation.invoke(self, [], worker=worker)
 
-    def pause(self):
+    def pause(self, backing_off=False):
         self._assert_status_is(TaskStatus.RUNNING)
+        self.is_backing_off = backing_off
         self.service.listener.task_paused(self)
         self.status = TaskStatus.BLOCKED
         self.service.pause(self)
@@ -91,15 +91,53 @@ class WorkerPoolDecorator(WorkerPool):
 
 
 class WorkerPoolWrapper(SimulatedEntity, WorkerPoolDecorator):
+    """
+    Wrap a worker pool into a simulation entity that notifies the listener
+    whenever a worker changes state
+    """
 
     def __init__(self, environment, delegate):
         SimulatedEntity.__init__(self, Symbols.WORKER_POOL, environment)
         WorkerPoolDecorator.__init__(self, delegate)
+        for each_worker in self.delegate.idle_workers:
+            each_worker.status = WorkerStatus.IDLE
 
     def _new_worker(self, identifier):
         environment = self.environment.create_local_environment()
         environment.define(Symbols.SERVICE, self)
-        return self.factory.create_worker(identifier, environment)
+        worker = self.factory.create_worker(identifier, environment)
+        self.listener.worker_created(worker)
+        self.listener.worker_idle(worker)
+        worker.status = WorkerStatus.IDLE
+        return worker
+
+    def acquire_one(self):
+        worker = self.delegate.acquire_one()
+        self.listener.worker_busy(worker)
+        worker.status = WorkerStatus.BUSY
+        return worker
+
+    def is_stopped(self, worker):
+        return worker in self.delegate.stopped_workers
+
+    def release(self, worker):
+        was_stopped = self.is_stopped(worker)
+        self.delegate.release(worker)
+        if not was_stopped:
+            self.listener.worker_idle(worker)
+            worker.status = WorkerStatus.IDLE
+
+    def shutdown(self, count):
+        """
+        Shut down idle workers first, and then busy ones, which leave the
+        pool right away, though they complete their current task
+        """
+        workers = list(self.delegate.idle_workers) + list(self.delegate.busy_workers)
+        self.delegate.shutdown(count)
+        for each_worker in workers:
+            if each_worker not in self.delegate.idle_workers and each_worker not in self.delegate.busy_workers:
+                self.listener.worker_shutdown(each_worker)
+                each_worker.status = WorkerStatus.STOPPED
 
     def set_capacity(self, capacity):
         error = self.capacity - capacity
@@ -111,7 +149,7 @@ class WorkerPoolWrapper(SimulatedEntity, WorkerPoolDecorator):
 
 
 class WorkerStatus(Enum):
-    STARTING, IDLE, BUSY = list(range(3))
+    STARTING, IDLE, BUSY, STOPPED = list(range(4))
 
 
 class Worker(SimulatedEntity):
@@ -123,6 +161,7 @@ class Worker(SimulatedEntity):
         super().__init__("Worker %d" % identifier, environment)
         self.environment.define(Symbols.WORKER, self)
         self.identifier = identifier
+        self.status = WorkerStatus.STARTING
 
     def boot_up(self):
         # TODO: block the thread for some time, by calling compute
@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from math import atan, ceil, cos, log, pi, sin, sqrt
+
+
+class Accumulator:
+    """
+    Summarise a stream of values in constant memory: count, sum, mean and
+    variance (using Welford's algorithm), as well as the extreme values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self._mean = 0.
+        self._squares = 0.
+        self.minimum = None
+        self.maximum = None
+
+    def reset(self):
+        self.__init__()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._squares += delta * (value - self._mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        """
+        Combine the values summarised by another accumulator into this one
+        (see Chan et al., "Updating formulae and a pairwise algorithm for
+        computing sample variances", 1979)
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self._copy(other)
+            return self
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean += delta * other.count / count
+        self._squares += other._squares + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def _copy(self, other):
+        self.count = other.count
+        self.total = other.total
+        self._mean = other._mean
+        self._squares = other._squares
+        self.minimum = other.minimum
+        self.maximum = other.maximum
+
+    @property
+    def is_empty(self):
+        return self.count == 0
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return None
+        return self._squares / (self.count - 1)
+
+    @property
+    def standard_deviation(self):
+        variance = self.variance
+        if variance is None:
+            return None
+        return sqrt(variance)
+
+    def half_width(self, level=0.95):
+        """
+        The half-width of the confidence interval on the mean, at the given
+        level, assuming values are independent and roughly normal
+        """
+        deviation = self.standard_deviation
+        if deviation is None:
+            return None
+        return student_quantile((1 + level) / 2, self.count - 1) * deviation / sqrt(self.count)
+
+
+def student_probability(t, freedom):
+    """
+    The probability that the absolute value of a Student's t variable, with
+    the given (integer) degrees of freedom, does not exceed t (see Abramowitz
+    & Stegun, "Handbook of Mathematical Functions", 26.7.3 and 26.7.4)
+    """
+    theta = atan(t / sqrt(freedom))
+    if freedom == 1:
+        return 2 * theta / pi
+    square = cos(theta) ** 2
+    if freedom % 2 == 1:
+        term = total = cos(theta)
+        for k in range(1, (freedom - 1) // 2):
+            term *= square * (2 * k) / (2 * k + 1)
+            total += term
+        return 2 / pi * (theta + sin(theta) * total)
+    term = total = 1
+    for k in range(0, (freedom - 2) // 2):
+        term *= square * (2 * k + 1) / (2 * k + 2)
+        total += term
+    return sin(theta) * total
+
+
+def student_quantile(probability, freedom, tolerance=1e-9):
+    """
+    The quantile of Student's t distribution with the given (integer)
+    degrees of freedom, found by bisection
+    """
+    assert 0 < probability < 1, "Probability must be in ]0, 1[ (found {!s})".format(probability)
+    assert freedom >= 1, "Degrees of freedom must be at least 1 (found {!s})".format(freedom)
+    if probability < 0.5:
+        return -student_quantile(1 - probability, freedom, tolerance)
+    target = 2 * probability - 1
+    (low, high) = (0., 1.)
+    while student_probability(high, freedom) < target:
+        (low, high) = (high, 2 * high)
+    while high - low > tolerance * max(1., high):
+        middle = (low + high) / 2
+        if student_probability(middle, freedom) < target:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+class BatchMeans:
+    """
+    Estimate the mean of a series of correlated observations, and its
+    confidence interval, in constant memory. Observations, possibly
+    weighted, are grouped into batches of 'size' observations. Once
+    'capacity' batches are complete, adjacent batches are merged pairwise,
+    which doubles their size (see Fishman & Yarberry, "An Implementation
+    of the Batch Means Method", 1997). When estimating, batches are merged
+    further until the lag-1 autocorrelation of their means falls below a
+    threshold, so that they are roughly independent. A value may stand
+    for several observations (e.g., the mean of a block of them), and
+    batches may then start larger, so that blocks fit in them.
+    """
+
+    DEFAULT_CAPACITY = 64
+    DEFAULT_CORRELATION = 0.2
+    MINIMUM_BATCHES = 8
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, correlation=DEFAULT_CORRELATION, size=1):
+        assert capacity >= 2 * self.MINIMUM_BATCHES and capacity % 2 == 0, \
+            "Capacity must be even and at least {:d} (found {!s})".format(2 * self.MINIMUM_BATCHES, capacity)
+        self.capacity = capacity
+        self.correlation = correlation
+        self.size = size
+        self.count = 0
+        self._batches = []
+        self._total = 0.
+        self._weight = 0.
+        self._pending = 0
+
+    def add(self, value, weight=1, count=1):
+        if value is None or weight <= 0:
+            return
+        self.count += count
+        self._total += value * weight
+        self._weight += weight
+        self._pending += count
+        if self._pending >= self.size:
+            self._batches.append((self._total, self._weight))
+            (self._total, self._weight, self._pending) = (0., 0., 0)
+            if len(self._batches) == self.capacity:
+                self._batches = self._merged(self._batches)
+                self.size *= 2
+
+    @staticmethod
+    def _merged(batches):
+        return [(left[0] + right[0], left[1] + right[1]) for (left, right) in zip(batches[0::2], batches[1::2])]
+
+    @staticmethod
+    def lag_one_correlation(values):
+        if len(values) < 2:
+            return None
+        mean = sum(values) / len(values)
+        deviations = [each - mean for each in values]
+        variance = sum(each ** 2 for each in deviations)
+        if variance <= len(values) * (1e-12 * mean) ** 2:
+            return 0.
+        return sum(left * right for (left, right) in zip(deviations, deviations[1:])) / variance
+
+    def estimate(self, level=0.95):
+        """
+        The mean of the complete batches, the half-width of its confidence
+        interval (or None, without at least two batches), the number and
+        the size of the batches used, and the lag-1 autocorrelation of
+        their means
+        """
+        (batches, size) = (self._batches, self.size)
+        correlation = self.lag_one_correlation([total / weight for (total, weight) in batches])
+        while correlation is not None and correlation > self.correlation and len(batches) // 2 >= self.MINIMUM_BATCHES:
+            (batches, size) = (self._merged(batches), 2 * size)
+            correlation = self.lag_one_correlation([total / weight for (total, weight) in batches])
+        if not batches:
+            return None, None, 0, size, None
+        mean = sum(total for (total, _) in batches) / sum(weight for (_, weight) in batches)
+        means = Accumulator()
+        for (total, weight) in batches:
+            means.add(total / weight)
+        return mean, means.half_width(level), len(batches), size, correlation
+
+
+class MSER:
+    """
+    Detect the end of the warm-up of a series of (possibly weighted)
+    observations, using the MSER-5 rule: the truncation that minimises the
+    standard error of the mean of the remaining batches of 5 observations
+    (see White, "An effective truncation heuristic for bias reduction in
+    simulation output", 1997). Missing observations still count as
+    periods, so that truncations are given in periods. Only truncations
+    in the first half of the series are considered, and the series does
+    not look steady while the best one is at the very end of that half.
+    Memory is bounded: once 'capacity' batches are complete, adjacent
+    batches are merged pairwise, as BatchMeans does, so that truncations
+    get coarser as the series grows.
+    """
+
+    BATCH_SIZE = 5
+    MINIMUM_BATCHES = 10
+    DEFAULT_CAPACITY = 64
+
+    def __init__(self, batch_size=BATCH_SIZE, capacity=DEFAULT_CAPACITY):
+        assert capacity >= 2 * self.MINIMUM_BATCHES and capacity % 2 == 0, \
+            "Capacity must be even and at least {:d} (found {!s})".format(2 * self.MINIMUM_BATCHES, capacity)
+        self.batch_size = batch_size
+        self.capacity = capacity
+        self.periods = 0
+        self.count = 0
+        self._batches = []
+        self._total = 0.
+        self._weight = 0.
+        self._pending = 0
+
+    def add(self, value, weight=1):
+        self.periods += 1
+        if value is None or weight <= 0:
+            return
+        self.count += 1
+        self._total += value * weight
+        self._weight += weight
+        self._pending += 1
+        if self._pending == self.batch_size:
+            self._batches.append((self._total, self._weight, self.periods))
+            (self._total, self._weight, self._pending) = (0., 0., 0)
+            if len(self._batches) == self.capacity:
+                self._batches = [(left[0] + right[0], left[1] + right[1], right[2])
+                                 for (left, right) in zip(self._batches[0::2], self._batches[1::2])]
+                self.batch_size *= 2
+
+    def truncation(self):
+        """
+        The number of periods that belong to the warm-up, or None if the
+        series does not look steady yet
+        """
+        count = len(self._batches)
+        if count < self.MINIMUM_BATCHES:
+            return None
+        (best, best_statistic) = (None, None)
+        (total, squares) = (0., 0.)
+        for index in range(count - 1, -1, -1):
+            mean = self._batches[index][0] / self._batches[index][1]
+            total += mean
+            squares += mean ** 2
+            remaining = count - index
+            if index > count // 2:
+                continue
+            statistic = max(squares - total ** 2 / remaining, 0.) / remaining ** 2
+            if best_statistic is None or statistic <= best_statistic:
+                (best, best_statistic) = (index, statistic)
+        if best == count // 2:
+            return None
+        return self._batches[best - 1][2] if best > 0 else 0
+
+
+class PeriodBlocks:
+    """
+    Hold a series of periods, where several metrics are observed (with a
+    weight), in bounded memory: consecutive periods are summed into
+    blocks of 'size' periods, and once 'capacity' blocks are complete,
+    adjacent blocks are merged pairwise, which doubles their size. Each
+    block keeps the total, the weight and the number of the observations
+    of each metric, which is all one needs to replay them (e.g., into
+    BatchMeans once the warm-up is over).
+    """
+
+    DEFAULT_CAPACITY = 128
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        assert capacity >= 2 and capacity % 2 == 0, "Capacity must be even (found {!s})".format(capacity)
+        self.capacity = capacity
+        self.size = 1
+        self.periods = 0
+        self._blocks = []
+        self._pending = 0
+
+    def add(self, start, observations):
+        """
+        Add a period, which starts at the given time, given the (value,
+        weight) pair observed for each metric
+        """
+        if self._pending == 0:
+            self._blocks.append((self.periods, start, {}))
+        sums = self._blocks[-1][2]
+        for (metric, (value, weight)) in observations.items():
+            if value is None or weight <= 0:
+                continue
+            (total, weights, count) = sums.get(metric, (0., 0., 0))
+            sums[metric] = (total + value * weight, weights + weight, count + 1)
+        self.periods += 1
+        self._pending += 1
+        if self._pending == self.size:
+            self._pending = 0
+            if len(self._blocks) == self.capacity:
+                self._blocks = [self._merged(left, right)
+                                for (left, right) in zip(self._blocks[0::2], self._blocks[1::2])]
+                self.size *= 2
+
+    @staticmethod
+    def _merged(left, right):
+        sums = dict(left[2])
+        for (metric, (total, weight, count)) in right[2].items():
+            (previous_total, previous_weight, previous_count) = sums.get(metric, (0., 0., 0))
+            sums[metric] = (previous_total + total, previous_weight + weight, previous_count + count)
+        return left[0], left[1], sums
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def since(self, period):
+        """
+        The blocks that start at or after the given period, as pairs of
+        their start time and of the (mean, weight, count) of each metric
+        """
+        for (first, start, sums) in self._blocks:
+            if first >= period:
+                yield start, {metric: (total / weight, weight, count)
+                              for (metric, (total, weight, count)) in sums.items()}
+
+
+class QuantileSketch:
+    """
+    Approximate the quantiles of a stream of non-negative values, within a
+    given relative accuracy, using logarithmic buckets (see Masson et al.,
+    "DDSketch: A Fast and Fully-Mergeable Quantile Sketch with Relative-Error
+    Guarantees", 2019). Memory is bounded: once the bucket limit is reached,
+    the lowest buckets are collapsed, which only degrades the lowest quantiles.
+    """
+
+    DEFAULT_ACCURACY = 0.01
+    DEFAULT_BUCKET_LIMIT = 2048
+    INCOMPATIBLE_SKETCHES = "Cannot merge sketches with different accuracies ({:f} and {:f})"
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY, bucket_limit=DEFAULT_BUCKET_LIMIT):
+        assert 0 < accuracy < 1, "Accuracy must be in ]0, 1[ (found {!s})".format(accuracy)
+        assert bucket_limit > 1, "At least two buckets are needed (found {!s})".format(bucket_limit)
+        self.accuracy = accuracy
+        self.bucket_limit = bucket_limit
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = log(self._gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def reset(self):
+        self.buckets.clear()
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = ceil(log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.bucket_limit:
+            self._collapse()
+
+    def merge(self, other):
+        if other.accuracy != self.accuracy:
+            raise ValueError(self.INCOMPATIBLE_SKETCHES.format(self.accuracy, other.accuracy))
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for (index, count) in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.bucket_limit:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.bucket_limit
+        target = indexes[excess]
+        for each_index in indexes[:excess]:
+            self.buckets[target] += self.buckets.pop(each_index)
+
+    @property
+    def is_empty(self):
+        return self.count == 0
+
+    def quantile(self, q):
+        assert 0 <= q <= 1, "Quantile must be in [0, 1] (found {!s})".format(q)
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0
+        for each_index in sorted(self.buckets):
+            seen += self.buckets[each_index]
+            if seen > rank:
+                return self._value_of(each_index)
+        return self._value_of(max(self.buckets))
+
+    def _value_of(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+
+class TimeWeightedGauge:
+    """
+    Integrate over time a level that changes by steps (e.g., the length of a
+    queue), so that its exact average can be computed over any window, at a
+    constant cost per change.
+    """
+
+    def __init__(self, time=0, level=0):
+        self.level = level
+        self.origin = time
+        self._time = time
+        self._area = 0
+        self._windows = []
+
+    def update(self, time, level):
+        assert time >= self._time, "Time is moving backward (now {!s}, last {!s})".format(time, self._time)
+        self._area += self.level * (time - self._time)
+        self._time = time
+        self.level = level
+        for each_window in self._windows:
+            each_window.observe(level)
+
+    def increment(self, time, delta=1):
+        self.update(time, self.level + delta)
+
+    def decrement(self, time, delta=1):
+        self.update(time, self.level - delta)
+
+    def integral(self, time):
+        """
+        The area under the level, since the creation of the gauge
+        """
+        return self._area + self.level * (time - self._time)
+
+    def window(self, time):
+        window = GaugeWindow(self, time)
+        self._windows.append(window)
+        return window
+
+
+class GaugeWindow:
+    """
+    Observe a gauge from a given time onward, keeping track of its average
+    and maximum level.
+    """
+
+    def __init__(self, gauge, time):
+        self.gauge = gauge
+        self.restart(time)
+
+    def restart(self, time):
+        self.start = time
+        self._start_area = self.gauge.integral(time)
+        self.maximum = self.gauge.level
+
+    def observe(self, level):
+        if level > self.maximum:
+            self.maximum = level
+
+    def integral(self, time):
+        return self.gauge.integral(time) - self._start_area
+
+    def average(self, time):
+        duration = time - self.start
+        if duration <= 0:
+            return self.gauge.level
+        return self.integral(time) / duration
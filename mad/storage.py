@@ -17,34 +17,384 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from os import makedirs
+from importlib import import_module
+from os import makedirs, getpid, replace
 from os.path import exists, dirname
 
+from mad.cache import user_cache_directory
+
+
+class Compression:
+    """
+    A streaming compression codec (gzip, xz or bzip2) and its level, as
+    in 'gzip' or 'xz:6'. Compressed files are named after the original
+    one, plus the extension of the codec.
+    """
+
+    GZIP = "gzip"
+    XZ = "xz"
+    BZIP2 = "bzip2"
+
+    # codec: (extension, module, name of the level parameter, levels)
+    # Modules are imported on first use only
+    CODECS = {
+        GZIP: (".gz", "gzip", "compresslevel", range(1, 10)),
+        XZ: (".xz", "lzma", "preset", range(0, 10)),
+        BZIP2: (".bz2", "bz2", "compresslevel", range(1, 10))
+    }
+
+    @classmethod
+    def parse(cls, text):
+        (codec, _, level) = text.partition(":")
+        return cls(codec, int(level) if level else None)
+
+    @classmethod
+    def of(cls, location):
+        """
+        The codec whose extension ends the given location, if any
+        """
+        for (codec, (extension, _, _, _)) in cls.CODECS.items():
+            if location.endswith(extension):
+                return cls(codec)
+        return None
+
+    @classmethod
+    def uncompressed(cls, location):
+        compression = cls.of(location)
+        if compression is None:
+            return location
+        return location[:-len(compression.extension)]
+
+    def __init__(self, codec, level=None):
+        if codec not in self.CODECS:
+            raise ValueError("Unknown compression '{!s}' (expecting one of {!s})".format(codec, ", ".join(self.CODECS)))
+        (_, _, _, levels) = self.CODECS[codec]
+        if level is not None and level not in levels:
+            raise ValueError("Invalid {!s} level {:d} (expecting {:d} to {:d})".format(codec, level, levels[0], levels[-1]))
+        self.codec = codec
+        self.level = level
+
+    def __eq__(self, other):
+        return isinstance(other, Compression) and (self.codec, self.level) == (other.codec, other.level)
+
+    def __repr__(self):
+        return self.codec if self.level is None else "{!s}:{:d}".format(self.codec, self.level)
+
+    @property
+    def extension(self):
+        return self.CODECS[self.codec][0]
+
+    def open(self, location, mode):
+        (_, module, level_name, _) = self.CODECS[self.codec]
+        opener = import_module(module).open
+        if self.level is None or "r" in mode:
+            return opener(location, mode)
+        return opener(location, mode, **{level_name: self.level})
+
+
+class CompressedView:
+    """
+    Expose a compressed file as a memory map would, that is, through
+    slicing and 'find', but decompress only the parts that are read, by
+    chunks, so that memory remains bounded whatever the size of the
+    file. The last chunks read are kept, from the lowest offset asked
+    for onwards, so that reading forward never decompresses the same
+    data twice. Reading backwards means decompressing again from the
+    start.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self._length = None
+        self._offset = 0
+        self._buffer = bytearray()
+
+    def __len__(self):
+        if self._length is None:
+            self._length = self.source.seek(0, 2)
+            self._offset, self._buffer = self._length, bytearray()
+        return self._length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("Only contiguous slices are supported (found {!r})".format(index))
+        start = index.start or 0
+        self._cover(start, index.stop)
+        stop = len(self._buffer) if index.stop is None else index.stop - self._offset
+        return bytes(self._buffer[start - self._offset:stop])
+
+    def find(self, pattern, start=0, end=None):
+        self._cover(start, start)
+        searched = start - self._offset
+        while True:
+            found = self._buffer.find(pattern, searched)
+            if found >= 0:
+                found += self._offset
+                return found if end is None or found + len(pattern) <= end else -1
+            if end is not None and self._offset + len(self._buffer) >= end:
+                return -1
+            searched = max(start - self._offset, len(self._buffer) - len(pattern) + 1)
+            if not self._read_chunk():
+                return -1
+
+    def _cover(self, start, stop):
+        """
+        Hold the data from the given offset up to the given one (None
+        stands for the end of the file), dropping what comes before
+        """
+        if start < self._offset or start > self._offset + len(self._buffer):
+            self.source.seek(start)
+            self._offset, self._buffer = start, bytearray()
+        else:
+            del self._buffer[:start - self._offset]
+            self._offset = start
+        while stop is None or self._offset + len(self._buffer) < stop:
+            if not self._read_chunk():
+                break
+
+    def _read_chunk(self):
+        chunk = self.source.read(self.chunk_size)
+        self._buffer += chunk
+        return len(chunk) > 0
+
+    def close(self):
+        self.source.close()
+
 
 class FileSystem:
+    """
+    Open the files where simulations read and write. Outputs can be
+    compressed on the fly, and compressed inputs are read transparently,
+    whether one gives their actual name or the name they had before
+    compression.
+    """
+
+    def exists(self, location):
+        return exists(self._locate(location))
 
     def open_input_stream(self, location):
+        location = self._locate(location)
+        compression = Compression.of(location)
+        if compression:
+            return compression.open(location, "rt")
         return open(location, "r")
 
-    def open_output_stream(self, location):
+    def open_output_stream(self, location, compression=None):
+        self._create_directory(location)
+        if compression:
+            output = compression.open(location + compression.extension, "wb")
+            return TextWriter(BackgroundWriter(output))
+        return open(location, "w")
+
+    def open_binary_input_stream(self, location):
+        location = self._locate(location)
+        compression = Compression.of(location)
+        if compression:
+            return compression.open(location, "rb")
+        return open(location, "rb")
+
+    def open_memory_map(self, location):
+        location = self._locate(location)
+        compression = Compression.of(location)
+        if compression:
+            return CompressedView(compression.open(location, "rb"))
+        with open(location, "rb") as source:
+            if source.seek(0, 2) == 0:
+                return b""
+            from mmap import mmap, ACCESS_READ
+            return mmap(source.fileno(), 0, access=ACCESS_READ)
+
+    def open_binary_output_stream(self, location, compression=None):
+        self._create_directory(location)
+        if compression:
+            return compression.open(location + compression.extension, "wb")
+        return open(location, "wb")
+
+    def replace(self, source, destination):
+        replace(source, destination)
+
+    @staticmethod
+    def _locate(location):
+        if exists(location):
+            return location
+        for (extension, _, _, _) in Compression.CODECS.values():
+            if exists(location + extension):
+                return location + extension
+        return location
+
+    @staticmethod
+    def _create_directory(location):
         if not exists(location):
             makedirs(dirname(location), exist_ok=True)
-        return open(location, "w")
+
+
+class BackgroundWriter:
+    """
+    Write chunks of data into a stream from a separate thread, so that
+    the simulation does not wait for the disk. Pending chunks wait in a
+    bounded queue, and writing blocks only once this queue is full.
+    """
+
+    DEFAULT_CAPACITY = 64
+
+    def __init__(self, output, capacity=DEFAULT_CAPACITY):
+        from queue import Queue
+        from threading import Thread
+        self.output = output
+        self._chunks = Queue(maxsize=capacity)
+        self._error = None
+        self._thread = Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def write(self, chunk):
+        if self._error:
+            raise self._error
+        self._chunks.put(chunk)
+
+    def _drain(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            if self._error:
+                continue
+            try:
+                self.output.write(chunk)
+            except Exception as error:
+                self._error = error
+
+    def close(self):
+        self._chunks.put(None)
+        self._thread.join()
+        self.output.close()
+        if self._error:
+            raise self._error
+
+
+class TextWriter:
+    """
+    Encode text and hand it over to a BackgroundWriter by large chunks,
+    so that encoding and compression do not happen in the simulation
+    loop, one line at a time
+    """
+
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, writer, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.close()
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.writer.write("".join(self._buffer).encode("utf-8"))
+            self._buffer = []
+            self._size = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class ModelCache:
+    """
+    Keep the models that have already been parsed and validated, together
+    with the warnings they raised, in a binary form (pickle), indexed by
+    a hash of their source and of the version of MAD. Unreadable entries
+    are ignored, and are overwritten once their model is parsed again.
+    """
+
+    UNREADABLE = (OSError, EOFError, AttributeError, ImportError, IndexError, ValueError)
+
+    ENTRY = "{directory:s}/models/{key:s}.pickle"
+
+    def __init__(self, file_system, directory=None):
+        self.file_system = file_system
+        self.directory = directory or user_cache_directory()
+
+    def key_of(self, source):
+        from hashlib import sha256
+        from mad import __version__ as MAD_VERSION
+        return sha256("{:s}\n{:s}".format(MAD_VERSION, source).encode("utf-8")).hexdigest()
+
+    def _location_of(self, source):
+        return self.ENTRY.format(directory=self.directory, key=self.key_of(source))
+
+    def load(self, source):
+        """
+        The pair (model, warnings) cached for the given source, or None
+        """
+        from pickle import load, UnpicklingError
+        location = self._location_of(source)
+        if not self.file_system.exists(location):
+            return None
+        try:
+            with self.file_system.open_binary_input_stream(location) as entry:
+                return load(entry)
+        except self.UNREADABLE + (UnpicklingError,):
+            return None
+
+    def save(self, source, model, warnings):
+        from pickle import dump, HIGHEST_PROTOCOL
+        # Write in a separate file first, as other processes may be loading the same entry
+        location = self._location_of(source)
+        draft = "{:s}.{:d}".format(location, getpid())
+        try:
+            with self.file_system.open_binary_output_stream(draft) as entry:
+                dump((model, warnings), entry, protocol=HIGHEST_PROTOCOL)
+            self.file_system.replace(draft, location)
+        except OSError:
+            pass # Caching is only an optimisation
 
 
 class DataStorage:
 
-    def __init__(self, parser, log, factory):
+    def __init__(self, parser, log, factory, spans=None, models=None):
         self.parser = parser
         self.log = log
         self.report_factory = factory
+        self.spans = spans
+        self.models = models
+        self.warnings = None
 
     def model(self):
+        """
+        The model, as found in the cache if any, in which case 'warnings'
+        holds the warnings raised by its validation
+        """
+        if self.models is not None:
+            cached = self.models.load(self.parser.source)
+            if cached is not None:
+                (model, self.warnings) = cached
+                return model
         return self.parser.parse()
 
+    def remember(self, model, warnings):
+        """
+        Cache the given model, once validated, along with its warnings
+        """
+        if self.models is not None:
+            self.models.save(self.parser.source, model, warnings)
+
     def log(self):
         return self.log
 
-    def report_for(self, name, format):
-        return self.report_factory(name, format)
+    def report_for(self, name, probes):
+        return self.report_factory(name, probes)
 
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from copy import deepcopy
+from itertools import product
+from json import load
+from random import Random
+
+from mad.ast.commons import Expression
+from mad.ast.definitions import Definition
+from mad.ast.actions import Invocation
+
+
+class InvalidSweep(Exception):
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ParameterPath:
+    """
+    Locate a setting in a parsed model, using a dotted path such as
+    'Storage.settings.throttling.capacity'. Each segment but the last one
+    selects either an attribute, a definition (i.e., a service, a client
+    or an operation) by name, an invocation as in 'DB/Select', or any kind
+    of expression, such as 'settings' or 'think'. The last segment is the
+    attribute to set, in every expression that the path selects.
+    """
+
+    SEPARATOR = "."
+
+    def __init__(self, text):
+        self.text = text
+        self.segments = text.split(self.SEPARATOR)
+        if len(self.segments) < 2 or not all(self.segments):
+            raise InvalidSweep("Invalid parameter '{!s}' (expecting a path such as 'DB.settings.throttling.capacity')".format(text))
+
+    def __repr__(self):
+        return self.text
+
+    def set(self, model, value):
+        attribute = self.segments[-1]
+        for each_node in self.select(model):
+            if attribute not in vars(each_node) or isinstance(getattr(each_node, attribute), Expression):
+                raise InvalidSweep("Parameter '{!s}' does not denote a setting".format(self.text))
+            setattr(each_node, attribute, self._convert(value, getattr(each_node, attribute)))
+
+    def select(self, model):
+        nodes = [model]
+        for each_segment in self.segments[:-1]:
+            nodes = [each_match for each_node in nodes for each_match in self._select(each_node, each_segment)]
+            if not nodes:
+                raise InvalidSweep("Parameter '{!s}' matches nothing in the model (no '{!s}')".format(self.text, each_segment))
+        return nodes
+
+    def _select(self, node, segment):
+        attribute = vars(node).get(segment)
+        if isinstance(attribute, Expression):
+            return [attribute]
+        matches = []
+        for each_child in self._children_of(node):
+            if self._matches(each_child, segment):
+                matches.append(each_child)
+            else:
+                matches.extend(self._select(each_child, segment))
+        return matches
+
+    @staticmethod
+    def _children_of(node):
+        for each_value in vars(node).values():
+            if isinstance(each_value, Expression):
+                yield each_value
+            elif isinstance(each_value, list):
+                yield from (each for each in each_value if isinstance(each, Expression))
+
+    @staticmethod
+    def _matches(node, segment):
+        if isinstance(node, Definition) and node.name == segment:
+            return True
+        if isinstance(node, Invocation) and "{:s}/{:s}".format(node.service, node.operation) == segment:
+            return True
+        return type(node).__name__.lower() == segment
+
+    def _convert(self, value, current):
+        try:
+            if isinstance(current, tuple):
+                if len(value) != len(current):
+                    raise ValueError()
+                return tuple(self._convert(new, old) for (new, old) in zip(value, current))
+            if isinstance(current, int) and not isinstance(current, bool):
+                if float(value) != int(value):
+                    raise ValueError()
+                return int(value)
+            if isinstance(current, float):
+                return float(value)
+            return value
+        except (TypeError, ValueError):
+            raise InvalidSweep("Invalid value '{!s}' for parameter '{!s}' (found '{!s}' in the model)".format(value, self.text, current))
+
+
+class Choices:
+    """
+    The values of a parameter, given as an explicit list
+    """
+
+    def __init__(self, values):
+        if not values:
+            raise InvalidSweep("Expecting at least one value")
+        self.values = list(values)
+
+    def grid(self):
+        return self.values
+
+    def at(self, position):
+        """
+        The value at the given position in [0, 1[
+        """
+        return self.values[min(int(position * len(self.values)), len(self.values) - 1)]
+
+
+class Range:
+    """
+    The values of a parameter, given as an interval, which is sampled
+    uniformly. Intervals whose bounds are integers only yield integers.
+    """
+
+    def __init__(self, lower, upper, step=None):
+        if lower > upper:
+            raise InvalidSweep("Empty range [{!s}, {!s}]".format(lower, upper))
+        if step is not None and step <= 0:
+            raise InvalidSweep("Expecting a strictly positive step (found '{!s}')".format(step))
+        self.lower = lower
+        self.upper = upper
+        self.step = step
+
+    @property
+    def is_discrete(self):
+        return all(isinstance(each, int) for each in (self.lower, self.upper, self.step or 1))
+
+    def grid(self):
+        if self.step is None:
+            raise InvalidSweep("A grid needs a step for range [{!s}, {!s}]".format(self.lower, self.upper))
+        count = int((self.upper - self.lower) / self.step + 1e-9) + 1
+        return [self.lower + index * self.step for index in range(count)]
+
+    def at(self, position):
+        if self.is_discrete:
+            return min(self.lower + int(position * (self.upper - self.lower + 1)), self.upper)
+        return self.lower + position * (self.upper - self.lower)
+
+
+class Sweep:
+    """
+    A set of points in the space of model settings, defined as a grid, or
+    sampled either at random or using a Latin hypercube. The sweep is read
+    from a JSON document such as:
+
+        {"design": "latin-hypercube", "samples": 20, "seed": 12,
+         "parameters": {"Storage.settings.throttling.capacity": {"from": 10, "to": 100},
+                        "Browser.period": [1, 2, 5]}}
+
+    where each parameter maps either to a list of values, or to a range,
+    possibly with a step.
+    """
+
+    GRID = "grid"
+    RANDOM = "random"
+    LATIN_HYPERCUBE = "latin-hypercube"
+    DESIGNS = (GRID, RANDOM, LATIN_HYPERCUBE)
+
+    @classmethod
+    def load(cls, source):
+        try:
+            document = load(source)
+        except ValueError as error:
+            raise InvalidSweep("Invalid JSON ({!s})".format(error))
+        if not isinstance(document, dict) or not isinstance(document.get("parameters"), dict):
+            raise InvalidSweep("Expecting an object with 'parameters'")
+        parameters = [(ParameterPath(path), cls._values_of(values)) for (path, values) in document["parameters"].items()]
+        return cls(parameters, document.get("design", cls.GRID), document.get("samples"), document.get("seed"))
+
+    @staticmethod
+    def _values_of(values):
+        if isinstance(values, list):
+            return Choices(values)
+        if isinstance(values, dict) and "from" in values and "to" in values:
+            return Range(values["from"], values["to"], values.get("step"))
+        raise InvalidSweep("Expecting a list of values or a range such as {{\"from\": 1, \"to\": 10}} (found '{!s}')".format(values))
+
+    def __init__(self, parameters, design=GRID, samples=None, seed=None):
+        if not parameters:
+            raise InvalidSweep("Expecting at least one parameter")
+        if design not in self.DESIGNS:
+            raise InvalidSweep("Expecting design in {!s} (found '{!s}')".format(", ".join(self.DESIGNS), design))
+        if design != self.GRID and (not isinstance(samples, int) or samples <= 0):
+            raise InvalidSweep("A {!s} design needs a strictly positive number of samples".format(design))
+        self.parameters = parameters
+        self.design = design
+        self.samples = samples
+        self.seed = seed
+
+    @property
+    def paths(self):
+        return [each_path for (each_path, _) in self.parameters]
+
+    def points(self, seed=None):
+        """
+        The values of the parameters, for each point of the sweep. The
+        seed of the sweep, if any, prevails over the given one.
+        """
+        random = Random(self.seed if self.seed is not None else seed)
+        if self.design == self.GRID:
+            return list(product(*[values.grid() for (_, values) in self.parameters]))
+        if self.design == self.RANDOM:
+            return [tuple(values.at(random.random()) for (_, values) in self.parameters) for _ in range(self.samples)]
+        return self._latin_hypercube(random)
+
+    def _latin_hypercube(self, random):
+        """
+        Split each dimension into as many strata as samples, and pick each
+        stratum exactly once, in a random order
+        """
+        columns = []
+        for (_, values) in self.parameters:
+            strata = list(range(self.samples))
+            random.shuffle(strata)
+            columns.append([values.at((each + random.random()) / self.samples) for each in strata])
+        return list(zip(*columns))
+
+    def apply(self, model, point):
+        """
+        A copy of the given model, where the parameters are set to the
+        values of the given point
+        """
+        model = deepcopy(model)
+        for ((each_path, _), each_value) in zip(self.parameters, point):
+            each_path.set(model, each_value)
+        return model
@@ -17,18 +17,21 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 from re import search
+from os.path import splitext
 from datetime import datetime
+from copy import copy
+from random import randrange
 
-from mad.storage import DataStorage
-from mad.validation.engine import Validator, InvalidModel
+from mad.storage import DataStorage, BackgroundWriter, Compression, ModelCache
+from mad.ast.settings import Tracing
 
-from mad.parsing import Parser, MADSyntaxError
+from mad.log import FileLog, BinaryLog, BinaryTrace, TraceIndex, TraceQuery
+from mad.monitoring import MetricStore, LongFormatReport, CSVReport, RoundRobinReport
 
-from mad.simulation.factory import Simulation
-
-from mad.log import FileLog
-from mad.monitoring import CSVReport
+# The parser, the simulation and the analyses are imported by the commands
+# that use them, so that other commands (e.g., '--version') start quickly
 
 
 class Messages:
@@ -49,19 +52,89 @@ class Messages:
 
     RESULTS_AVAILABLE = "\n\nSee results in directory: ./{location:s}/\n"
 
-    INVALID_PARAMETER_COUNT = "Error: Expected 2 parameters (found {count:d})\.n"
+    REPLICATION_PROGRESS = "\rReplication {done:d} / {count:d} complete"
+
+    BRANCH_PROGRESS = "\rBranch {done:d} / {count:d} complete"
+
+    BRANCH_FAILED = "\nError: Branch '{name:s}' failed\n"
+
+    STEADY_STATE = "\nSteady state reached at time {time:d}, after a warm-up of {warm_up:s}"
+
+    NOT_STEADY = "\nSteady state not reached by time {time:d}"
+
+    TARGETS_MET = "{point:s}Targets met after {count:d} replications\n"
+
+    BUDGET_EXHAUSTED = "{point:s}Budget exhausted after {count:d} replications ('{entity:s}:{metric:s}' within {width:s})\n"
+
+    POINT = "Point {index:d}: "
+
+    INVALID_PARAMETER_COUNT = "Error: Expected {expected:d} parameters (found {count:d}).\n"
 
     INVALID_SIMULATION_LENGTH = "\nError: Invalid simulation length '{length:s}'.\n"
 
     INVALID_SIMULATION_FILE = "\nError: Invalid simulation file '{file:s}'.\n"
 
-    USAGE = "USAGE: python -m mad <mad-file> <length>\n" \
+    SUMMARY_HEADER = "run, entity, operation, metric, value\n"
+
+    SUMMARY_ROW = "{run:s}, {entity:s}, {operation:s}, {metric:s}, {value:s}\n"
+
+    TRACE_DECODED = "Trace '{source:s}' decoded into '{location:s}'\n"
+
+    USAGE = "USAGE: python -m mad <mad-file> <length> [options]\n" \
+            "       python -m mad --version\n" \
+            "       python -m mad decode <trace-file>\n" \
+            "       python -m mad analyse <output-directory>... [--slo=<time>] [--jobs=<count>]\n" \
+            "       python -m mad trace <trace.log> [--request=<id>] [--from=<time>] [--to=<time>] [--entity=<name>]\n" \
             "where:\n" \
             " - <mad-file> is the location of the simulation model (a MAD file);\n" \
-            " - <length> is the maximum length of the simulation.\n"
+            " - <length> is the maximum length of the simulation;\n" \
+            " - <trace-file> is a binary trace, to be converted into text.\n" \
+            "options:\n" \
+            " --no-service-reports  only output the consolidated report, not one per service;\n" \
+            " --no-model-cache      parse and validate the model, even if it has not changed since the last run;\n" \
+            " --flush-size=<rows>   the number of rows buffered before writing the consolidated report;\n" \
+            " --trace-format=<text|binary>  the format of the simulation trace (binary is faster);\n" \
+            " --trace=<off|requests|tasks|all>  the level of details of the trace (overrides the model);\n" \
+            " --trace-include=<DB,DB/Select,...>  only trace these services or operations;\n" \
+            " --trace-exclude=<DB,DB/Select,...>  do not trace these services or operations;\n" \
+            " --trace-sampling=<0.05|1/20>  the probability that a client request is traced, along with\n" \
+            "                               all the requests it triggers (their spans go into spans.csv);\n" \
+            " --compress=<gzip|trace=xz:6,reports=gzip,...>  compress the trace, reports, metrics and/or spans\n" \
+            "                                                 (gzip, xz or bzip2, with an optional level);\n" \
+            " --rollup=<rows>       keep at most <rows> rows at full resolution, and as many rows summarising 10\n" \
+            "                       and 100 periods, for older metrics;\n" \
+            " --adaptive-sampling[=<finest>:<coarsest>]  monitor more often when the queue, the utilisation or\n" \
+            "                                            the rejection rate change quickly (default 1:100);\n" \
+            " --seed=<integer>      seed the random numbers, so that the run can be reproduced;\n" \
+            " --replications=<count>  run the model <count> times, with different seeds, and report the mean\n" \
+            "                         and the 95% confidence interval of each metric;\n" \
+            " --jobs=<count>        the number of replications that run in parallel;\n" \
+            " --antithetic          run replications in antithetic pairs, which count as one replication each;\n" \
+            " --sweep=<sweep-file>  replicate the model at each point of the sweep described in the given\n" \
+            "                       JSON file, which sets parameters such as 'DB.settings.throttling.capacity', and\n" \
+            "                       compare each point with the first one, using common random numbers;\n" \
+            " --targets=<DB:response time,...>  run replications until the 95% confidence interval of these\n" \
+            "                                   metrics is narrow enough, or --replications (default 100) have run;\n" \
+            " --precision=<0.05>    the half-width of these confidence intervals, relative to their mean;\n" \
+            " --batch-means         estimate the mean of each metric and its 95% confidence interval from this\n" \
+            "                       single run, using batch means;\n" \
+            " --branches=<branch-file>  run the model until the time given in the JSON file, and continue from\n" \
+            "                           there each branch it describes, with its own changes to the model;\n" \
+            " --reconfiguration=<timeline-file>  change the workers, tail-drops, autoscaling limits, client\n" \
+            "                                    periods or timeouts at the times given in the JSON file;\n" \
+            " --warm-up=<time|auto>  ignore the monitoring periods that start before this time, or detect\n" \
+            "                        the end of the warm-up from the response time and the queue (MSER-5);\n" \
+            " --until-steady        stop as soon as the response time and the queue are steady, and estimated\n" \
+            "                       within --precision, rather than at the given simulation length.\n"
+
+    INVALID_OPTION = "\nError: Invalid option '{option:s}'.\n"
 
     INVALID_MODEL = "Error, the model is invalid\n"
 
+    INVALID_SWEEP = "Error, the sweep is invalid: {reason:s}\n"
+
+    INVALID_RECONFIGURATION = "Error, the reconfiguration is invalid: {reason:s}\n"
+
     INVALID_SYNTAX = " - Syntax error on line {line:d} (around '... {hint:s} ...')\n"
 
     ERROR = " - {severity:8s} "
@@ -88,23 +161,52 @@ class Controller:
         self.file_system = file_system
         self.storage = None
 
+    VERSION = "--version"
+
     def execute(self, *command_line):
         try:
+            if command_line == (self.VERSION,):
+                return self.display.version()
+            if TraceArguments.is_trace(command_line):
+                return self._query(TraceArguments(command_line[1:]))
+            if AnalyseArguments.is_analyse(command_line):
+                return self._analyse(AnalyseArguments(command_line[1:]))
             self.display.boot_up()
+            if DecodeArguments.is_decode(command_line):
+                return self._decode(DecodeArguments(command_line[1:]))
             arguments = self._parse(command_line)
             expression = self._load(arguments)
             self._validate(expression)
+            if arguments.branches_file is not None:
+                return self._branch(expression, arguments)
+            if arguments.sweep_file is not None:
+                return self._sweep(expression, arguments)
+            if arguments.replications > 1 or arguments.antithetic_pairs:
+                return self._replicate(expression, arguments)
             return self._simulate(expression, arguments)
 
-        except MADSyntaxError as error:
-            self._report_invalid_syntax(error)
-
-        except InvalidModel as error:
-            self._report_invalid_model(error)
-
         except InvalidCommandLine as error:
             self._report_invalid_command_line(error)
 
+        except BaseException as error:
+            self._report(error)
+
+    def _report(self, error):
+        from mad.parsing import MADSyntaxError
+        from mad.validation.engine import InvalidModel
+        from mad.sweep import InvalidSweep
+        from mad.simulation.reconfiguration import InvalidReconfiguration
+        if isinstance(error, MADSyntaxError):
+            self._report_invalid_syntax(error)
+        elif isinstance(error, InvalidModel):
+            self._report_invalid_model(error)
+        elif isinstance(error, InvalidSweep):
+            self.display.invalid_sweep(error)
+        elif isinstance(error, InvalidReconfiguration):
+            self.display.invalid_reconfiguration(error)
+        else:
+            raise error
+
     def _report_invalid_syntax(self, error):
         self.display.invalid_model()
         self.display.invalid_syntax(error)
@@ -121,15 +223,74 @@ class Controller:
         return Arguments(command_line)
 
     def _load(self, arguments):
-        self.storage = DataStorage(
-            Parser(self.file_system, arguments._file_name),
-            FileLog(self.file_system.open_output_stream(arguments.log_file), Arguments.LOG_FORMAT),
-            lambda name, format: CSVReport(self.file_system.open_output_stream(arguments.report_for(name)), format))
+        from mad.parsing import Parser
+        parser = Parser(self.file_system, arguments._file_name)
+        models = ModelCache(self.file_system) if arguments.model_cache else None
+        if arguments.replications > 1 or arguments.antithetic_pairs or arguments.sweep_file is not None:
+            self.storage = DataStorage(parser, None, None, models=models)
+        else:
+            self._open_storage(arguments, parser, models)
         self.display.model_loaded(arguments)
         expression = self.storage.model()
         self.copy_model(arguments)
         return expression
 
+    def _open_storage(self, arguments, parser=None, models=None):
+        self.metrics = MetricStore(rollup=arguments.rollup, sink=self._open_metrics(arguments))
+        self.storage = DataStorage(
+            parser,
+            self._open_log(arguments),
+            self.metrics.report_for,
+            self._open_spans(arguments),
+            models)
+
+    def _open_log(self, arguments):
+        if arguments.trace_format == Arguments.BINARY:
+            self.trace_index = None
+            output = self.file_system.open_binary_output_stream(arguments.log_file, arguments.compression_for(Arguments.TRACE))
+            return BinaryLog(BackgroundWriter(output))
+        self.trace_index = TraceIndex()
+        output = self.file_system.open_output_stream(arguments.log_file, arguments.compression_for(Arguments.TRACE))
+        return FileLog(output, Arguments.LOG_FORMAT, self.trace_index)
+
+    def _open_metrics(self, arguments):
+        output = self.file_system.open_output_stream(arguments.consolidated_report,
+                                                     arguments.compression_for(Arguments.METRICS))
+        return LongFormatReport(output, arguments.flush_size)
+
+    def _save_trace_index(self, arguments):
+        if self.trace_index is not None:
+            with self.file_system.open_output_stream(arguments.trace_index) as output:
+                self.trace_index.save(output)
+
+    def _analyse(self, arguments):
+        from mad.analysis import analyse
+        self.display.summary(analyse(self.file_system, arguments.directories, arguments.slo, arguments.jobs))
+
+    def _query(self, arguments):
+        with self.file_system.open_input_stream(arguments.index_file) as source:
+            index = TraceIndex.load(source)
+        query = TraceQuery(self.file_system.open_memory_map(arguments.trace_file), index)
+        if arguments.request is not None:
+            events = query.history_of(arguments.request)
+        else:
+            events = query.between(arguments.start, arguments.end, arguments.entity)
+        self.display.events(events)
+
+    def _open_spans(self, arguments):
+        if not arguments.records_spans:
+            return None
+        from mad.simulation.monitoring import LatencyBreakdown
+        output = self.file_system.open_output_stream(arguments.span_file, arguments.compression_for(Arguments.SPANS))
+        return CSVReport(output, LatencyBreakdown.SPAN_FORMATS)
+
+    def _decode(self, arguments):
+        source = self.file_system.open_binary_input_stream(arguments.trace_file)
+        with self.file_system.open_output_stream(arguments.output_file) as output:
+            BinaryTrace(source).decode(FileLog(output, Arguments.LOG_FORMAT))
+        source.close()
+        self.display.trace_decoded(arguments)
+
     def copy_model(self, arguments):
         source = self.file_system.open_input_stream(arguments._file_name)
         copy = self.file_system.open_output_stream(arguments.model_copy)
@@ -137,19 +298,302 @@ class Controller:
         self.display.model_copied(arguments)
 
     def _validate(self, expression):
-        validator = Validator()
-        validator.validate(expression)
-        if validator.raised_warnings():
-            for each_warning in validator.errors:
-                each_warning.accept(self.display)
+        warnings = self.storage.warnings
+        if warnings is None:
+            from mad.validation.engine import Validator
+            validator = Validator()
+            validator.validate(expression)
+            warnings = validator.errors if validator.raised_warnings() else []
+            self.storage.remember(expression, warnings)
+        for each_warning in warnings:
+            each_warning.accept(self.display)
 
     def _simulate(self, expression, arguments):
-        simulation = Simulation(self.storage)
-        simulation.evaluate(expression)
-        simulation.run_until(arguments._time_limit, self.display)
+        simulation = self._run(expression, arguments, self.display)
+        if arguments.until_steady:
+            self.display.steady_state(simulation, arguments)
         self.display.simulation_complete(arguments)
         return simulation
 
+    def _run(self, expression, arguments, display=None):
+        simulation = self._start(expression, arguments)
+        if arguments.until_steady:
+            simulation.run_until_steady(arguments._time_limit, arguments.precision, display)
+        else:
+            simulation.run_until(arguments._time_limit, display)
+        self._finish(simulation, arguments)
+        return simulation
+
+    def _start(self, expression, arguments):
+        from mad.simulation.factory import Simulation
+        from mad.simulation.randomness import RandomStreams
+        from mad.simulation.reconfiguration import Reconfiguration
+        streams = RandomStreams(arguments.seed if arguments.seed is not None else randrange(Arguments.SEEDS),
+                                arguments.antithetic)
+        simulation = Simulation(self.storage, arguments.tracing, arguments.sampling, arguments.batch_means, streams)
+        simulation.evaluate(expression)
+        if arguments.reconfiguration_file is not None:
+            with self.file_system.open_input_stream(arguments.reconfiguration_file) as source:
+                timeline = Reconfiguration.load(source)
+            timeline.check(simulation)
+            timeline.schedule(simulation)
+        return simulation
+
+    def _finish(self, simulation, arguments):
+        self.storage.log.close()
+        self._save_trace_index(arguments)
+        if self.storage.spans:
+            self.storage.spans.close()
+        self._save_metrics(arguments)
+        if simulation.batch_means is not None:
+            self._save_batch_means(simulation, arguments)
+
+    def _branch(self, expression, arguments):
+        """
+        Run the prefix shared by all branches once, and continue each
+        branch from there, in a forked process that inherits the state of
+        the simulation. Where processes cannot fork, each branch replays
+        the prefix instead, with the same seed and thus the same events.
+        """
+        from mad.branching import Branching
+        from mad.simulation.reconfiguration import InvalidReconfiguration
+        with self.file_system.open_input_stream(arguments.branches_file) as source:
+            branching = Branching.load(source)
+        if branching.time >= arguments._time_limit:
+            raise InvalidReconfiguration("Branching at time {:d}, after the end of the simulation".format(branching.time))
+        arguments = arguments.seeded(arguments.seed if arguments.seed is not None else randrange(Arguments.SEEDS))
+        simulation = self._start(expression, arguments)
+        branching.check(simulation)
+        simulation.run_until(branching.time, self.display)
+        self._finish(simulation, arguments)
+        branches = [(name, reconfiguration, arguments.branch(name)) for (name, reconfiguration) in branching.branches]
+        if self._can_fork():
+            self._fork_all(simulation, branches, arguments.jobs)
+        else:
+            self._replay_all(expression, branching.time, branches)
+        self.display.simulation_complete(arguments)
+
+    @staticmethod
+    def _can_fork():
+        return hasattr(os, "fork")
+
+    def _fork_all(self, simulation, branches, jobs):
+        running = {}
+        for (index, (name, reconfiguration, each_arguments)) in enumerate(branches):
+            if len(running) == jobs:
+                self._wait_for_branch(running, index - len(running) + 1, len(branches))
+            self.display.output.flush()
+            identifier = os.fork()
+            if identifier == 0:
+                self._continue_in_child(simulation, reconfiguration, each_arguments)
+            running[identifier] = name
+        while running:
+            self._wait_for_branch(running, len(branches) - len(running) + 1, len(branches))
+
+    def _continue_in_child(self, simulation, reconfiguration, arguments):
+        """
+        Continue the branch in the forked process, which writes its own
+        trace, and never returns
+        """
+        try:
+            self.storage.log = self._open_log(arguments)
+            self.storage.spans = self._open_spans(arguments)
+            self.metrics.stream_to(self._open_metrics(arguments))
+            self._continue(simulation, reconfiguration, arguments)
+        except BaseException:
+            from traceback import print_exc
+            print_exc()
+            os._exit(1)
+        os._exit(0)
+
+    def _wait_for_branch(self, running, done, count):
+        (identifier, status) = os.waitpid(-1, 0)
+        name = running.pop(identifier)
+        if status != 0:
+            self.display.branch_failed(name)
+        self.display.branch_complete(done, count)
+
+    def _replay_all(self, expression, time, branches):
+        for (index, (_, reconfiguration, each_arguments)) in enumerate(branches, 1):
+            self._open_storage(each_arguments)
+            simulation = self._start(expression, each_arguments)
+            simulation.run_until(time)
+            self._continue(simulation, reconfiguration, each_arguments)
+            self.display.branch_complete(index, len(branches))
+
+    def _continue(self, simulation, reconfiguration, arguments):
+        reconfiguration.schedule(simulation)
+        simulation.run_until(arguments._time_limit)
+        self._finish(simulation, arguments)
+
+    def _save_batch_means(self, simulation, arguments):
+        with self.file_system.open_output_stream(arguments.batch_means_report) as output:
+            report = CSVReport(output, Arguments.BATCH_MEANS_FORMAT)
+            for each_monitor in simulation.monitors:
+                for (metric, periods, mean, half_width, batches, size, correlation) in each_monitor.batch_means_estimates():
+                    (lower, upper) = (None, None) if half_width is None else (mean - half_width, mean + half_width)
+                    report(entity=each_monitor._entity_name(), metric=metric, warm_up=format_value(each_monitor.warm_up),
+                           periods=periods, batches=batches,
+                           batch_size=size, correlation=format_value(correlation), mean=format_value(mean),
+                           ci_lower=format_value(lower), ci_upper=format_value(upper))
+
+    def _replicate(self, expression, arguments):
+        """
+        Run independent replications of the model, each with its own seed
+        and its own sub-directory, and merge their metrics. The model is
+        parsed once, and sent to the workers.
+        """
+        return self._run_replications([((), expression, arguments)], arguments)
+
+    def _sweep(self, expression, arguments):
+        """
+        Replicate the model at each point of the sweep, rewriting a copy of
+        the parsed model rather than parsing it again
+        """
+        from mad.sweep import Sweep
+        with self.file_system.open_input_stream(arguments.sweep_file) as source:
+            sweep = Sweep.load(source)
+        points = [(each_point, sweep.apply(expression, each_point), arguments.point(index))
+                  for (index, each_point) in enumerate(sweep.points(arguments.seed), 1)]
+        return self._run_replications(points, arguments, sweep.paths)
+
+    def _run_replications(self, points, arguments, parameters=()):
+        """
+        Replicate each point, either as many times as requested, or, given
+        a stopping rule, by rounds until the targets are precise enough
+        """
+        from mad.analysis import ReplicationSummary
+        first_seed = arguments.seed if arguments.seed is not None else randrange(Arguments.SEEDS)
+        rule = arguments.stopping_rule
+        fields = [(str(each_parameter), "%s") for each_parameter in parameters]
+        summaries = [ReplicationSummary(antithetic=arguments.antithetic_pairs) for _ in points]
+        counts = [0 for _ in points]
+        done = 0
+        with self.file_system.open_output_stream(arguments.replications_report) as output:
+            report = CSVReport(output, fields + Arguments.REPLICATIONS_FORMAT)
+            runs = self._next_runs(points, summaries, counts, rule, arguments, first_seed)
+            while runs:
+                tasks = [(self.file_system, points[point][1], replication) for (point, replication) in runs]
+                for ((point, replication), (rows, sketches)) in zip(runs, self._run_all(tasks, arguments.jobs)):
+                    values = self._values_of(parameters, points[point][0])
+                    for (_, entity, _, metric, value) in rows:
+                        report(replication=replication.replication_index, seed=replication.seed,
+                               entity=entity, metric=metric, value=format_value(value), **values)
+                    summaries[point].add(rows, sketches)
+                    done += 1
+                    self.display.replication_complete(done, sum(counts))
+                runs = self._next_runs(points, summaries, counts, rule, arguments, first_seed)
+        with self.file_system.open_output_stream(arguments.summary_report) as output:
+            report = CSVReport(output, fields + Arguments.SUMMARY_FORMAT)
+            for ((point, _, _), summary) in zip(points, summaries):
+                values = self._values_of(parameters, point)
+                for (entity, _, metric, count, mean, deviation, lower, upper) in summary.rows():
+                    report(entity=entity, metric=metric, replications=count, mean=format_value(mean),
+                           std_dev=format_value(deviation), ci_lower=format_value(lower), ci_upper=format_value(upper),
+                           **values)
+        if len(points) > 1:
+            self._save_differences(points, summaries, fields, parameters, arguments)
+        if rule is not None:
+            self.display.replications_needed(rule, [(index if parameters else None, count, summary)
+                                                    for (index, (count, summary)) in enumerate(zip(counts, summaries), 1)])
+        self.display.simulation_complete(arguments)
+        return summaries
+
+    def _save_differences(self, points, summaries, fields, parameters, arguments):
+        """
+        Compare each point of the sweep with the first one, pairing their
+        replications, which share their random numbers
+        """
+        with self.file_system.open_output_stream(arguments.differences_report) as output:
+            report = CSVReport(output, fields + Arguments.DIFFERENCES_FORMAT)
+            for ((point, _, _), summary) in zip(points[1:], summaries[1:]):
+                values = self._values_of(parameters, point)
+                for (entity, _, metric, count, mean, lower, upper) in summary.differences_from(summaries[0]):
+                    report(entity=entity, metric=metric, replications=count, difference=format_value(mean),
+                           ci_lower=format_value(lower), ci_upper=format_value(upper), **values)
+
+    @staticmethod
+    def _next_runs(points, summaries, counts, rule, arguments, first_seed):
+        """
+        The replications to run next, for each point, as pairs of a point
+        index and the arguments of the replication. Replications of the same
+        rank share their seed, whatever the point. Antithetic replications
+        come in pairs that share their seed as well.
+        """
+        runs = []
+        pairs = arguments.antithetic_pairs
+        for (point, (_, _, each_arguments)) in enumerate(points):
+            if rule is None:
+                more = arguments.replications - counts[point]
+            else:
+                more = rule.next_count(summaries[point], counts[point])
+            if pairs:
+                more += more % 2
+            for index in range(counts[point] + 1, counts[point] + more + 1):
+                if pairs:
+                    replication = each_arguments.replication(index, first_seed + (index - 1) // 2, index % 2 == 0)
+                else:
+                    replication = each_arguments.replication(index, first_seed + index - 1)
+                runs.append((point, replication))
+            counts[point] += more
+        return runs
+
+    @staticmethod
+    def _values_of(parameters, point):
+        return {str(each_parameter): format_parameter(each_value) for (each_parameter, each_value) in zip(parameters, point)}
+
+    @staticmethod
+    def _run_all(tasks, jobs):
+        if jobs == 1:
+            yield from map(replicate, tasks)
+            return
+        from multiprocessing import Pool
+        with Pool(min(jobs, len(tasks))) as pool:
+            yield from pool.imap(replicate, tasks)
+
+    def _save_metrics(self, arguments):
+        with self.file_system.open_binary_output_stream(arguments.metrics_file) as output:
+            self.metrics.save(output)
+        self.metrics.close()
+        if arguments.service_reports:
+            for each_entity in self.metrics.entities:
+                with self.file_system.open_output_stream(arguments.report_for(each_entity),
+                                                         arguments.compression_for(Arguments.REPORTS)) as output:
+                    self.metrics.export(each_entity, output)
+
+
+def replicate(task):
+    """
+    Run one replication, in its own sub-directory, and summarise the
+    metrics of its services and clients, along with the sketches of
+    their response times, which replications merge
+    """
+    from mad.analysis import RunAnalysis
+    (file_system, expression, arguments) = task
+    controller = Controller(None, file_system)
+    controller._open_storage(arguments)
+    simulation = controller._run(expression, arguments)
+    sketches = {each_monitor._entity_name(): each_monitor.statistics.response_time_quantiles
+                for each_monitor in simulation.monitors if not each_monitor.statistics.response_time_quantiles.is_empty}
+    return RunAnalysis(file_system, arguments._output_directory).service_rows(), sketches
+
+
+def format_value(value):
+    from mad.simulation.monitoring import MISSING_VALUE
+    return MISSING_VALUE if value is None else "{:g}".format(value)
+
+
+def format_parameter(value):
+    """
+    Format the value of a swept parameter, without commas, which would
+    break the CSV reports
+    """
+    if isinstance(value, (list, tuple)):
+        return "[{:s}]".format(" ".join(format_parameter(each) for each in value))
+    if isinstance(value, float):
+        return "{:g}".format(value)
+    return str(value)
+
 
 class Display:
     """
@@ -177,6 +621,9 @@ class Display:
         from mad import __copyright_owner__ as OWNER
         self._format(Messages.COPYRIGHT, years=YEARS, owner=OWNER)
 
+    def version(self):
+        self._show_version()
+
     def _show_version(self):
         from mad import __version__ as MAD_VERSION
         self._format(Messages.VERSION, version=MAD_VERSION)
@@ -194,12 +641,59 @@ class Display:
     def simulation_complete(self, project):
         self._format(Messages.RESULTS_AVAILABLE, location=project._output_directory)
 
+    def steady_state(self, simulation, arguments):
+        if simulation.steady_at is None:
+            self._format(Messages.NOT_STEADY, time=arguments._time_limit)
+            return
+        warm_up = max(each.warm_up for each in simulation.monitors if each.warm_up is not None)
+        self._format(Messages.STEADY_STATE, time=simulation.steady_at, warm_up=format_value(warm_up))
+
+    def replication_complete(self, done, count):
+        self._format(Messages.REPLICATION_PROGRESS, done=done, count=count)
+
+    def branch_complete(self, done, count):
+        self._format(Messages.BRANCH_PROGRESS, done=done, count=count)
+
+    def branch_failed(self, name):
+        self._format(Messages.BRANCH_FAILED, name=name)
+
+    def replications_needed(self, rule, points):
+        from mad.simulation.monitoring import MISSING_VALUE
+        self._new_line()
+        for (index, count, summary) in points:
+            point = "" if index is None else Messages.POINT.format(index=index)
+            if rule.is_met(summary):
+                self._format(Messages.TARGETS_MET, point=point, count=count)
+                continue
+            ((entity, metric), width) = rule.widest(summary)
+            self._format(Messages.BUDGET_EXHAUSTED, point=point, count=count, entity=entity, metric=metric,
+                         width=MISSING_VALUE if width is None else "{:.1%}".format(width))
+
+    def summary(self, rows):
+        self._format(Messages.SUMMARY_HEADER)
+        for (run, entity, operation, metric, value) in rows:
+            self._format(Messages.SUMMARY_ROW, run=run, entity=entity, operation=operation, metric=metric,
+                         value=format_value(value))
+
+    def events(self, lines):
+        for each_line in lines:
+            self.output.write(each_line)
+
+    def trace_decoded(self, arguments):
+        self._format(Messages.TRACE_DECODED, source=arguments.trace_file, location=arguments.output_file)
+
     def invalid_syntax(self, error):
         self._format(Messages.INVALID_SYNTAX, line=error.line_number, hint=error.hint)
 
     def invalid_model(self):
         self._format(Messages.INVALID_MODEL)
 
+    def invalid_sweep(self, error):
+        self._format(Messages.INVALID_SWEEP, reason=error.reason)
+
+    def invalid_reconfiguration(self, error):
+        self._format(Messages.INVALID_RECONFIGURATION, reason=error.reason)
+
     def unknown_service(self, error):
         self._format(
             Messages.ERROR_UNKNOWN_SERVICE,
@@ -242,34 +736,406 @@ class Display:
         self._format(Messages.INVALID_SIMULATION_FILE, file=str(error.file_name))
         self._show_usage()
 
+    def invalid_option(self, error):
+        self._format(Messages.INVALID_OPTION, option=error.option)
+        self._show_usage()
+
     def wrong_number_of_arguments(self, error):
-        self._format(Messages.INVALID_PARAMETER_COUNT, count=error.argument_count)
+        self._format(Messages.INVALID_PARAMETER_COUNT, expected=error.expected, count=error.argument_count)
         self._show_usage()
 
     def _show_usage(self):
         self._format(Messages.USAGE)
 
 
-class Arguments:
+def flag(text):
+    if text is not None:
+        raise ValueError("Flags take no value (found '{!s}')".format(text))
+    return True
+
+
+def positive_integer(text):
+    value = int(text)
+    if value <= 0:
+        raise ValueError("Expecting a strictly positive integer (found '{!s}')".format(text))
+    return value
+
+
+def integer_at_least(minimum):
+    def convert(text):
+        value = int(text)
+        if value < minimum:
+            raise ValueError("Expecting an integer greater than or equal to {:d} (found '{!s}')".format(minimum, text))
+        return value
+    return convert
+
+
+def warm_up(text):
+    from mad.simulation.monitoring import BatchMeansAnalysis
+    if text == BatchMeansAnalysis.AUTOMATIC:
+        return text
+    return integer_at_least(0)(text)
+
+
+def one_of(*choices):
+    def convert(text):
+        if text not in choices:
+            raise ValueError("Expecting one of {!s} (found '{!s}')".format(", ".join(choices), text))
+        return text
+    return convert
+
+
+def name_list(text):
+    names = text.split(",")
+    if not all(names):
+        raise ValueError("Expecting a comma-separated list of names (found '{!s}')".format(text))
+    return names
+
+
+def compression_settings(text):
+    """
+    Convert 'gzip' or 'trace=xz:6,reports=gzip' into a dictionary that
+    maps kinds of output to their compression. The compression given
+    without kind applies to all other kinds.
+    """
+    settings = {}
+    for each_item in text.split(","):
+        (kind, _, codec) = each_item.rpartition("=")
+        if kind and kind not in Arguments.OUTPUT_KINDS:
+            raise ValueError("Unknown kind of output '{!s}' (expecting one of {!s})".format(kind, ", ".join(Arguments.OUTPUT_KINDS)))
+        settings[kind or None] = Compression.parse(codec)
+    return settings
+
+
+def period_range(text):
+    """
+    Convert '<finest>:<coarsest>' into a pair of periods, or the default
+    ones when no text is given
+    """
+    from mad.simulation.monitoring import AdaptiveSampling
+    if text is None:
+        return (AdaptiveSampling.DEFAULT_FINEST, AdaptiveSampling.DEFAULT_COARSEST)
+    (finest, _, coarsest) = text.partition(":")
+    (finest, coarsest) = (positive_integer(finest), positive_integer(coarsest))
+    if finest > coarsest:
+        raise ValueError("The finest period must not exceed the coarsest one (found '{!s}')".format(text))
+    return (finest, coarsest)
+
+
+def target_list(text):
+    """
+    Convert 'DB:response time,Browser:reliability' into a list of pairs of
+    entity and metric
+    """
+    targets = []
+    for each_item in text.split(","):
+        (entity, _, metric) = each_item.partition(":")
+        if not entity.strip() or not metric.strip():
+            raise ValueError("Expecting a comma-separated list of <entity>:<metric> (found '{!s}')".format(text))
+        targets.append((entity.strip(), metric.strip()))
+    return targets
+
+
+def positive_number(text):
+    value = float(text)
+    if value <= 0:
+        raise ValueError("Expecting a strictly positive number (found '{!s}')".format(text))
+    return value
+
+
+def probability(text):
+    (numerator, _, denominator) = text.partition("/")
+    try:
+        value = float(numerator) / float(denominator) if denominator else float(text)
+    except ZeroDivisionError:
+        raise ValueError("Invalid rate (found '{!s}')".format(text))
+    if not 0 < value <= 1:
+        raise ValueError("Expecting a probability in ]0, 1] (found '{!s}')".format(text))
+    return value
+
+
+class CommandLine:
+    """
+    Split the command line into positional arguments and options (as in
+    '--name=value'), which are converted according to OPTIONS
+    """
+
+    OPTION = r"^--([a-z\-]+)(?:=(.*))?$"
+    OPTIONS = {}
+
+    def __init__(self, arguments, expected_count, variadic=False):
+        self._options = {}
+        positionals = []
+        for each_argument in arguments:
+            if not self._extract_option(each_argument):
+                positionals.append(each_argument)
+        if len(positionals) < expected_count or (len(positionals) > expected_count and not variadic):
+            raise WrongNumberOfArguments(len(positionals), expected=expected_count)
+        self._arguments = positionals
+
+    def _extract_option(self, argument):
+        if not isinstance(argument, str):
+            return False
+        match = search(self.OPTION, argument)
+        if not match:
+            return False
+        (name, text) = match.groups()
+        if name not in self.OPTIONS:
+            raise InvalidOption(argument)
+        (convert, _) = self.OPTIONS[name]
+        try:
+            self._options[name] = convert(text)
+        except (TypeError, ValueError):
+            raise InvalidOption(argument)
+        return True
+
+    def _option(self, name):
+        (_, default) = self.OPTIONS[name]
+        return self._options.get(name, default)
+
+
+class Arguments(CommandLine):
     """
     Convert the arguments given on the command line into a MadProject
     """
 
     BASE_NAME = r"([^\\/]+)\.(\w+)$"
     LOG_FILE = "trace.log"
+    BINARY_LOG_FILE = "trace.bin"
     LOG_FORMAT = "%5d %-20s %-s\n"
     PATH_TO_LOG_FILE = "{directory:s}/{log_file:s}"
     OUTPUT_DIRECTORY = "{name:s}_{identifier:s}"
     REPORT = "{directory:s}/{entity:s}.log"
+    METRICS_FILE = "metrics.npz"
+    CONSOLIDATED_REPORT = "metrics.csv"
+    SPAN_FILE = "spans.csv"
+    TRACE_INDEX = "trace.idx"
+    REPLICATIONS_REPORT = "replications.csv"
+    SUMMARY_REPORT = "summary.csv"
+    DIFFERENCES_REPORT = "differences.csv"
+    BATCH_MEANS_REPORT = "batch-means.csv"
+    REPLICATION_DIRECTORY = "{directory:s}/replication-{index:03d}"
+    POINT_DIRECTORY = "{directory:s}/point-{index:03d}"
+    BRANCH_DIRECTORY = "{directory:s}/branch-{name:s}"
     PATH_TO_MODEL_COPY = "{directory:s}/{file:s}"
 
+    REPLICATIONS_FORMAT = [("replication", "%d"), ("seed", "%d"), ("entity", "%s"), ("metric", "%s"), ("value", "%s")]
+    SUMMARY_FORMAT = [("entity", "%s"), ("metric", "%s"), ("replications", "%d"), ("mean", "%s"), ("std_dev", "%s"),
+                      ("ci_lower", "%s"), ("ci_upper", "%s")]
+    DIFFERENCES_FORMAT = [("entity", "%s"), ("metric", "%s"), ("replications", "%d"), ("difference", "%s"),
+                          ("ci_lower", "%s"), ("ci_upper", "%s")]
+    BATCH_MEANS_FORMAT = [("entity", "%s"), ("metric", "%s"), ("warm_up", "%s"), ("periods", "%d"), ("batches", "%d"),
+                          ("batch_size", "%d"), ("correlation", "%s"), ("mean", "%s"), ("ci_lower", "%s"),
+                          ("ci_upper", "%s")]
+    SEEDS = 2 ** 32
+    DEFAULT_BUDGET = 100
+
+    TEXT = "text"
+    BINARY = "binary"
+
+    TRACE = "trace"
+    REPORTS = "reports"
+    METRICS = "metrics"
+    SPANS = "spans"
+    OUTPUT_KINDS = (TRACE, REPORTS, METRICS, SPANS)
+
+    OPTIONS = {
+        "no-service-reports": (flag, False),
+        "no-model-cache": (flag, False),
+        "flush-size": (positive_integer, LongFormatReport.DEFAULT_FLUSH_SIZE),
+        "trace-format": (one_of(TEXT, BINARY), TEXT),
+        "trace": (one_of(*Tracing.LEVELS), Tracing.ALL),
+        "trace-include": (name_list, []),
+        "trace-exclude": (name_list, []),
+        "trace-sampling": (probability, 1.0),
+        "compress": (compression_settings, {}),
+        "rollup": (integer_at_least(RoundRobinReport.MINIMUM_CAPACITY), None),
+        "adaptive-sampling": (period_range, None),
+        "seed": (int, None),
+        "replications": (positive_integer, 1),
+        "jobs": (positive_integer, 1),
+        "antithetic": (flag, False),
+        "sweep": (str, None),
+        "branches": (str, None),
+        "reconfiguration": (str, None),
+        "targets": (target_list, None),
+        "precision": (positive_number, 0.05),
+        "batch-means": (flag, False),
+        "warm-up": (warm_up, 0),
+        "until-steady": (flag, False)
+    }
+    TRACING_OPTIONS = {"trace": "level", "trace-include": "include", "trace-exclude": "exclude",
+                       "trace-sampling": "sampling"}
+
     def __init__(self, arguments):
-        if len(arguments) != 2:
-            raise WrongNumberOfArguments(len(arguments))
-        self._arguments = arguments
+        super().__init__(arguments, 2)
         self._file_name = self._extract_file_name()
         self._time_limit = self._extract_length()
         self.__output_directory = None
+        self.replication_index = None
+        self.antithetic = False
+
+    @property
+    def service_reports(self):
+        return not self._option("no-service-reports")
+
+    @property
+    def model_cache(self):
+        return not self._option("no-model-cache")
+
+    @property
+    def flush_size(self):
+        return self._option("flush-size")
+
+    @property
+    def rollup(self):
+        return self._option("rollup")
+
+    @property
+    def sampling(self):
+        """
+        The adaptive sampling of monitors if any, or None if they sample
+        at a fixed period
+        """
+        periods = self._option("adaptive-sampling")
+        if periods is None:
+            return None
+        from mad.simulation.monitoring import AdaptiveSampling
+        return AdaptiveSampling(*periods)
+
+    @property
+    def seed(self):
+        return self._option("seed")
+
+    @property
+    def replications(self):
+        """
+        The number of replications, which is the maximum number of them
+        when they stop once the targets are met
+        """
+        if self.targets is not None and "replications" not in self._options:
+            return self.DEFAULT_BUDGET
+        return self._option("replications")
+
+    @property
+    def targets(self):
+        return self._option("targets")
+
+    @property
+    def stopping_rule(self):
+        """
+        The rule that stops replicating once the targets are precise enough,
+        or None if the number of replications is fixed
+        """
+        if self.targets is None:
+            return None
+        from mad.analysis import StoppingRule
+        return StoppingRule(self.targets, self.precision, self.replications)
+
+    @property
+    def jobs(self):
+        return self._option("jobs")
+
+    @property
+    def antithetic_pairs(self):
+        return self._option("antithetic")
+
+    @property
+    def sweep_file(self):
+        return self._option("sweep")
+
+    @property
+    def branches_file(self):
+        return self._option("branches")
+
+    @property
+    def reconfiguration_file(self):
+        return self._option("reconfiguration")
+
+    def seeded(self, seed):
+        """
+        The same arguments, but with the given seed
+        """
+        seeded = copy(self)
+        seeded._options = dict(self._options, seed=seed)
+        seeded.__output_directory = self._output_directory
+        return seeded
+
+    def branch(self, name):
+        """
+        The arguments of the given branch, which writes in its own
+        sub-directory of the output directory
+        """
+        branch = copy(self)
+        branch.__output_directory = self.BRANCH_DIRECTORY.format(directory=self._output_directory, name=name)
+        return branch
+
+    def point(self, index):
+        """
+        The arguments of the given point of a sweep, whose replications
+        write in the same sub-directory of the output directory
+        """
+        point = copy(self)
+        point.__output_directory = self.POINT_DIRECTORY.format(directory=self._output_directory, index=index)
+        return point
+
+    def replication(self, index, seed, antithetic=False):
+        """
+        The arguments of the given replication, which runs with its own
+        seed and writes in its own sub-directory of the output directory
+        """
+        replication = copy(self)
+        replication._options = dict(self._options, seed=seed, replications=1, targets=None)
+        replication.__output_directory = self.REPLICATION_DIRECTORY.format(directory=self._output_directory, index=index)
+        replication.replication_index = index
+        replication.antithetic = antithetic
+        return replication
+
+    @property
+    def batch_means(self):
+        """
+        The batch-means analysis of the run, or None if it is not requested
+        """
+        from mad.simulation.monitoring import BatchMeansAnalysis
+        if self.until_steady and "warm-up" not in self._options:
+            return BatchMeansAnalysis(BatchMeansAnalysis.AUTOMATIC)
+        if not self._option("batch-means") and not self.until_steady:
+            return None
+        return BatchMeansAnalysis(self._option("warm-up"))
+
+    @property
+    def until_steady(self):
+        return self._option("until-steady")
+
+    @property
+    def precision(self):
+        return self._option("precision")
+
+    @property
+    def trace_format(self):
+        return self._option("trace-format")
+
+    def compression_for(self, kind):
+        """
+        The compression of the given kind of output, or None if it is not
+        compressed
+        """
+        settings = self._option("compress")
+        return settings.get(kind, settings.get(None))
+
+    @property
+    def records_spans(self):
+        return "trace-sampling" in self._options
+
+    @property
+    def tracing(self):
+        """
+        The tracing settings given on the command line (e.g., {'level': 'off'}),
+        which override those of the model, or None if there are none
+        """
+        settings = {field: self._option(option) for (option, field) in self.TRACING_OPTIONS.items()
+                    if option in self._options}
+        return settings or None
 
     def _extract_file_name(self):
         file_name = self._arguments[0]
@@ -287,7 +1153,55 @@ class Arguments:
     def log_file(self):
         return self.PATH_TO_LOG_FILE.format(
             directory=self._output_directory,
-            log_file=self.LOG_FILE)
+            log_file=self.BINARY_LOG_FILE if self.trace_format == self.BINARY else self.LOG_FILE)
+
+    @property
+    def consolidated_report(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.CONSOLIDATED_REPORT)
+
+    @property
+    def trace_index(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.TRACE_INDEX)
+
+    @property
+    def span_file(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.SPAN_FILE)
+
+    @property
+    def replications_report(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.REPLICATIONS_REPORT)
+
+    @property
+    def batch_means_report(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.BATCH_MEANS_REPORT)
+
+    @property
+    def summary_report(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.SUMMARY_REPORT)
+
+    @property
+    def differences_report(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.DIFFERENCES_REPORT)
+
+    @property
+    def metrics_file(self):
+        return self.PATH_TO_LOG_FILE.format(
+            directory=self._output_directory,
+            log_file=self.METRICS_FILE)
 
     @property
     def _output_directory(self):
@@ -317,6 +1231,108 @@ class Arguments:
         )
 
 
+class DecodeArguments(CommandLine):
+    """
+    The arguments of the 'decode' command, which converts a binary trace
+    into the text format
+    """
+
+    COMMAND = "decode"
+    TEXT_EXTENSION = ".log"
+
+    @classmethod
+    def is_decode(cls, command_line):
+        return len(command_line) > 0 and command_line[0] == cls.COMMAND
+
+    def __init__(self, arguments):
+        super().__init__(arguments, 1)
+        self.trace_file = self._arguments[0]
+
+    @property
+    def output_file(self):
+        trace_file = Compression.uncompressed(self.trace_file)
+        (base, extension) = splitext(trace_file)
+        if extension == self.TEXT_EXTENSION:
+            return trace_file + self.TEXT_EXTENSION
+        return base + self.TEXT_EXTENSION
+
+
+class TraceArguments(CommandLine):
+    """
+    The arguments of the 'trace' command, which extracts from a text trace
+    either the history of a request, or the events of a time window
+    """
+
+    COMMAND = "trace"
+    INDEX_EXTENSION = ".idx"
+
+    OPTIONS = {
+        "request": (int, None),
+        "from": (int, 0),
+        "to": (int, None),
+        "entity": (str, None)
+    }
+
+    @classmethod
+    def is_trace(cls, command_line):
+        return len(command_line) > 0 and command_line[0] == cls.COMMAND
+
+    def __init__(self, arguments):
+        super().__init__(arguments, 1)
+        self.trace_file = self._arguments[0]
+
+    @property
+    def index_file(self):
+        return splitext(Compression.uncompressed(self.trace_file))[0] + self.INDEX_EXTENSION
+
+    @property
+    def request(self):
+        return self._option("request")
+
+    @property
+    def start(self):
+        return self._option("from")
+
+    @property
+    def end(self):
+        end = self._option("to")
+        return float("inf") if end is None else end
+
+    @property
+    def entity(self):
+        return self._option("entity")
+
+
+class AnalyseArguments(CommandLine):
+    """
+    The arguments of the 'analyse' command, which summarises one or more
+    output directories
+    """
+
+    COMMAND = "analyse"
+
+    OPTIONS = {
+        "slo": (positive_number, None),
+        "jobs": (positive_integer, 1)
+    }
+
+    @classmethod
+    def is_analyse(cls, command_line):
+        return len(command_line) > 0 and command_line[0] == cls.COMMAND
+
+    def __init__(self, arguments):
+        super().__init__(arguments, 1, variadic=True)
+        self.directories = [each.rstrip("/\\") for each in self._arguments]
+
+    @property
+    def slo(self):
+        return self._option("slo")
+
+    @property
+    def jobs(self):
+        return self._option("jobs")
+
+
 class InvalidCommandLine(Exception):
 
     def accept(self, visitor):
@@ -341,10 +1357,20 @@ class InvalidSimulationLength(InvalidCommandLine):
         visitor.invalid_simulation_length(self)
 
 
+class InvalidOption(InvalidCommandLine):
+
+    def __init__(self, option):
+        self.option = option
+
+    def accept(self, visitor):
+        visitor.invalid_option(self)
+
+
 class WrongNumberOfArguments(InvalidCommandLine):
 
-    def __init__(self, argument_count):
+    def __init__(self, argument_count, expected=2):
         self.argument_count = argument_count
+        self.expected = expected
 
     def accept(self, visitor):
         visitor.wrong_number_of_arguments(self)
\ No newline at end of file
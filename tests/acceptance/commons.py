@@ -63,7 +63,7 @@ class MadAcceptanceTests(TestCase):
         self._verify_disclaimer()
 
     def _verify_invalid_parameter_count(self, count):
-        self._verify_output(Messages.INVALID_PARAMETER_COUNT, count=count)
+        self._verify_output(Messages.INVALID_PARAMETER_COUNT, expected=2, count=count)
 
     def _verify_invalid_simulation_length(self, wrong_length):
         self._verify_output(Messages.INVALID_SIMULATION_LENGTH, length=wrong_length)
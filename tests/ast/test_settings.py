@@ -73,6 +73,28 @@ class AutoscalingSettingsTest(TestCase):
         evaluation.of_autoscaling.assert_called_once_with(settings)
 
 
+class TracingSettingsTest(TestCase):
+
+    def test_default_level_is_all(self):
+        tracing = Tracing()
+        self.assertEqual(Tracing.ALL, tracing.level)
+        self.assertTrue(tracing.is_enabled)
+
+    def test_off_is_disabled(self):
+        self.assertFalse(Tracing(Tracing.OFF).is_enabled)
+
+    def test_reject_invalid_level(self):
+        with self.assertRaises(ValueError):
+            Tracing("verbose")
+
+    def test_evaluation(self):
+        settings = Tracing()
+        evaluation = MagicMock(Evaluation)
+        settings.accept(evaluation)
+
+        evaluation.of_tracing.assert_called_once_with(settings)
+
+
 class FIFOTests(TestCase):
 
      def test_accept(self):
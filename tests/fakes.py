@@ -17,11 +17,11 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from io import StringIO
+from io import StringIO, BytesIO
 
 from mad.log import Log, Event
-from mad.storage import DataStorage
-from mad.monitoring import CSVReport
+from mad.storage import DataStorage, Compression
+from mad.monitoring import MetricStore
 
 
 class InMemoryDataStorage(DataStorage):
@@ -29,7 +29,8 @@ class InMemoryDataStorage(DataStorage):
     def __init__(self, model):
         self._log = InMemoryLog()
         self._model = model
-        self._opened_reports = {}
+        self.metrics = MetricStore()
+        self.spans = None
 
     @property
     def log(self):
@@ -38,10 +39,26 @@ class InMemoryDataStorage(DataStorage):
     def model(self):
         return self._model
 
-    def report_for(self, entity, format):
-        if entity not in self._opened_reports:
-            self._opened_reports[entity] = CSVReport(StringIO(), format)
-        return self._opened_reports[entity]
+    def report_for(self, entity, probes):
+        return self.metrics.report_for(entity, probes)
+
+
+class InMemoryStream(StringIO):
+    """
+    A text stream whose content remains available once closed
+    """
+
+    def close(self):
+        pass
+
+
+class InMemoryBinaryStream(BytesIO):
+    """
+    A binary stream whose content remains available once closed
+    """
+
+    def close(self):
+        pass
 
 
 class InMemoryFileSystem:
@@ -50,18 +67,59 @@ class InMemoryFileSystem:
         self.opened_files = {}
 
     def define(self, location, content):
-        self.opened_files[location] = StringIO(content)
+        self.opened_files[location] = InMemoryStream(content)
 
     def open_input_stream(self, location):
+        location = self._locate(location)
         if location not in self.opened_files:
             raise FileNotFoundError(location)
+        stream = self.opened_files[location]
+        stream.seek(0)
+        return stream
+
+    def open_output_stream(self, location, compression=None):
+        if compression:
+            location += compression.extension
+        if location not in self.opened_files:
+            self.opened_files[location] = InMemoryStream()
         return self.opened_files[location]
 
-    def open_output_stream(self, location):
+    def open_binary_input_stream(self, location):
+        location = self._locate(location)
+        if location not in self.opened_files:
+            raise FileNotFoundError(location)
+        stream = self.opened_files[location]
+        stream.seek(0)
+        return stream
+
+    def open_memory_map(self, location):
+        return self.open_input_stream(location).getvalue().encode("utf-8")
+
+    def open_binary_output_stream(self, location, compression=None):
+        if compression:
+            location += compression.extension
         if location not in self.opened_files:
-            self.opened_files[location] = StringIO()
+            self.opened_files[location] = InMemoryBinaryStream()
         return self.opened_files[location]
 
+    def replace(self, source, destination):
+        self.opened_files[destination] = self.opened_files.pop(source)
+
+    def exists(self, location):
+        return self._locate(location) in self.opened_files
+
+    def _locate(self, location):
+        """
+        Compressed files are held uncompressed, but under their compressed
+        name, as a real file system would expose them
+        """
+        if location in self.opened_files:
+            return location
+        for (extension, _, _, _) in Compression.CODECS.values():
+            if location + extension in self.opened_files:
+                return location + extension
+        return location
+
     def has_file(self, file):
         for any_location in self.opened_files:
             if any_location.endswith(file):
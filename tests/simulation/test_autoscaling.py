@@ -21,7 +21,12 @@ from unittest import TestCase
 from mock import MagicMock, PropertyMock
 from tests.fakes import InMemoryDataStorage
 
+from mad.ast.commons import Sequence
+from mad.ast.definitions import DefineService, DefineOperation, DefineClientStub
+from mad.ast.actions import Think, Query
+from mad.ast.settings import Settings, Autoscaling
 from mad.evaluation import Symbols
+from mad.statistics import TimeWeightedGauge
 
 from mad.simulation.factory import Simulation
 from mad.simulation.workers import WorkerPoolWrapper, WorkerPool, Worker
@@ -83,6 +88,45 @@ class AutoScalerTest(TestCase):
 
         worker_pool.set_capacity.assert_called_once_with(max)
 
+    def test_clamping_a_worker_count(self):
+        auto_scaler = AutoScaler(self.mock.simulation.environment, 10, (2, 5), self.mock.auto_scaling_strategy(adjust_return=3))
+
+        self.assertEqual([2, 2, 3, 5, 5], [auto_scaler.clamp(each) for each in [1, 2, 3, 5, 6]])
+
+    def test_uses_the_average_utilisation_since_the_last_adjustment(self):
+        worker_pool = self.mock.worker_pool()
+        monitor = MagicMock()
+        monitor.gauges.busy_workers = TimeWeightedGauge(0, 0)
+        monitor.gauges.worker_count = TimeWeightedGauge(0, 4)
+        self.mock.simulation.environment.define(Symbols.MONITOR, monitor)
+        strategy = self.mock.auto_scaling_strategy(adjust_return=2)
+        AutoScaler(self.mock.simulation.environment, 10, (1, 3), strategy)
+
+        self.mock.simulation.schedule.at(5, lambda: monitor.gauges.busy_workers.update(5, 4))
+        self.mock.simulation.schedule.at(6, lambda: monitor.gauges.busy_workers.update(6, 0))
+        self.mock.simulation.run_until(10)
+
+        strategy.adjust.assert_called_once_with(worker_pool, 100 * 4 / 40)
+
+    def test_gauges_follow_the_capacity_after_a_scale_down_under_load(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(Sequence(
+            DefineService("DB", Sequence(Settings(autoscaling=Autoscaling(10, (3, 3))),
+                                         DefineOperation("Select", Think(20)))),
+            DefineClientStub("Browser", 2, Query("DB", "Select"))))
+        db = simulation.environment.look_up("DB")
+        simulation.schedule.at(100, lambda: setattr(db.look_up(Symbols.AUTOSCALING), "limits", (1, 1)))
+
+        simulation.run_until(200)
+        gauges = db.look_up(Symbols.MONITOR).gauges
+        (workers, busy) = (gauges.worker_count.integral(200), gauges.busy_workers.integral(200))
+        simulation.run_until(300)
+
+        self.assertTrue(db.tasks.are_pending)
+        self.assertEqual(1, db.workers.capacity)
+        self.assertEqual(1, (gauges.worker_count.integral(300) - workers) / 100)
+        self.assertEqual(1, (gauges.busy_workers.integral(300) - busy) / 100)
+
 
 class AutoScalingTests(TestCase):
 
@@ -121,6 +121,7 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
             call.task_created(ANY),
             call.task_rejected(ANY),
@@ -159,13 +160,17 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
             call.posting_of("DB", ANY),
             call.task_paused(ANY),
+            call.worker_idle(ANY),
             call.rejection_of(ANY),
             call.task_activated(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
-            call.task_failed(ANY)
+            call.task_failed(ANY),
+            call.worker_idle(ANY)
         ]
 
         self.assertEqual(request.status, RequestStatus.ERROR)
@@ -189,8 +194,10 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
-            call.task_successful(ANY)]
+            call.task_successful(ANY),
+            call.worker_idle(ANY)]
 
         self.assertEqual(expected_calls, listener.method_calls, listener.method_calls)
 
@@ -212,8 +219,10 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
-            call.task_failed(ANY)]
+            call.task_failed(ANY),
+            call.worker_idle(ANY)]
 
         self.assertEqual(expected_calls, listener.method_calls, listener.method_calls)
 
@@ -236,7 +245,9 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
-            call.task_cancelled(ANY)]
+            call.worker_busy(ANY),
+            call.task_cancelled(ANY),
+            call.worker_idle(ANY)]
 
         self.assertEqual(expected_calls, listener.method_calls, listener.method_calls)
 
@@ -259,6 +270,7 @@ class NotificationTests(ServiceTests):
         expected_calls = [
             call.task_created(ANY),
             call.task_accepted(ANY),
+            call.worker_busy(ANY),
             call.task_assigned_to(ANY, ANY),
             call.task_created(ANY),
             call.task_accepted(ANY),
@@ -266,6 +278,7 @@ class NotificationTests(ServiceTests):
             call.task_successful(ANY),
             call.task_assigned_to(ANY, ANY),
             call.task_successful(ANY),
+            call.worker_idle(ANY)
         ]
 
         self.assertEqual(expected_calls, listener.method_calls, listener.method_calls)
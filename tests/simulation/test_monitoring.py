@@ -17,19 +17,26 @@
 # along with MAD.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from itertools import count
 from unittest import TestCase
 from mock import MagicMock, patch
 
 from tests.fakes import InMemoryDataStorage
 
-from mad.log import Log
+from mad.ast.commons import Sequence
+from mad.ast.definitions import DefineService, DefineOperation, DefineClientStub
+from mad.ast.actions import Think, Query
+from mad.ast.settings import Tracing
 from mad.evaluation import Symbols
-from mad.simulation.factory import Factory
-from mad.simulation.monitoring import OperationStatistics, TasksStatistics, WorkersStatistics, Monitor, Probe, Statistics, Logger
+from mad.log import EventCode
+from mad.simulation.factory import Factory, Simulation
+from mad.simulation.reconfiguration import Burst
+from mad.simulation.monitoring import OperationStatistics, TasksStatistics, WorkersStatistics, WorkloadGauges, Monitor, Probe, Statistics, Logger, TraceFilter, Span, LatencyBreakdown, AdaptiveSampling, BatchMeansAnalysis
 from mad.simulation.events import Dispatcher
 from mad.simulation.requests import Request
 from mad.simulation.tasks import Task, TaskStatus
 from mad.simulation.workers import WorkerStatus
+from mad.statistics import MSER, PeriodBlocks
 
 
 def a_request(operation="foo", response_time=5):
@@ -113,13 +120,17 @@ class WorkerStatisticsTests(TestCase):
         self._verify(starting=0, idle=0, busy=0, shutdown=1)
         self._verify(utilisation=None)
 
-    def test_worker_shutdown_only_accepts_idle_workers(self):
-        def do_test(status):
-            with self.assertRaises(ValueError):
-                self.workers.worker_shutdown(a_worker(status))
+    def test_worker_shutdown_of_a_busy_worker(self):
+        self.workers.worker_created(a_worker(WorkerStatus.STARTING))
+        self.workers.worker_idle(a_worker(WorkerStatus.STARTING))
+        self.workers.worker_busy(a_worker(WorkerStatus.IDLE))
+        self.workers.worker_shutdown(a_worker(WorkerStatus.BUSY))
 
-        for each_status in [WorkerStatus.STARTING, WorkerStatus.BUSY]:
-            do_test(each_status)
+        self._verify(starting=0, idle=0, busy=0, shutdown=1)
+
+    def test_worker_shutdown_rejects_starting_workers(self):
+        with self.assertRaises(ValueError):
+            self.workers.worker_shutdown(a_worker(WorkerStatus.STARTING))
 
 
     def _verify(self, **counters):
@@ -254,6 +265,53 @@ class TasksStatisticsTests(TestCase):
                              "Wrong count of {:s} tasks (expected {!s} but found {!s}!)".format(label, expected_value, property))
 
 
+class WorkloadGaugesTests(TestCase):
+
+    def setUp(self):
+        self.time = 0
+        self.gauges = WorkloadGauges(lambda: self.time, worker_count=2)
+
+    def test_queue_length(self):
+        window = self.gauges.queue.window(0)
+        self.gauges.task_created(a_task(TaskStatus.CREATED))
+        self.gauges.task_created(a_task(TaskStatus.CREATED))
+        self.time = 4
+        self.gauges.task_assigned_to(a_task(TaskStatus.READY), "a worker")
+        self.time = 6
+        self.gauges.task_rejected(a_task(TaskStatus.CREATED))
+
+        self.assertEqual(0, self.gauges.queue.level)
+        self.assertEqual(2, window.maximum)
+        self.assertEqual((2 * 4 + 1 * 2) / 10, window.average(10))
+
+    def test_blocked_tasks_join_the_queue_once_activated(self):
+        self.gauges.task_activated(a_task(TaskStatus.BLOCKED))
+        self.gauges.task_activated(a_task(TaskStatus.CREATED))
+
+        self.assertEqual(1, self.gauges.queue.level)
+
+    def test_busy_workers(self):
+        window = self.gauges.busy_workers.window(0)
+        self.gauges.worker_busy(a_worker(WorkerStatus.IDLE))
+        self.time = 5
+        self.gauges.worker_idle(a_worker(WorkerStatus.BUSY))
+
+        self.assertEqual(0, self.gauges.busy_workers.level)
+        self.assertEqual(1, window.maximum)
+        self.assertEqual(0.5, window.average(10))
+
+    def test_worker_count(self):
+        self.gauges.worker_created(a_worker(WorkerStatus.STARTING))
+        self.gauges.worker_idle(a_worker(WorkerStatus.STARTING))
+        self.time = 10
+        self.gauges.worker_shutdown(a_worker(WorkerStatus.IDLE))
+        self.gauges.worker_shutdown(a_worker(WorkerStatus.IDLE))
+
+        self.assertEqual(1, self.gauges.worker_count.level)
+        self.assertEqual(0, self.gauges.busy_workers.level)
+        self.assertEqual(30, self.gauges.worker_count.integral(10))
+
+
 class OperationStatisticsTests(TestCase):
 
     def setUp(self):
@@ -294,6 +352,15 @@ class OperationStatisticsTests(TestCase):
         expectation = sum(durations) / len(durations)
         self.assertEqual(expectation, self.operation.response_time)
 
+    def test_period_response_time(self):
+        self.operation.call_succeed(10)
+        self.operation.new_period()
+        self.operation.call_succeed(4)
+        self.operation.call_succeed(6)
+
+        self.assertEqual(5, self.operation.period_response_time)
+        self.assertEqual(20 / 3, self.operation.response_time)
+
     def test_reset(self):
         self.operation.call()
         self.operation.call_failed()
@@ -330,7 +397,7 @@ class StatisticsTests(TestCase):
         self.statistics.task_created(a_request())
         self.statistics.rejection_of(a_request())
         self.statistics.task_failed(a_request())
-        self.statistics.task_successful(a_request(10))
+        self.statistics.task_successful(a_task(response_time=10))
         self.statistics.reset()
 
         self.assertEqual(0, self.statistics.arrival_count)
@@ -338,26 +405,39 @@ class StatisticsTests(TestCase):
         self.assertEqual(0, self.statistics.failure_count)
         self.assertIsNone(self.statistics.response_time)
 
+    def test_counts_aggregate_all_operations(self):
+        self.statistics.task_created(a_task(operation="foo"))
+        self.statistics.task_created(a_task(operation="bar"))
+        self.statistics.task_successful(a_task(operation="foo", response_time=4))
+        self.statistics.task_failed(a_task(operation="bar"))
+        self.statistics.task_rejected(a_task(operation="quz"))
+
+        self.assertEqual(2, self.statistics.arrival_count)
+        self.assertEqual(1, self.statistics.success_count)
+        self.assertEqual(1, self.statistics.rejection_count)
+        self.assertEqual(2, self.statistics.failure_count)
+        self.assertEqual(3, self.statistics.complete_request_count)
+
     def test_error_response(self):
         self.statistics.task_failed(a_request())
 
         self.assertEqual(1, self.statistics.failure_count)
 
     def test_success_count(self):
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
         self.statistics.rejection_of(a_request())
         self.statistics.task_failed(a_request())
 
         self.assertEqual(4, self.statistics.success_count)
 
     def test_reliability(self):
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
-        self.statistics.task_successful(a_request())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
+        self.statistics.task_successful(a_task())
         self.statistics.task_rejected(a_request())
         self.statistics.task_failed(a_request())
 
@@ -392,6 +472,23 @@ class StatisticsTests(TestCase):
         expectation = sum(response_times) / len(response_times)
         self.assertEqual(expectation, self.statistics.response_time)
 
+    def test_period_response_time(self):
+        self._success_of_tasks([10, 20])
+        self.statistics.new_period()
+        self._success_of_tasks([4, 6])
+
+        self.assertEqual(5, self.statistics.period_response_time)
+        self.assertEqual(10, self.statistics.response_time)
+        self.assertEqual(6, self.statistics.period_maximum_response_time)
+        self.assertEqual(20, self.statistics.maximum_response_time)
+
+    def test_response_time_quantiles(self):
+        self._success_of_tasks(list(range(1, 101)))
+
+        self.assertAlmostEqual(50, self.statistics.response_time_quantile(0.5), delta=1)
+        self.assertAlmostEqual(99, self.statistics.response_time_quantile(0.99), delta=2)
+        self.assertEqual(100, self.statistics.maximum_response_time)
+
     def test_response_time_per_operation(self):
         tasks = [{"operation": "foo", "response_time": 12},
                     {"operation": "foo", "response_time": 14},
@@ -414,6 +511,85 @@ class StatisticsTests(TestCase):
 
 
 
+class SpanTests(TestCase):
+
+    def test_phases(self):
+        span = Span(2)
+        span.enter(Span.SERVICE, 5)
+        span.enter(Span.BLOCKED, 6)
+        span.enter(Span.QUEUEING, 10)
+        span.enter(Span.SERVICE, 11)
+        span.close(13, network=2)
+
+        self.assertEqual([4, 3, 4, 0, 2], span.durations)
+        self.assertEqual(13, span.end)
+        self.assertEqual(13, span.total)
+
+
+class LatencyBreakdownTests(TestCase):
+
+    def setUp(self):
+        self.time = 0
+        self.report = MagicMock()
+        self.latency = LatencyBreakdown(lambda: self.time, "DB", self.report)
+
+    def _task(self, is_traced=True):
+        task = a_task(operation="Select")
+        task.span = None
+        task.is_backing_off = False
+        task.is_traced = is_traced
+        task.request.emission_time = 0
+        task.request.TRANSMISSION_DELAY = 1
+        task.request.identifier = 2
+        task.request.task.identifier = 1
+        return task
+
+    def _process(self, task):
+        events = [(1, lambda: self.latency.task_created(task)),
+                  (3, lambda: self.latency.task_assigned_to(task, "a worker")),
+                  (5, lambda: self.latency.task_paused(task)),
+                  (9, lambda: self.latency.task_activated(task)),
+                  (10, lambda: self.latency.task_assigned_to(task, "a worker")),
+                  (12, lambda: self.latency.task_successful(task))]
+        for (time, event) in events:
+            self.time = time
+            event()
+
+    def test_breakdown_per_operation(self):
+        self._process(self._task())
+
+        self.assertEqual(3, self.latency.average("Select", Span.QUEUEING))
+        self.assertEqual(4, self.latency.average("Select", Span.SERVICE))
+        self.assertEqual(4, self.latency.average("Select", Span.BLOCKED))
+        self.assertEqual(0, self.latency.average("Select", Span.BACKOFF))
+        self.assertEqual(2, self.latency.average("Select", Span.NETWORK))
+        self.assertIsNone(self.latency.average("Insert", Span.QUEUEING))
+
+    def test_back_off(self):
+        task = self._task()
+        task.is_backing_off = True
+        self._process(task)
+
+        self.assertEqual(0, self.latency.average("Select", Span.BLOCKED))
+        self.assertEqual(4, self.latency.average("Select", Span.BACKOFF))
+
+    def test_new_period(self):
+        self._process(self._task())
+        self.latency.new_period()
+        self.assertIsNone(self.latency.average("Select", Span.SERVICE))
+
+    def test_reporting_traced_requests(self):
+        self._process(self._task())
+
+        self.report.assert_called_once_with(
+            request=2, parent=1, entity="DB", operation="Select", start=1, end=12,
+            queueing=3, service=4, blocked=4, back_off=0, network=2)
+
+    def test_ignoring_requests_not_traced(self):
+        self._process(self._task(is_traced=False))
+        self.report.assert_not_called()
+
+
 class ProbeTests(TestCase):
 
     def test_formatted(self):
@@ -430,6 +606,12 @@ class ProbeTests(TestCase):
 
         self.assertEqual(" 5.34", text)
 
+    def test_format_value(self):
+        probe = Probe("text", 5, "{:d}", lambda x: None)
+
+        self.assertEqual("   12", probe.format_value(12.0))
+        self.assertEqual("   NA", probe.format_value(None))
+
     def test_missing_value(self):
         probe = Probe("text", 5, "{:5.2f}", lambda x: None)
 
@@ -467,7 +649,7 @@ class MonitorTests(TestCase):
 
     def _run_scenario(self, total, rejected, errors):
         for i in range(total):
-            self.monitor.statistics.task_successful(a_request())
+            self.monitor.statistics.task_successful(a_task())
         for i in range(rejected):
             self.monitor.statistics.task_rejected(a_request())
         for i in range(errors):
@@ -493,7 +675,91 @@ class MonitorTests(TestCase):
 
         monitor.monitor()
 
-        fake_report.assert_called_once_with(time="   10", weather="    cloudy")
+        fake_report.assert_called_once_with(time=10, weather="cloudy")
+
+    def test_rows_carry_their_window(self):
+        fake_report = MagicMock()
+        self.storage.report_for = MagicMock(return_value=fake_report)
+        monitor = self._create_monitor(period=10)
+        monitor.set_probes([Probe("time", 5, "{:d}", lambda self: self.schedule.time_now),
+                            Probe("window start", 5, "{:d}", lambda self: self._window_start)])
+
+        self.simulation.run_until(20)
+
+        fake_report.assert_called_with(**{"time": 20, "window start": 10})
+
+    def test_adaptive_sampling_backs_off_when_steady(self):
+        self.simulation.sampling = AdaptiveSampling(finest=5, coarsest=80, patience=2)
+        with patch.object(Monitor, 'monitor') as trigger:
+            monitor = self._create_monitor(period=10)
+
+            self.simulation.run_until(1000)
+
+            self.assertEqual(80, monitor.period)
+            self.assertLess(trigger.call_count, 20)
+
+    def test_adaptive_sampling_refines_on_changes(self):
+        self.simulation.sampling = AdaptiveSampling(finest=5, coarsest=80)
+        with patch.object(Monitor, 'monitor'):
+            monitor = self._create_monitor(period=10)
+            self.simulation.run_until(10)
+
+            monitor.gauges.queue.update(self.simulation.schedule.time_now, 5)
+            self.simulation.run_until(20)
+
+            self.assertEqual(5, monitor.period)
+
+    def test_batch_means_ignore_the_warm_up(self):
+        self.simulation.batch_means = BatchMeansAnalysis(warm_up=20)
+        self.storage.report_for = MagicMock(return_value=MagicMock())
+        self.monitor = self._create_monitor(period=10)
+        self.monitor.set_probes([Probe("time", 5, "{:d}", lambda self: self.schedule.time_now)])
+        for _ in range(5):
+            self._run_scenario(3, 0, 1)
+            self.simulation.run_until(self.simulation.schedule.time_now + 10)
+
+        estimates = {metric: rest for (metric, *rest) in self.monitor.batch_means_estimates()}
+
+        (periods, mean, _, _, _, _) = estimates["throughput"]
+        self.assertEqual(3, periods)
+        self.assertAlmostEqual(0.3, mean)
+        self.assertAlmostEqual(0.75, estimates["reliability"][1])
+
+    def test_warm_up_detection_holds_a_bounded_number_of_periods(self):
+        self.simulation.batch_means = BatchMeansAnalysis(warm_up=BatchMeansAnalysis.AUTOMATIC)
+        self.storage.report_for = MagicMock(return_value=MagicMock())
+        monitor = self._create_monitor(period=10)
+        monitor.set_probes([Probe("time", 5, "{:d}", lambda self: self.schedule.time_now)])
+        trend = count()
+        with patch.object(Monitor, "_period_observations",
+                          side_effect=lambda: {each: (next(trend), 1) for each in Monitor.BATCHED_METRICS}):
+            self.simulation.run_until(50000)
+
+        self.assertIsNone(monitor.warm_up)
+        self.assertLessEqual(len(monitor._warm_up_periods), PeriodBlocks.DEFAULT_CAPACITY)
+        for each_detector in monitor._warm_up_detectors.values():
+            self.assertLess(len(each_detector._batches), MSER.DEFAULT_CAPACITY)
+
+    def test_no_batch_means_by_default(self):
+        monitor = self._create_monitor(period=10)
+        self.assertIsNone(monitor.batch_means)
+
+    def test_quantiles_cover_each_period(self):
+        storage = InMemoryDataStorage(None)
+        simulation = Simulation(storage)
+        simulation.evaluate(Sequence(
+            DefineService("DB", DefineOperation("Select", Think(5))),
+            DefineClientStub("Browser", 100, Query("DB", "Select"))))
+        Burst("Browser", 10).apply(simulation)
+
+        simulation.run_until(200)
+
+        report = storage.metrics["DB"]
+        rows = {row[0]: dict(zip([each.name for each in report.probes], row)) for row in report.rows()}
+        for each_name in ["response time p99", "response time p99 Select", "response time max",
+                          "response time max Select"]:
+            self.assertLess(40, rows[50][each_name])
+            self.assertGreater(10, rows[110][each_name])
 
     def _create_monitor(self, period=50):
         environment = self.simulation.environment.create_local_environment()
@@ -509,6 +775,37 @@ class MonitorTests(TestCase):
         environment.define(Symbols.SERVICE, fake_service)
 
 
+class SamplingRateTests(TestCase):
+
+    def setUp(self):
+        self.rate = AdaptiveSampling(finest=2, coarsest=40, threshold=0.25, patience=2).rate(10)
+
+    def test_halves_the_period_when_indicators_change(self):
+        self.rate.adjust((1, 50, 0))
+
+        self.assertEqual(5, self.rate.adjust((1, 80, 0)))
+        self.assertEqual(2, self.rate.adjust((4, 80, 0)))
+        self.assertEqual(2, self.rate.adjust((8, 80, 0)))
+
+    def test_doubles_the_period_when_steady(self):
+        periods = [self.rate.adjust((3, 50, 0.01)) for _ in range(9)]
+
+        self.assertEqual([10, 10, 20, 20, 40, 40, 40, 40, 40], periods)
+
+    def test_small_changes_around_zero_are_steady(self):
+        self.rate.adjust((0, 0, 0))
+
+        self.assertEqual(10, self.rate.adjust((0, 2, 0.02)))
+
+    def test_ignores_missing_indicators(self):
+        self.rate.adjust((None, None, 0))
+
+        self.assertEqual(10, self.rate.adjust((3, None, 0)))
+
+    def test_starts_within_bounds(self):
+        self.assertEqual(40, AdaptiveSampling(finest=2, coarsest=40).rate(100).period)
+
+
 class LoggerTest(TestCase):
     CALLER = "Client"
     CALLEE = "DB"
@@ -518,7 +815,6 @@ class LoggerTest(TestCase):
     def setUp(self):
         self.factory = Factory()
         self.storage = InMemoryDataStorage(None)
-        self.storage._log = MagicMock(Log)
         self.simulation = self.factory.create_simulation(self.storage)
         service = MagicMock()
         service.name = self.CALLER
@@ -566,11 +862,65 @@ class LoggerTest(TestCase):
         self.logger.rejection_of(self._fake_request())
         self.verify_log_call(Logger.REQUEST_REJECTED.format(request=self.REQUEST_ID))
 
+    def test_ignoring_requests_that_are_not_traced(self):
+        request = self._fake_request()
+        request.is_traced = False
+        self.logger.task_created(request)
+        self.logger.posting_of(self.CALLEE, request)
+        self.assertTrue(self.simulation.log.is_empty)
+
+    def test_filtering_by_level(self):
+        self.logger = Logger(self.simulation.environment, Tracing(Tracing.REQUESTS))
+        self.logger.task_activated(self._fake_request())
+        self.assertTrue(self.simulation.log.is_empty)
+
+    def test_filtering_by_operation(self):
+        self.logger = Logger(self.simulation.environment, Tracing(exclude=[self.CALLER + "/" + self.OPERATION]))
+        self.logger.success_of(self._fake_request())
+        self.assertTrue(self.simulation.log.is_empty)
+
     def verify_log_call(self, message):
-        self.simulation.log.record.assert_called_once_with(0, self.CALLER, message)
+        entries = list(self.simulation.log)
+        self.assertEqual(1, len(entries))
+        self.assertEqual((0, self.CALLER, message), (entries[0].time, entries[0].context, entries[0].message))
 
     def _fake_request(self):
         request = MagicMock(Request)
         request.identifier = self.REQUEST_ID
         request.operation = self.OPERATION
-        return request
\ No newline at end of file
+        request.is_traced = True
+        return request
+
+
+class TraceFilterTest(TestCase):
+
+    def test_accepting_everything_by_default(self):
+        trace_filter = TraceFilter(Tracing())
+        self.assertTrue(trace_filter.accepts(EventCode.TASK_ASSIGNED, "DB", "Select"))
+
+    def test_rejecting_everything_when_off(self):
+        trace_filter = TraceFilter(Tracing(Tracing.OFF))
+        self.assertFalse(trace_filter.accepts(EventCode.REQUEST_SENT, "DB", "Select"))
+
+    def test_levels(self):
+        requests = TraceFilter(Tracing(Tracing.REQUESTS))
+        tasks = TraceFilter(Tracing(Tracing.TASKS))
+
+        self.assertTrue(requests.accepts(EventCode.REQUEST_SENT, "DB", "Select"))
+        self.assertFalse(requests.accepts(EventCode.TASK_PAUSED, "DB", "Select"))
+        self.assertTrue(tasks.accepts(EventCode.TASK_PAUSED, "DB", "Select"))
+        self.assertFalse(tasks.accepts(EventCode.TASK_ASSIGNED, "DB", "Select"))
+
+    def test_including_services_and_operations(self):
+        trace_filter = TraceFilter(Tracing(include=["DB", "Cache/Get"]))
+
+        self.assertTrue(trace_filter.accepts(EventCode.TASK_RECEIVED, "DB", "Select"))
+        self.assertTrue(trace_filter.accepts(EventCode.TASK_RECEIVED, "Cache", "Get"))
+        self.assertFalse(trace_filter.accepts(EventCode.TASK_RECEIVED, "Cache", "Put"))
+        self.assertFalse(trace_filter.accepts(EventCode.TASK_RECEIVED, "Browser", "Get"))
+
+    def test_excluding_services_and_operations(self):
+        trace_filter = TraceFilter(Tracing(include=["DB"], exclude=["DB/Insert"]))
+
+        self.assertTrue(trace_filter.accepts(EventCode.TASK_RECEIVED, "DB", "Select"))
+        self.assertFalse(trace_filter.accepts(EventCode.TASK_RECEIVED, "DB", "Insert"))
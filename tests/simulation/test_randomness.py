@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from unittest import TestCase
+
+from mad.simulation.randomness import RandomStream, RandomStreams
+
+
+class RandomStreamTests(TestCase):
+
+    def test_antithetic_streams_mirror_regular_ones(self):
+        (regular, antithetic) = (RandomStream(5), RandomStream(5, antithetic=True))
+
+        for _ in range(10):
+            self.assertAlmostEqual(1, regular.random() + antithetic.random())
+
+    def test_integers_stay_within_bounds(self):
+        for each_stream in [RandomStream(5), RandomStream(5, antithetic=True)]:
+            values = {each_stream.randint(0, 3) for _ in range(200)}
+            self.assertEqual({0, 1, 2, 3}, values)
+
+
+class RandomStreamsTests(TestCase):
+
+    def test_streams_only_depend_on_the_seed_and_their_key(self):
+        (first, second) = (RandomStreams(12), RandomStreams(12))
+        first.stream_for("Browser", "sampling").random()
+
+        self.assertEqual(first.stream_for("DB", "fail").random(), second.stream_for("DB", "fail").random())
+
+    def test_streams_differ_across_entities_and_purposes(self):
+        streams = RandomStreams(12)
+        draws = {streams.stream_for(entity, purpose).random()
+                 for entity in ["DB", "Browser"] for purpose in ["fail", "backoff"]}
+
+        self.assertEqual(4, len(draws))
+
+    def test_streams_differ_across_seeds(self):
+        self.assertNotEqual(RandomStreams(1).stream_for("DB", "fail").random(),
+                            RandomStreams(2).stream_for("DB", "fail").random())
+
+    def test_the_same_stream_is_shared(self):
+        streams = RandomStreams(12)
+        self.assertIs(streams.stream_for("DB", "fail"), streams.stream_for("DB", "fail"))
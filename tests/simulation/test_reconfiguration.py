@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from io import StringIO
+from unittest import TestCase
+
+from tests.fakes import InMemoryDataStorage
+
+from mad.ast.commons import Sequence
+from mad.ast.definitions import DefineService, DefineOperation, DefineClientStub
+from mad.ast.actions import Think, Query
+from mad.ast.settings import Settings, TailDropSettings
+from mad.evaluation import Symbols
+from mad.simulation.factory import Simulation
+from mad.simulation.throttling import TailDrop
+from mad.simulation.reconfiguration import Reconfiguration, InvalidReconfiguration, WorkerCount, TailDropCapacity, \
+    Burst, AutoscalingLimits, ClientPeriod, QueryTimeout
+
+
+class ChangeTests(TestCase):
+
+    def setUp(self):
+        self.query = Query("DB", "Select")
+        self.simulation = Simulation(InMemoryDataStorage(None))
+        self.simulation.evaluate(Sequence(
+            DefineService("DB", DefineOperation("Select", Think(5))),
+            DefineClientStub("Browser", 10, self.query)))
+        self.db = self.simulation.environment.look_up("DB")
+
+    def test_setting_the_worker_count(self):
+        WorkerCount("DB", 4).apply(self.simulation)
+
+        self.assertEqual(4, self.db.workers.capacity)
+        self.assertEqual((4, 4), self.db.look_up(Symbols.AUTOSCALING).limits)
+
+    def test_autoscaling_keeps_the_new_worker_count(self):
+        WorkerCount("DB", 4).apply(self.simulation)
+        self.simulation.run_until(100)
+
+        self.assertEqual(4, self.db.workers.capacity)
+
+    def test_throttling_an_unthrottled_service(self):
+        TailDropCapacity("DB", 20).apply(self.simulation)
+
+        self.assertIsInstance(self.db.tasks.delegate, TailDrop)
+        self.assertEqual(20, self.db.tasks.delegate.capacity)
+
+    def test_changing_the_tail_drop_capacity(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(DefineService("DB", Sequence(Settings(throttling=TailDropSettings(5)),
+                                                         DefineOperation("Select", Think(5)))))
+        policy = simulation.environment.look_up("DB").tasks.delegate
+
+        TailDropCapacity("DB", 20).apply(simulation)
+
+        self.assertIs(policy, simulation.environment.look_up("DB").tasks.delegate)
+        self.assertEqual(20, policy.capacity)
+
+    def test_bursts(self):
+        Burst("Browser", 5).apply(self.simulation)
+        self.simulation.run_until(5)
+
+        self.assertEqual(5, self.db.look_up(Symbols.MONITOR).statistics.arrival_count)
+
+    def test_raising_the_autoscaling_limits(self):
+        AutoscalingLimits("DB", [3, 6]).apply(self.simulation)
+
+        self.assertEqual((3, 6), self.db.look_up(Symbols.AUTOSCALING).limits)
+        self.assertEqual(3, self.db.workers.capacity)
+
+    def test_changing_the_client_period(self):
+        self.simulation.schedule.at(25, lambda: ClientPeriod("Browser", 5).apply(self.simulation))
+        self.simulation.run_until(50)
+
+        # Requests at 10, 20, 30 (the period changes at the next one), then 35, 40 and 45
+        self.assertEqual(6, self.db.look_up(Symbols.MONITOR).statistics.arrival_count)
+
+    def test_setting_query_timeouts(self):
+        QueryTimeout("Browser", 50, "DB/Select").apply(self.simulation)
+
+        body = self.simulation.environment.look_up("Browser").look_up(Symbols.CLIENT_OPERATION).body
+        self.assertEqual(50, body.timeout)
+        self.assertIsNone(self.query.timeout)
+
+    def test_rejecting_unknown_entities(self):
+        for each_change in [WorkerCount("Cache", 2), WorkerCount("Browser", 2), Burst("DB", 5),
+                            ClientPeriod("DB", 2), QueryTimeout("Browser", 50, "DB/Insert")]:
+            with self.assertRaises(InvalidReconfiguration):
+                each_change.check(self.simulation)
+
+
+class ReconfigurationTests(TestCase):
+
+    def test_parsing_changes(self):
+        reconfiguration = Reconfiguration.from_json([{"at": 50, "service": "DB", "tail-drop": 10},
+                                                     {"service": "DB", "workers": 4}], default_time=20)
+
+        [(first_time, first), (second_time, second)] = reconfiguration.changes
+        self.assertEqual((20, "DB", 4), (first_time, first.entity, first.value))
+        self.assertIsInstance(first, WorkerCount)
+        self.assertEqual((50, 10), (second_time, second.value))
+        self.assertIsInstance(second, TailDropCapacity)
+
+    def test_rejecting_invalid_changes(self):
+        for each_entries in [{"service": "DB", "workers": 4},
+                             [{"service": "DB", "workers": 4}],
+                             [{"at": 10, "service": "DB"}],
+                             [{"at": 10, "service": "DB", "workers": 4, "tail-drop": 2}],
+                             [{"at": 10, "service": "DB", "workers": 0}],
+                             [{"at": 10, "client": "Browser", "workers": 2}],
+                             [{"at": 10, "service": "DB", "speed": 2}],
+                             [{"at": 10, "service": "DB", "autoscaling": [4, 2]}],
+                             [{"at": 10, "client": "Browser", "timeout": 50}]]:
+            with self.assertRaises(InvalidReconfiguration):
+                Reconfiguration.from_json(each_entries)
+
+    def test_scheduling_changes(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(DefineService("DB", DefineOperation("Select", Think(5))))
+        reconfiguration = Reconfiguration.from_json([{"at": 0, "service": "DB", "workers": 2},
+                                                     {"at": 50, "service": "DB", "workers": 3}])
+
+        reconfiguration.schedule(simulation)
+
+        workers = simulation.environment.look_up("DB").workers
+        self.assertEqual(2, workers.capacity)
+        simulation.run_until(60)
+        self.assertEqual(3, workers.capacity)
+
+    def test_loading_a_timeline(self):
+        reconfiguration = Reconfiguration.load(StringIO("""[
+            {"at": 500, "client": "Browser", "period": 5},
+            {"at": 100, "service": "DB", "autoscaling": [2, 8]},
+            {"at": 200, "client": "Browser", "query": "DB/Select", "timeout": 50}
+        ]"""))
+
+        [(_, first), (_, second), (_, third)] = reconfiguration.changes
+        self.assertEqual((AutoscalingLimits, (2, 8)), (type(first), tuple(first.value)))
+        self.assertEqual((QueryTimeout, 50, "DB/Select"), (type(second), second.value, second.query))
+        self.assertEqual((ClientPeriod, 5), (type(third), third.value))
+
+    def test_rejecting_invalid_json(self):
+        with self.assertRaises(InvalidReconfiguration):
+            Reconfiguration.load(StringIO("[{\"at\": 10,"))
@@ -20,7 +20,8 @@
 from unittest import TestCase
 from mock import MagicMock, PropertyMock
 
-from mad.simulation.requests import Query
+from mad.simulation.client import ClientRequest, ClientStub
+from mad.simulation.requests import Query, Trigger
 from mad.simulation.tasks import Task
 
 
@@ -60,3 +61,29 @@ class RequestTests(TestCase):
         with self.assertRaises(AssertionError):
             request.response_time
 
+    def test_tracing_decision_follows_downstream_requests(self):
+        for decision in [True, False]:
+            client_task = Task(MagicMock(), ClientRequest(is_traced=decision))
+            query = Query(client_task, "Select", 1, lambda s: None)
+            trigger = Trigger(Task(MagicMock(), query), "Insert", 1, lambda s: None)
+
+            self.assertEqual(decision, query.is_traced)
+            self.assertEqual(decision, trigger.is_traced)
+
+
+class SamplingTests(TestCase):
+
+    def setUp(self):
+        self.client = MagicMock(ClientStub)
+
+    def test_all_requests_are_traced_by_default(self):
+        self.client.sampling = 1.0
+        self.assertTrue(ClientStub._sample(self.client))
+        self.client.random_stream.assert_not_called()
+
+    def test_sampling(self):
+        self.client.sampling = 0.25
+        self.client.random_stream.return_value.random.side_effect = [0.1, 0.6]
+        self.assertTrue(ClientStub._sample(self.client))
+        self.assertFalse(ClientStub._sample(self.client))
+        self.client.random_stream.assert_called_with("sampling")
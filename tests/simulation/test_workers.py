@@ -19,8 +19,14 @@
 
 
 from unittest import TestCase
+from mock import MagicMock, call
 
-from mad.simulation.workers import WorkerPool
+from tests.fakes import InMemoryDataStorage
+
+from mad.evaluation import Symbols
+from mad.simulation.events import Dispatcher, Listener
+from mad.simulation.factory import Simulation
+from mad.simulation.workers import WorkerPool, WorkerPoolWrapper, Worker, WorkerStatus
 
 
 class WorkerPoolTests(TestCase):
@@ -104,6 +110,53 @@ class WorkerPoolTests(TestCase):
         self.assertEqual(4, pool.capacity)
 
 
+class WorkerPoolWrapperTests(TestCase):
+
+    def setUp(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        self.environment = simulation.environment.create_local_environment()
+        self.environment.define(Symbols.LISTENER, Dispatcher())
+        self.listener = MagicMock(Listener)
+        self.environment.look_up(Symbols.LISTENER).register(self.listener)
+        workers = [Worker(identifier, self.environment) for identifier in range(2)]
+        self.pool = WorkerPoolWrapper(self.environment, WorkerPool(workers))
+
+    def test_notifies_busy_and_idle_workers(self):
+        worker = self.pool.acquire_one()
+        self.assertEqual(WorkerStatus.BUSY, worker.status)
+        self.pool.release(worker)
+        self.assertEqual(WorkerStatus.IDLE, worker.status)
+
+        self.assertEqual([call.worker_busy(worker), call.worker_idle(worker)], self.listener.method_calls)
+
+    def test_notifies_new_workers(self):
+        self.pool.set_capacity(3)
+
+        self.assertEqual(3, self.pool.capacity)
+        self.assertEqual(["worker_created", "worker_idle"], [name for (name, _, _) in self.listener.method_calls])
+
+    def test_notifies_shutdown_of_idle_workers(self):
+        busy_worker = self.pool.acquire_one()
+        idle_worker = self.pool.idle_workers[0]
+        self.pool.shutdown(1)
+
+        self.assertEqual([call.worker_busy(busy_worker), call.worker_shutdown(idle_worker)], self.listener.method_calls)
+
+    def test_notifies_shutdown_of_busy_workers_when_stopped(self):
+        (first, second) = (self.pool.acquire_one(), self.pool.acquire_one())
+        self.pool.shutdown(1)
+        self.pool.release(first)
+
+        expected_calls = [
+            call.worker_busy(first),
+            call.worker_busy(second),
+            call.worker_shutdown(first)
+        ]
+        self.assertEqual(expected_calls, self.listener.method_calls)
+        self.assertEqual(WorkerStatus.STOPPED, first.status)
+        self.assertEqual(1, self.pool.capacity)
+
+
 if __name__ == "__main__":
     import unittest.main
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from unittest import TestCase
+from io import StringIO
+
+from tests.fakes import InMemoryFileSystem
+
+from mad.analysis import ServiceSummary, OperationSummary, RunAnalysis, ReplicationSummary, StoppingRule, analyse
+from mad.statistics import QuantileSketch
+from mad.ui import Controller, Arguments
+
+
+class ServiceSummaryTests(TestCase):
+
+    def test_latest_period_gives_running_values(self):
+        summary = ServiceSummary()
+        summary.add_period(10, {"throughput": 1, "arrival rate": 0.1, "reliability": 1, "response time": 5})
+        summary.add_period(20, {"throughput": 3, "arrival rate": 0.4, "reliability": 0.75, "response time": 6})
+
+        metrics = dict(summary.metrics())
+
+        self.assertAlmostEqual(3 / 20, metrics["throughput"])
+        self.assertAlmostEqual(4 / 20, metrics["arrival rate"])
+        self.assertEqual(0.75, metrics["reliability"])
+        self.assertEqual(6, metrics["response time"])
+        self.assertNotIn("time above SLO", metrics)
+
+    def test_time_above_slo(self):
+        summary = ServiceSummary(slo=5)
+        for (end, tail) in [(10, 4), (20, 6), (30, None), (40, 8)]:
+            summary.add_period(end, {"response time p95": tail})
+
+        metrics = dict(summary.metrics())
+
+        self.assertEqual(20, metrics["time above SLO"])
+        self.assertEqual(0.5, metrics["fraction above SLO"])
+        self.assertEqual(8, metrics["response time p95"])
+
+    def test_maximum_over_all_periods(self):
+        summary = ServiceSummary()
+        for (end, maximum) in [(10, 4), (20, 12), (30, None), (40, 8)]:
+            summary.add_period(end, {"response time max": maximum})
+
+        self.assertEqual(12, dict(summary.metrics())["response time max"])
+
+    def test_windows_of_varying_length(self):
+        summary = ServiceSummary(slo=5)
+        summary.add_period(10, {"window start": 0, "response time p95": 4})
+        summary.add_period(15, {"window start": 10, "response time p95": 6})
+        summary.add_period(55, {"window start": 15, "response time p95": 7, "arrival rate": 0.5})
+
+        metrics = dict(summary.metrics())
+
+        self.assertEqual(45, metrics["time above SLO"])
+        self.assertAlmostEqual(40 * 0.5 / 55, metrics["arrival rate"])
+
+
+class OperationSummaryTests(TestCase):
+
+    def test_outcomes(self):
+        summary = OperationSummary(slo=5)
+        for _ in range(5):
+            summary.sent()
+        summary.succeeded(4)
+        summary.succeeded(6)
+        summary.rejected()
+        summary.failed()
+        summary.timed_out()
+
+        metrics = dict(summary.metrics(duration=100))
+
+        self.assertEqual(5, metrics["requests"])
+        self.assertEqual(0.02, metrics["throughput"])
+        self.assertEqual(0.4, metrics["reliability"])
+        self.assertEqual(0.2, metrics["rejection rate"])
+        self.assertEqual(5, metrics["response time"])
+        self.assertEqual(6, metrics["response time max"])
+        self.assertEqual(0.5, metrics["fraction above SLO"])
+
+    def test_no_request(self):
+        metrics = dict(OperationSummary().metrics(duration=0))
+
+        self.assertEqual(0, metrics["requests"])
+        self.assertIsNone(metrics["throughput"])
+        self.assertIsNone(metrics["response time"])
+
+
+class RunAnalysisTests(TestCase):
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+
+    def test_reading_metrics_and_trace(self):
+        self.file_system.define(
+            "out/metrics.csv",
+            "time, entity, metric, value\n"
+            "10, DB, throughput, 1\n"
+            "10, DB, response time p95, 7\n"
+            "20, DB, throughput, 2\n"
+            "20, DB, response time p95, NA\n")
+        self.file_system.define(
+            "out/trace.log",
+            "    2 Browser              Req. 1 sent to DB::Select\n"
+            "    9 Browser              Req. 1 successful\n"
+            "   12 Browser              Req. 2 sent to DB::Select\n"
+            "   14 Browser              Req. 2 rejected!\n"
+            "   18 Browser              Req. 3 sent to DB::Select\n")
+
+        rows = RunAnalysis(self.file_system, "out", slo=5).rows()
+
+        values = {(entity, operation, metric): value for (_, entity, operation, metric, value) in rows}
+        self.assertEqual(0.1, values[("DB", "*", "throughput")])
+        self.assertEqual(10, values[("DB", "*", "time above SLO")])
+        self.assertEqual(3, values[("DB", "Select", "requests")])
+        self.assertEqual(7, values[("DB", "Select", "response time")])
+        self.assertEqual(0.5, values[("DB", "Select", "reliability")])
+        self.assertEqual(1, values[("DB", "Select", "fraction above SLO")])
+
+    def test_missing_outputs(self):
+        self.assertEqual([], analyse(self.file_system, ["nowhere"]))
+
+
+class ReplicationSummaryTests(TestCase):
+
+    def test_mean_and_confidence_interval(self):
+        summary = ReplicationSummary()
+        for each_value in [10, 12, 14]:
+            summary.add([("run", "DB", "*", "throughput", each_value)])
+
+        [(entity, _, metric, count, mean, deviation, lower, upper)] = list(summary.rows())
+
+        self.assertEqual(("DB", "throughput", 3, 12), (entity, metric, count, mean))
+        self.assertAlmostEqual(2, deviation)
+        self.assertAlmostEqual(12 - 4.302653 * 2 / 3 ** 0.5, lower, places=4)
+        self.assertAlmostEqual(12 + 4.302653 * 2 / 3 ** 0.5, upper, places=4)
+
+    def test_missing_values_are_ignored(self):
+        summary = ReplicationSummary()
+        summary.add([("run", "DB", "*", "response time", None)])
+        summary.add([("run", "DB", "*", "response time", 5)])
+
+        [(_, _, _, count, mean, _, lower, upper)] = list(summary.rows())
+
+        self.assertEqual((1, 5, None, None), (count, mean, lower, upper))
+
+    def test_antithetic_pairs_count_once(self):
+        summary = ReplicationSummary(antithetic=True)
+        for each_value in [10, 14, 11, 13, 12]:
+            summary.add([("run", "DB", "*", "throughput", each_value)])
+
+        [(_, _, _, count, mean, deviation, _, _)] = list(summary.rows())
+
+        self.assertEqual((2, 12, 0), (count, mean, deviation))
+
+    def test_sketches_are_merged_across_replications(self):
+        summary = ReplicationSummary()
+        for each_values in [range(1, 51), range(51, 101)]:
+            sketch = QuantileSketch()
+            for each_value in each_values:
+                sketch.add(each_value)
+            summary.add([("run", "DB", "*", "response time", sum(each_values) / 50)], {"DB": sketch})
+
+        rows = {metric: (count, mean) for (_, _, metric, count, mean, _, _, _) in summary.rows()}
+
+        self.assertEqual(2, rows["pooled response time p99"][0])
+        self.assertAlmostEqual(99, rows["pooled response time p99"][1], delta=2)
+        self.assertAlmostEqual(50, summary.pooled_quantile("DB", 0.5), delta=1)
+        self.assertIsNone(summary.pooled_quantile("Browser", 0.5))
+
+    def test_differences_pair_replications_by_rank(self):
+        (baseline, summary) = (ReplicationSummary(), ReplicationSummary())
+        for (reference, value) in [(10, 12), (20, 21), (30, 33)]:
+            baseline.add([("run", "DB", "*", "response time", reference)])
+            summary.add([("run", "DB", "*", "response time", value)])
+
+        [(entity, _, metric, count, mean, lower, upper)] = list(summary.differences_from(baseline))
+
+        self.assertEqual(("DB", "response time", 3, 2), (entity, metric, count, mean))
+        self.assertAlmostEqual(2 - 4.302653 / 3 ** 0.5, lower, places=4)
+        self.assertAlmostEqual(2 + 4.302653 / 3 ** 0.5, upper, places=4)
+
+
+class StoppingRuleTests(TestCase):
+
+    def setUp(self):
+        self.rule = StoppingRule([("DB", "response time")], 0.05, 40)
+        self.summary = ReplicationSummary()
+
+    def _replicate(self, *values):
+        for each_value in values:
+            self.summary.add([("run", "DB", "*", "response time", each_value)])
+
+    def test_starts_with_a_few_replications(self):
+        self.assertEqual(StoppingRule.MINIMUM_REPLICATIONS, self.rule.next_count(self.summary, 0))
+
+    def test_stops_once_precise_enough(self):
+        self._replicate(100, 101, 99, 100, 100)
+
+        self.assertTrue(self.rule.is_met(self.summary))
+        self.assertEqual(0, self.rule.next_count(self.summary, 5))
+
+    def test_estimates_the_replications_still_needed(self):
+        self._replicate(100, 106, 94, 103, 97)
+
+        width = self.rule.relative_half_width(self.summary, "DB", "response time")
+        self.assertAlmostEqual(2.776445 * 22.5 ** 0.5 / 5 ** 0.5 / 100, width, places=5)
+        self.assertEqual(2, self.rule.next_count(self.summary, 5))
+
+    def test_at_most_doubles_the_replications(self):
+        self._replicate(10, 100, 50, 5, 80)
+
+        self.assertEqual(5, self.rule.next_count(self.summary, 5))
+
+    def test_stops_when_the_budget_is_exhausted(self):
+        self._replicate(10, 100, 50, 5, 80)
+
+        self.assertEqual(2, self.rule.next_count(self.summary, 38))
+        self.assertEqual(0, self.rule.next_count(self.summary, 40))
+
+    def test_unknown_targets_are_never_met(self):
+        rule = StoppingRule([("DB", "latency")], 0.05, 40)
+        self._replicate(100, 100, 100)
+
+        self.assertFalse(rule.is_met(self.summary))
+        self.assertEqual((("DB", "latency"), None), rule.widest(self.summary))
+
+
+class ReplicationCommandTests(TestCase):
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "      fail 0.5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 5 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Arguments._identifier = lambda s: "replicated"
+
+    def test_replications_are_summarised(self):
+        Controller(StringIO(), self.file_system).execute("test.mad", "200", "--replications=3", "--seed=5")
+
+        for index in range(1, 4):
+            self.assertTrue(self.file_system.exists("test_replicated/replication-00{:d}/metrics.csv".format(index)))
+        replications = self.file_system.open_input_stream("test_replicated/replications.csv").read().splitlines()
+        self.assertEqual("replication, seed, entity, metric, value", replications[0])
+        self.assertIn("3, 7, DB, arrival rate, 0.195", replications)
+        summary = self.file_system.open_input_stream("test_replicated/summary.csv").read().splitlines()
+        self.assertEqual("entity, metric, replications, mean, std dev, ci lower, ci upper", summary[0])
+        self.assertIn("DB, arrival rate, 3, 0.195, 0, 0.195, 0.195", summary)
+        self.assertTrue(any(each.startswith("DB, pooled response time p95, 3, ") for each in summary))
+
+    def test_replications_are_reproducible(self):
+        Controller(StringIO(), self.file_system).execute("test.mad", "200", "--replications=3", "--seed=5")
+        first = self.file_system.open_input_stream("test_replicated/replications.csv").read()
+        self.file_system = InMemoryFileSystem()
+        self.setUp()
+        Controller(StringIO(), self.file_system).execute("test.mad", "200", "--replications=3", "--seed=5")
+        second = self.file_system.open_input_stream("test_replicated/replications.csv").read()
+
+        self.assertEqual(first, second)
+        reliabilities = [each for each in first.splitlines() if "DB, reliability" in each]
+        self.assertGreater(len(set(each.split(", ")[-1] for each in reliabilities)), 1)
+
+
+    def test_replicating_until_targets_are_met(self):
+        output = StringIO()
+        Controller(output, self.file_system).execute("test.mad", "200", "--targets=DB:reliability",
+                                                     "--precision=0.2", "--seed=5")
+
+        self.assertIn("Targets met after", output.getvalue())
+        summary = self.file_system.open_input_stream("test_replicated/summary.csv").read().splitlines()
+        [(_, _, count, mean, _, lower, upper)] = [each.split(", ") for each in summary if each.startswith("DB, reliability")]
+        self.assertLessEqual((float(upper) - float(lower)) / 2, 0.2 * float(mean))
+        self.assertTrue(self.file_system.exists("test_replicated/replication-{:03d}/metrics.csv".format(int(count))))
+
+    def test_reporting_exhausted_budgets(self):
+        output = StringIO()
+        Controller(output, self.file_system).execute("test.mad", "200", "--targets=DB:reliability",
+                                                     "--precision=0.001", "--replications=6", "--seed=5")
+
+        self.assertIn("Budget exhausted after 6 replications ('DB:reliability' within", output.getvalue())
+
+    def test_antithetic_replications(self):
+        Controller(StringIO(), self.file_system).execute("test.mad", "200", "--replications=3", "--antithetic", "--seed=5")
+
+        replications = self.file_system.open_input_stream("test_replicated/replications.csv").read().splitlines()
+        seeds = sorted({tuple(each.split(", ")[:2]) for each in replications[1:]})
+        self.assertEqual([("1", "5"), ("2", "5"), ("3", "6"), ("4", "6")], seeds)
+        summary = self.file_system.open_input_stream("test_replicated/summary.csv").read().splitlines()
+        self.assertIn("DB, arrival rate, 2, 0.195, 0, 0.195, 0.195", summary)
+
+
+class AnalyseCommandTests(TestCase):
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+
+    def test_analysing_text_and_binary_runs(self):
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Arguments._identifier = lambda s: "text"
+        Controller(StringIO(), self.file_system).execute("test.mad", "50")
+        Arguments._identifier = lambda s: "binary"
+        Controller(StringIO(), self.file_system).execute("test.mad", "50", "--trace-format=binary")
+
+        output = StringIO()
+        Controller(output, self.file_system).execute("analyse", "test_text", "test_binary", "--slo=6")
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual("run, entity, operation, metric, value", lines[0])
+        self.assertIn("test_text, DB, Select, requests, 4", lines)
+        self.assertIn("test_binary, DB, Select, requests, 4", lines)
+        self.assertIn("test_text, DB, *, time above SLO, 40", lines)
+
+    def test_analysing_compressed_runs(self):
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Arguments._identifier = lambda s: "gz"
+        Controller(StringIO(), self.file_system).execute("test.mad", "50", "--compress=gzip")
+        self.assertTrue(self.file_system.has_file("test_gz/trace.log.gz"))
+        self.assertTrue(self.file_system.has_file("test_gz/metrics.csv.gz"))
+
+        output = StringIO()
+        Controller(output, self.file_system).execute("analyse", "test_gz")
+
+        self.assertIn("test_gz, DB, Select, requests, 4", output.getvalue().splitlines())
+        self.assertIn("test_gz, DB, *, throughput, 0.08", output.getvalue().splitlines())
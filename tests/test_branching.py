@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from unittest import TestCase, skipUnless
+from io import StringIO
+from os import chdir, getcwd
+from os.path import join
+from tempfile import TemporaryDirectory
+import os
+
+from mock import patch
+
+from tests.fakes import InMemoryFileSystem
+
+from mad.branching import Branching
+from mad.simulation.reconfiguration import InvalidReconfiguration, WorkerCount
+from mad.storage import FileSystem
+from mad.ui import Controller, Arguments
+
+
+MODEL = "service DB {" \
+        "  operation Select {" \
+        "      think 8" \
+        "   }" \
+        "}" \
+        "client Browser {" \
+        "  every 5 {" \
+        "      query DB/Select" \
+        "   }" \
+        "}"
+
+BRANCHES = '{"at": 200, "branches": {"baseline": [], "scale": [{"service": "DB", "workers": 3}]}}'
+
+
+class BranchingTests(TestCase):
+
+    def test_loading_branches(self):
+        branching = Branching.load(StringIO(BRANCHES))
+
+        self.assertEqual(200, branching.time)
+        [(first, baseline), (second, scale)] = branching.branches
+        self.assertEqual(("baseline", "scale"), (first, second))
+        self.assertEqual([], baseline.changes)
+        [(time, change)] = scale.changes
+        self.assertEqual((200, 3), (time, change.value))
+        self.assertIsInstance(change, WorkerCount)
+
+    def test_rejecting_invalid_branches(self):
+        for each_text in ['not JSON',
+                          '{"at": 200}',
+                          '{"branches": {"scale": []}}',
+                          '{"at": 200, "branches": {}}',
+                          '{"at": 200, "branches": {"../scale": []}}',
+                          '{"at": 200, "branches": {"scale": [{"at": 100, "service": "DB", "workers": 3}]}}']:
+            with self.assertRaises(InvalidReconfiguration):
+                Branching.load(StringIO(each_text))
+
+
+class BranchCommandTests(TestCase):
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+        self.file_system.define("test.mad", MODEL)
+        Arguments._identifier = lambda s: "branched"
+
+    def _metric(self, directory, time, metric):
+        rows = self.file_system.open_input_stream(directory + "/metrics.csv").read().splitlines()
+        [value] = [each.split(", ")[-1] for each in rows if each.startswith("{:d}, DB, {:s},".format(time, metric))]
+        return value
+
+    def test_replaying_the_prefix(self):
+        self.file_system.define("branches.json", BRANCHES)
+        output = StringIO()
+
+        with patch.object(Controller, "_can_fork", return_value=False):
+            Controller(output, self.file_system).execute("test.mad", "400", "--branches=branches.json")
+
+        self.assertIn("Branch 2 / 2 complete", output.getvalue())
+        self.assertEqual("1", self._metric("test_branched", 200, "worker count"))
+        self.assertEqual("1", self._metric("test_branched/branch-baseline", 400, "worker count"))
+        self.assertEqual("3", self._metric("test_branched/branch-scale", 400, "worker count"))
+        self.assertEqual(self._metric("test_branched", 200, "queue"),
+                         self._metric("test_branched/branch-scale", 200, "queue"))
+
+    def test_reporting_invalid_branches(self):
+        self.file_system.define("branches.json", '{"at": 200, "branches": {"scale": [{"service": "Cache", "workers": 3}]}}')
+        output = StringIO()
+
+        Controller(output, self.file_system).execute("test.mad", "400", "--branches=branches.json")
+
+        self.assertIn("Error, the reconfiguration is invalid: No service named 'Cache'", output.getvalue())
+
+    def test_branching_after_the_end(self):
+        self.file_system.define("branches.json", BRANCHES)
+        output = StringIO()
+
+        Controller(output, self.file_system).execute("test.mad", "100", "--branches=branches.json")
+
+        self.assertIn("Error, the reconfiguration is invalid: Branching at time 200", output.getvalue())
+
+
+@skipUnless(hasattr(os, "fork"), "Processes cannot fork on this platform")
+class ForkedBranchTests(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.working_directory = getcwd()
+        chdir(self.directory.name)
+        for (name, content) in [("test.mad", MODEL), ("branches.json", BRANCHES)]:
+            with open(name, "w") as output:
+                output.write(content)
+        Arguments._identifier = lambda s: "branched"
+
+    def tearDown(self):
+        chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def _read(self, location):
+        with open(join(self.directory.name, location)) as source:
+            return source.read()
+
+    def test_forked_branches_match_replayed_ones(self):
+        Controller(StringIO(), FileSystem()).execute("test.mad", "400", "--branches=branches.json", "--seed=3", "--jobs=2")
+        forked = self._read("test_branched/branch-scale/metrics.csv")
+
+        with patch.object(Controller, "_can_fork", return_value=False):
+            Controller(StringIO(), FileSystem()).execute("test.mad", "400", "--branches=branches.json", "--seed=3")
+        replayed = self._read("test_branched/branch-scale/metrics.csv")
+
+        self.assertIn("400, DB, worker count, 3", forked.splitlines())
+        self.assertEqual(replayed, forked)
@@ -26,6 +26,7 @@ from mad.environment import Environment
 from mad.ast.commons import Sequence
 from mad.ast.actions import *
 from mad.ast.settings import *
+from mad.ast.definitions import DefineService, DefineOperation, DefineClientStub
 
 from mad.evaluation import Evaluation, Symbols, Success
 from mad.simulation.factory import Simulation, Factory
@@ -94,5 +95,42 @@ class EvaluationTest(TestCase):
         self.assertEqual(PERIOD, autoscaler.period)
         self.assertEqual((3, 5), autoscaler.limits)
 
+    def test_evaluation_of_tracing_settings(self):
+        tracing = Tracing(Tracing.REQUESTS)
 
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(Settings(tracing=tracing))
+
+        self.assertIs(tracing, simulation.environment.look_up(Symbols.TRACING))
+
+    def test_services_are_traced_by_default(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(DefineService("DB", DefineOperation("Select", Think(4))))
+
+        service = simulation.environment.look_up("DB")
+        self.assertIsNotNone(service.environment.look_up(Symbols.LOGGER))
+
+    def test_no_logger_when_tracing_is_off(self):
+        simulation = Simulation(InMemoryDataStorage(None))
+        simulation.evaluate(
+            DefineService("DB", Sequence(Settings(tracing=Tracing(Tracing.OFF)), DefineOperation("Select", Think(4)))))
+
+        service = simulation.environment.look_up("DB")
+        self.assertIsNone(service.environment.look_up(Symbols.LOGGER))
+
+    def test_command_line_tracing_prevails_over_the_model(self):
+        simulation = Simulation(InMemoryDataStorage(None), {"level": Tracing.OFF})
+        simulation.evaluate(
+            DefineService("DB", Sequence(Settings(tracing=Tracing(Tracing.ALL)), DefineOperation("Select", Think(4)))))
+
+        service = simulation.environment.look_up("DB")
+        self.assertIsNone(service.environment.look_up(Symbols.LOGGER))
+
+    def test_command_line_only_overrides_the_given_tracing_settings(self):
+        simulation = Simulation(InMemoryDataStorage(None), {"sampling": 0.5})
+        simulation.evaluate(Sequence(
+            DefineService("DB", Sequence(Settings(tracing=Tracing(Tracing.OFF)), DefineOperation("Select", Think(4)))),
+            DefineClientStub("Browser", 10, Query("DB", "Select"))))
 
+        self.assertIsNone(simulation.environment.look_up("DB").environment.look_up(Symbols.LOGGER))
+        self.assertEqual(0.5, simulation.environment.look_up("Browser").sampling)
@@ -18,11 +18,12 @@
 #
 
 
-from io import StringIO
+from io import StringIO, BytesIO
 from unittest import TestCase
 
-from mad.log import FileLog
-from tests.fakes import InMemoryLog
+from mad.log import FileLog, BinaryLog, BinaryTrace, EventCode, TraceIndex, TraceQuery
+from mad.storage import BackgroundWriter, CompressedView
+from tests.fakes import InMemoryLog, InMemoryBinaryStream
 
 
 class LogTests(TestCase):
@@ -41,6 +42,10 @@ class LogTests(TestCase):
         self.log.record(10, "X", "something else")
         self.assertEqual(self.log.size, 2)
 
+    def test_trace_is_rendered_as_text(self):
+        self.log.trace(5, "S1", EventCode.REQUEST_SENT, request=3, service="DB", operation="Select")
+        self.assertEqual("Req. 3 sent to DB::Select", self.log.entries[0].message)
+
 
 class FileLogTests(TestCase):
 
@@ -52,4 +57,168 @@ class FileLogTests(TestCase):
 
         log.record(*event)
 
-        self.assertEqual(output.getvalue(), format % event)
\ No newline at end of file
+        self.assertEqual(output.getvalue(), format % event)
+
+
+class TraceIndexTests(TestCase):
+
+    FORMAT = "%5d %-20s %-s\n"
+
+    def setUp(self):
+        self.output = StringIO()
+        self.index = TraceIndex(bucket_size=10)
+        self.log = FileLog(self.output, self.FORMAT, self.index)
+        events = [(1, "Browser", EventCode.REQUEST_SENT, 1),
+                  (2, "DB", EventCode.TASK_RECEIVED, 1),
+                  (7, "DB", EventCode.SUCCESS_REPLIED, 1),
+                  (15, "Browser", EventCode.REQUEST_SENT, 2),
+                  (34, "DB", EventCode.TASK_RECEIVED, 2),
+                  (38, "DB", EventCode.SUCCESS_REPLIED, 2)]
+        for (time, entity, code, request) in events:
+            self.log.trace(time, entity, code, request=request, service="DB", operation="Select")
+        self.lines = self.output.getvalue().splitlines(keepends=True)
+
+    def _query(self):
+        return TraceQuery(self.output.getvalue().encode("utf-8"), self.index)
+
+    def test_indexing_requests(self):
+        first, second = len(self.lines[0]), len(self.lines[1])
+        self.assertEqual((0, first + second), self.index.span_of(1))
+
+    def test_indexing_entities(self):
+        self.assertEqual([0, 1], self.index.buckets_of("Browser"))
+        self.assertEqual([0, 3], self.index.buckets_of("DB"))
+
+    def test_empty_buckets_point_to_the_next_event(self):
+        self.assertEqual(self.index.buckets[2], self.index.buckets[3])
+
+    def test_querying_a_compressed_trace(self):
+        trace = CompressedView(BytesIO(self.output.getvalue().encode("utf-8")), chunk_size=8)
+        query = TraceQuery(trace, self.index)
+
+        self.assertEqual(self.lines[3:], query.history_of(2))
+        self.assertEqual(self.lines[4:], query.between(30, float("inf"), "DB"))
+
+    def test_compressed_traces_are_read_in_a_single_pass(self):
+        class Source(BytesIO):
+            rewinds = 0
+
+            def seek(self, offset, whence=0):
+                if whence == 0 and offset < self.tell():
+                    Source.rewinds += 1
+                return super().seek(offset, whence)
+
+        for each_query in [lambda query: query.history_of(2),
+                           lambda query: query.between(0, 40),
+                           lambda query: query.between(0, float("inf"), "DB")]:
+            Source.rewinds = 0
+            trace = CompressedView(Source(self.output.getvalue().encode("utf-8")), chunk_size=8)
+            each_query(TraceQuery(trace, self.index))
+            self.assertEqual(0, Source.rewinds)
+
+    def test_history_of_a_request(self):
+        self.assertEqual(self.lines[3:], self._query().history_of(2))
+
+    def test_history_skips_events_of_other_requests(self):
+        self.log.trace(40, "DB", EventCode.TASK_RECEIVED, request=3, service="DB", operation="Select")
+        self.log.trace(41, "DB", EventCode.SUCCESS_REPLIED, request=2, service="DB", operation="Select")
+        lines = self.output.getvalue().splitlines(keepends=True)
+
+        self.assertEqual(lines[3:6] + lines[7:], self._query().history_of(2))
+
+    def test_index_does_not_grow_with_the_events_of_a_request(self):
+        for _ in range(1000):
+            self.log.trace(39, "DB", EventCode.TASK_ACTIVATED, request=2)
+        stream = StringIO()
+        self.index.save(stream)
+
+        self.assertLess(len(stream.getvalue()), 200)
+
+    def test_time_window(self):
+        self.assertEqual(self.lines[1:4], self._query().between(2, 15))
+
+    def test_time_window_of_an_entity(self):
+        self.assertEqual([self.lines[1], self.lines[2], self.lines[4]], self._query().between(2, 34, "DB"))
+
+    def test_open_ended_time_window(self):
+        self.assertEqual(self.lines[3:], self._query().between(15, float("inf")))
+
+    def test_open_ended_time_window_of_an_entity(self):
+        self.assertEqual(self.lines[4:], self._query().between(15, float("inf"), "DB"))
+
+    def test_save_and_load(self):
+        stream = StringIO()
+        self.index.save(stream)
+        stream.seek(0)
+
+        loaded = TraceIndex.load(stream)
+
+        self.assertEqual(self.index.requests, loaded.requests)
+        self.assertEqual(self.index.entities, loaded.entities)
+        self.assertEqual(self.index.buckets, loaded.buckets)
+
+
+class BinaryLogTests(TestCase):
+
+    def setUp(self):
+        self.output = InMemoryBinaryStream()
+        self.log = BinaryLog(BackgroundWriter(self.output), chunk_size=32)
+
+    def test_decoding(self):
+        self.log.trace(5, "DB", EventCode.TASK_RECEIVED, request=1)
+        self.log.trace(7, "DB", EventCode.TASK_ASSIGNED, request=1, worker=2)
+        self.log.trace(8, "Browser", EventCode.REQUEST_SENT, request=4, service="DB", operation="Select")
+        self.log.record(9, "Browser", "something else")
+        self.log.close()
+
+        self.output.seek(0)
+        events = [(e.time, e.context, e.message) for e in BinaryTrace(self.output)]
+
+        self.assertEqual([(5, "DB", "Task 1 received"),
+                          (7, "DB", "Task 1 assigned to Worker 2"),
+                          (8, "Browser", "Req. 4 sent to DB::Select"),
+                          (9, "Browser", "something else")], events)
+
+    def test_names_are_defined_once(self):
+        for time in range(10):
+            self.log.trace(time, "DB", EventCode.REQUEST_SUCCESS, request=time)
+        self.log.close()
+
+        name = BinaryLog.NAME.size + len("DB")
+        self.assertEqual(name + 10 * BinaryLog.RECORD.size, len(self.output.getvalue()))
+
+    def test_decoding_into_a_text_log(self):
+        self.log.trace(5, "DB", EventCode.TASK_PAUSED, request=1)
+        self.log.close()
+        self.output.seek(0)
+
+        text = StringIO()
+        BinaryTrace(self.output).decode(FileLog(text, "%5d %-20s %-s\n"))
+
+        self.assertEqual("    5 DB                   Task 1 paused\n", text.getvalue())
+
+    def test_detecting_truncated_traces(self):
+        self.log.trace(5, "DB", EventCode.TASK_PAUSED, request=1)
+        self.log.close()
+
+        with self.assertRaises(ValueError):
+            list(BinaryTrace(BytesIO(self.output.getvalue()[:-3])))
+
+
+class BackgroundWriterTests(TestCase):
+
+    def test_writing_chunks(self):
+        output = InMemoryBinaryStream()
+        writer = BackgroundWriter(output, capacity=2)
+        for each_chunk in [b"abc", b"def", b"ghi"]:
+            writer.write(each_chunk)
+        writer.close()
+        self.assertEqual(b"abcdefghi", output.getvalue())
+
+    def test_reporting_errors_on_close(self):
+        output = InMemoryBinaryStream()
+        output.write = None
+        writer = BackgroundWriter(output)
+        writer.write(b"abc")
+        with self.assertRaises(TypeError):
+            writer.close()
@@ -75,6 +75,33 @@ class TestXXX(TestCase):
         worker_pool = server.environment.look_up(Symbols.WORKER_POOL)
         self.assertEqual(5, worker_pool.capacity)
 
+    def test_reconfiguration_timeline(self):
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "   operation Select {"
+            "      think 9"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "  }"
+            "}")
+        self.file_system.define(
+            "timeline.json",
+            '[{"at": 50, "service": "DB", "autoscaling": [2, 4]},'
+            ' {"at": 100, "client": "Browser", "period": 2},'
+            ' {"at": 100, "client": "Browser", "query": "DB/Select", "timeout": 30}]')
+
+        controller = Controller(StringIO(), self.file_system)
+        simulation = controller.execute("test.mad", "200", "--reconfiguration=timeline.json")
+
+        server = simulation.environment.look_up("DB")
+        self.assertEqual((2, 4), server.look_up(Symbols.AUTOSCALING).limits)
+        self.assertEqual(2, simulation.environment.look_up("Browser").period)
+        self.assertGreater(server.look_up(Symbols.WORKER_POOL).capacity, 1)
+
 
 class TestMain(TestCase):
 
@@ -21,9 +21,11 @@ from unittest import TestCase
 from mock import MagicMock
 from tests.fakes import InMemoryFileSystem
 
-from io import StringIO
+from io import StringIO, BytesIO
+from zipfile import ZipFile
 
-from mad.monitoring import CSVReport
+from mad.monitoring import CSVReport, LongFormatReport, Column, ColumnarReport, RoundRobinReport, MetricStore, NPYFormat
+from mad.simulation.monitoring import Probe
 from mad.ui import Controller, Arguments
 
 
@@ -57,6 +59,256 @@ class MonitoringTests(TestCase):
         data = self.file_system.opened_files["test_1/DB.log"].getvalue().split("\n")
         self.assertEqual(4, len(data), data) # header line, + Monitoring at 10, 20 + newline
 
+        archive = ZipFile(self.file_system.opened_files["test_1/metrics.npz"])
+        self.assertIn("DB/time.npy", archive.namelist())
+        self.assertIn("Browser/time.npy", archive.namelist())
+
+        consolidated = self.file_system.opened_files["test_1/metrics.csv"].getvalue().split("\n")
+        self.assertEqual("time, entity, metric, value", consolidated[0])
+        self.assertIn("10, DB, queue, 0", consolidated)
+
+    def test_output_size_is_bounded_with_a_rollup(self):
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 50 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+
+        sizes = []
+        for each_length in ("15000", "30000"):
+            Arguments._identifier = lambda s: each_length
+            Controller(StringIO(), self.file_system).execute("test.mad", each_length, "--rollup=10", "--trace=off")
+            directory = "test_{:s}/".format(each_length)
+            sizes.append([len(self.file_system.opened_files[directory + each_file].getvalue().splitlines())
+                          for each_file in ("metrics.csv", "DB.log", "Browser.log")]
+                         + [len(self.file_system.opened_files[directory + "metrics.npz"].getvalue())])
+
+        self.assertEqual(sizes[0], sizes[1])
+
+    def test_batch_means(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+
+        Controller(StringIO(), self.file_system).execute("test.mad", "500", "--batch-means", "--warm-up=100")
+
+        rows = self.file_system.opened_files["test_1/batch-means.csv"].getvalue().splitlines()
+        self.assertEqual("entity, metric, warm up, periods, batches, batch size, correlation, mean, ci lower, ci upper", rows[0])
+        self.assertIn("DB, throughput, 100, 40, 40, 1, 0, 0.1, 0.1, 0.1", rows)
+        self.assertIn("DB, response time, 100, 40, 40, 1, 0, 7, 7, 7", rows)
+
+    def test_until_steady(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        output = StringIO()
+
+        Controller(output, self.file_system).execute("test.mad", "100000", "--until-steady")
+
+        self.assertIn("Steady state reached at time", output.getvalue())
+        rows = self.file_system.opened_files["test_1/batch-means.csv"].getvalue().splitlines()
+        (response_time,) = [each for each in rows if each.startswith("DB, response time")]
+        self.assertTrue(response_time.endswith("7, 7, 7"), response_time)
+        metrics = self.file_system.opened_files["test_1/metrics.csv"].getvalue().splitlines()
+        self.assertLess(int(metrics[-1].split(",")[0]), 100000)
+
+    def test_loading_without_service_reports(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+
+        controller = Controller(StringIO(), self.file_system)
+        controller.execute("test.mad", "25", "--no-service-reports")
+
+        self.assertFalse(self.file_system.has_file("test_1/DB.log"))
+        self.assertTrue(self.file_system.has_file("test_1/metrics.csv"))
+
+    def test_spans_of_sampled_requests(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+
+        controller = Controller(StringIO(), self.file_system)
+        controller.execute("test.mad", "25", "--trace-sampling=1")
+
+        spans = self.file_system.opened_files["test_1/spans.csv"].getvalue().split("\n")
+        self.assertEqual("request, parent, entity, operation, start, end, queueing, service, blocked, back off, network",
+                         spans[0])
+        self.assertEqual("1, -1, DB, Select, 12, 18, 0, 6, 0, 0, 2", spans[1])
+
+        report = self.file_system.opened_files["test_1/DB.log"].getvalue()
+        self.assertIn("service time Select", report)
+
+    def test_command_line_sampling_keeps_the_tracing_of_the_model(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  settings {"
+            "      tracing: off"
+            "  }"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+
+        Controller(StringIO(), self.file_system).execute("test.mad", "200", "--trace-sampling=0.5")
+
+        trace = self.file_system.opened_files["test_1/trace.log"].getvalue().splitlines()
+        self.assertTrue(any(each.split()[1] == "Browser" for each in trace))
+        self.assertFalse(any(each.split()[1] == "DB" for each in trace))
+
+    def test_metrics_are_written_during_the_run(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}")
+        arguments = Arguments([self.MAD_FILE, "1000", "--flush-size=10"])
+        controller = Controller(StringIO(), self.file_system)
+        expression = controller._load(arguments)
+        simulation = controller._start(expression, arguments)
+
+        simulation.run_until(500)
+
+        rows = self.file_system.opened_files["test_1/metrics.csv"].getvalue().splitlines()
+        times = [int(each.split(", ")[0]) for each in rows[1:]]
+        self.assertEqual(10, min(times))
+        self.assertLessEqual(490, max(times))
+
+    def test_querying_the_trace(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Controller(StringIO(), self.file_system).execute("test.mad", "25")
+        self.assertTrue(self.file_system.has_file("test_1/trace.idx"))
+
+        output = StringIO()
+        Controller(output, self.file_system).execute("trace", "test_1/trace.log", "--request=2")
+
+        trace = self.file_system.opened_files["test_1/trace.log"].getvalue().splitlines(keepends=True)
+        expected = [each_line for each_line in trace if " 2 " in each_line or each_line.rstrip().endswith(" 2")]
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual("".join(expected), output.getvalue())
+
+    def test_querying_the_trace_from_a_given_time(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            self.MAD_FILE,
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Controller(StringIO(), self.file_system).execute("test.mad", "250")
+        trace = self.file_system.opened_files["test_1/trace.log"].getvalue().splitlines(keepends=True)
+
+        for (options, keep) in [([], lambda line: True), (["--entity=DB"], lambda line: line.split()[1] == "DB")]:
+            output = StringIO()
+            Controller(output, self.file_system).execute("trace", "test_1/trace.log", "--from=150", *options)
+
+            expected = [each_line for each_line in trace if int(each_line.split()[0]) >= 150 and keep(each_line)]
+            self.assertTrue(len(expected) > 0)
+            self.assertEqual("".join(expected), output.getvalue())
+
+    def test_decoding_a_binary_trace(self):
+        model = "service DB {" \
+                "  operation Select {" \
+                "      think 5" \
+                "   }" \
+                "}" \
+                "client Browser {" \
+                "  every 10 {" \
+                "      query DB/Select" \
+                "   }" \
+                "}"
+
+        self.file_system.define(self.MAD_FILE, model)
+        Arguments._identifier = lambda s: "text"
+        Controller(StringIO(), self.file_system).execute("test.mad", "25")
+
+        self.file_system.define(self.MAD_FILE, model)
+        Arguments._identifier = lambda s: "binary"
+        Controller(StringIO(), self.file_system).execute("test.mad", "25", "--trace-format=binary")
+        self.assertFalse(self.file_system.has_file("test_binary/trace.log"))
+
+        Controller(StringIO(), self.file_system).execute("decode", "test_binary/trace.bin")
+
+        expected = self.file_system.opened_files["test_text/trace.log"].getvalue()
+        decoded = self.file_system.opened_files["test_binary/trace.log"].getvalue()
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(expected, decoded)
+
 
 class ReportTests(TestCase):
 
@@ -74,3 +326,237 @@ class ReportTests(TestCase):
                        " 10,   6\n"
 
         self.assertEqual(expected_csv, output.getvalue())
+
+
+class LongFormatReportTests(TestCase):
+
+    def test_buffered_rows(self):
+        output = StringIO()
+        report = LongFormatReport(output, flush_size=2)
+
+        report.record("10", "DB", "queue", "3")
+        self.assertEqual("time, entity, metric, value\n", output.getvalue())
+
+        report.record("10", "Browser", "queue", "1")
+        report.record("20", "DB", "queue", "5")
+        report.flush()
+
+        expected_csv = "time, entity, metric, value\n" \
+                       "10, DB, queue, 3\n" \
+                       "10, Browser, queue, 1\n" \
+                       "20, DB, queue, 5\n"
+        self.assertEqual(expected_csv, output.getvalue())
+
+
+class ColumnTests(TestCase):
+
+    def test_grows_beyond_its_initial_capacity(self):
+        column = Column("queue", capacity=2)
+        for each_value in range(5):
+            column.append(each_value)
+
+        self.assertEqual(5, column.size)
+        self.assertLessEqual(5, column.capacity)
+        self.assertEqual([0., 1., 2., 3., 4.], list(column.values))
+
+    def test_missing_values(self):
+        column = Column("queue")
+        column.append(None)
+
+        self.assertNotEqual(column[0], column[0]) # NaN
+
+    def test_rejects_invalid_index(self):
+        column = Column("queue")
+        with self.assertRaises(IndexError):
+            column[0]
+
+
+class ColumnarReportTests(TestCase):
+
+    def setUp(self):
+        self.probes = [Probe("time", 3, "{:d}", None),
+                       Probe("response time", 6, "{:5.2f}", None)]
+        self.report = ColumnarReport("DB", self.probes)
+
+    def test_records_raw_values(self):
+        self.report(time=10, response_time=None)
+        self.report(**{"time": 20, "response time": 4.5})
+
+        self.assertEqual(2, self.report.length)
+        self.assertEqual([10., 20.], list(self.report.columns[0].values))
+        self.assertEqual(4.5, self.report.columns[1][1])
+
+    def test_export_as_csv(self):
+        self.report(**{"time": 10, "response time": None})
+        self.report(**{"time": 20, "response time": 4.5})
+        output = StringIO()
+
+        self.report.export(CSVReport(output, [("time", "%s"), ("response time", "%s")]))
+
+        expected_csv = "time, response time\n" \
+                       " 10,     NA\n" \
+                       " 20,   4.50\n"
+        self.assertEqual(expected_csv, output.getvalue())
+
+
+class RoundRobinReportTests(TestCase):
+
+    def setUp(self):
+        self.probes = [Probe("time", 3, "{:d}", None),
+                       Probe("queue", 4, "{:d}", None)]
+        self.report = RoundRobinReport("DB", self.probes, capacity=10)
+
+    def _run(self, period_count):
+        for index in range(1, period_count + 1):
+            self.report(time=10 * index, queue=index % 5)
+
+    def test_keeps_recent_rows_at_full_resolution(self):
+        self._run(5)
+
+        rows = list(self.report.rows())
+
+        self.assertEqual([1] * 5, [each[0] for each in rows])
+        self.assertEqual([10, 20, 30, 40, 50], [each[1] for each in rows])
+        self.assertEqual([3, 3, 3, 3], rows[2][2:])
+
+    def test_rolls_older_rows_up(self):
+        self._run(25)
+
+        rows = list(self.report.rows())
+
+        self.assertEqual([10, 10, 1, 1, 1, 1, 1], [each[0] for each in rows])
+        self.assertEqual([100, 200, 210, 220, 230, 240, 250], [each[1] for each in rows])
+        (minimum, mean, maximum, quantile) = rows[0][2:]
+        self.assertEqual((0, 2, 4), (minimum, mean, maximum))
+        self.assertAlmostEqual(4, quantile, delta=0.05)
+
+    def test_windows_cover_the_run_without_overlap(self):
+        self._run(345)
+
+        rows = list(self.report.rows())
+
+        resolutions = [each[0] for each in rows]
+        self.assertEqual(345, sum(resolutions))
+        self.assertEqual(sorted(resolutions, reverse=True), resolutions)
+        self.assertEqual(list(range(10, 3460, 10)), self._ends(rows))
+
+    def test_size_is_bounded(self):
+        self._run(5000)
+
+        rows = list(self.report.rows())
+
+        self.assertLessEqual(len(rows), 30)
+        self.assertEqual(50000, rows[-1][1])
+
+    @staticmethod
+    def _ends(rows):
+        ends = []
+        for (resolution, end, *_) in rows:
+            ends.extend(range(end - 10 * (resolution - 1), end + 1, 10))
+        return ends
+
+    def test_consolidated_rows_span_their_windows(self):
+        report = RoundRobinReport("DB", [Probe("time", 3, "{:d}", None), Probe("window start", 3, "{:d}", None)],
+                                  capacity=10)
+        for (start, end) in zip(range(0, 300, 15), range(15, 301, 15)):
+            report(**{"time": end, "window start": start})
+
+        rows = list(report.rows())
+
+        self.assertEqual([10, 150, 0], rows[0])
+        self.assertEqual([1, 300, 285], rows[-1])
+
+    def test_export_as_csv(self):
+        self._run(11)
+        output = StringIO()
+
+        self.report.export(CSVReport(output, [(each.name, "%s") for each in self.report.probes]))
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual("resolution, time, min(queue), queue, max(queue), p95(queue)", lines[0])
+        self.assertEqual("    10, 100,    0,    2,    4,    4", lines[1])
+        self.assertEqual("     1, 110,    1,    1,    1,    1", lines[2])
+
+
+class MetricStoreTests(TestCase):
+
+    def test_bounded_reports(self):
+        store = MetricStore(rollup=10)
+        report = store.report_for("DB", [Probe("time", 3, "{:d}", None)])
+        for index in range(1000):
+            report(time=index)
+
+        self.assertLessEqual(report.length, 30)
+
+    def test_streaming_rows(self):
+        output = StringIO()
+        store = MetricStore(sink=LongFormatReport(output, flush_size=2))
+        report = store.report_for("DB", [Probe("time", 3, "{:d}", None), Probe("queue", 3, "{:d}", None)])
+
+        for index in range(1, 6):
+            report(time=10 * index, queue=index)
+
+        self.assertEqual(["time, entity, metric, value", "10, DB, queue, 1", "20, DB, queue, 2",
+                          "30, DB, queue, 3"], output.getvalue().splitlines())
+
+        store.flush(complete=True)
+
+        self.assertEqual(["40, DB, queue, 4", "50, DB, queue, 5"], output.getvalue().splitlines()[-2:])
+
+    def test_streaming_waits_for_all_entities_to_report_a_time(self):
+        output = StringIO()
+        store = MetricStore(sink=LongFormatReport(output, flush_size=1))
+        (db, browser) = [store.report_for(name, [Probe("time", 3, "{:d}", None), Probe("queue", 3, "{:d}", None)])
+                         for name in ("DB", "Browser")]
+
+        browser(time=10, queue=2)
+        db(time=10, queue=1)
+        browser(time=20, queue=2)
+        db(time=20, queue=1)
+        store.flush(complete=True)
+
+        self.assertEqual(["time, entity, metric, value", "10, DB, queue, 1", "10, Browser, queue, 2",
+                          "20, DB, queue, 1", "20, Browser, queue, 2"], output.getvalue().splitlines())
+
+    def test_streaming_does_not_format_each_row(self):
+        store = MetricStore(sink=LongFormatReport(StringIO(), flush_size=100))
+        probe = MagicMock(wraps=Probe("queue", 3, "{:d}", None))
+        probe.name = "queue"
+        report = store.report_for("DB", [Probe("time", 3, "{:d}", None), probe])
+
+        for index in range(1, 100):
+            report(time=10 * index, queue=index)
+
+        self.assertEqual(0, probe.format_value.call_count)
+
+    def test_streaming_from_the_rows_held_so_far(self):
+        store = MetricStore()
+        (db, browser) = [store.report_for(name, [Probe("time", 3, "{:d}", None), Probe("queue", 3, "{:d}", None)])
+                         for name in ("DB", "Browser")]
+        for each_time in (10, 20):
+            db(time=each_time, queue=1)
+            browser(time=each_time, queue=2)
+        output = StringIO()
+
+        store.stream_to(LongFormatReport(output, flush_size=1))
+        db(time=30, queue=3)
+        store.flush(complete=True)
+
+        self.assertEqual(["time, entity, metric, value", "10, DB, queue, 1", "10, Browser, queue, 2",
+                          "20, DB, queue, 1", "20, Browser, queue, 2", "30, DB, queue, 3"],
+                         output.getvalue().splitlines())
+
+    def test_save_as_npz(self):
+        store = MetricStore()
+        report = store.report_for("DB", [Probe("time", 3, "{:d}", None)])
+        report(time=10)
+        report(time=20)
+        output = BytesIO()
+
+        store.save(output)
+
+        archive = ZipFile(output)
+        self.assertEqual(["DB/time.npy"], archive.namelist())
+        content = archive.read("DB/time.npy")
+        self.assertTrue(content.startswith(NPYFormat.MAGIC))
+        self.assertEqual(0, (len(content) - 16) % NPYFormat.ALIGNMENT)
@@ -19,6 +19,9 @@
 
 
 from unittest import TestCase
+from tempfile import TemporaryDirectory
+from os import listdir
+from os.path import join
 from tests.fakes import InMemoryFileSystem
 
 from mad.ast.commons import *
@@ -26,7 +29,7 @@ from mad.ast.settings import *
 from mad.ast.definitions import *
 from mad.ast.actions import *
 
-from mad.parsing import Parser, MADSyntaxError
+from mad.parsing import Parser, ParserTables, MADSyntaxError
 
 
 class ParserTests(TestCase):
@@ -146,6 +149,18 @@ class CorrectExpressionTests(ParserTests):
              {"throttling": TailDropSettings(capacity=50)},
              "throttling"),
 
+            ("tracing: requests",
+             {"tracing": Tracing(level=Tracing.REQUESTS)},
+             "tracing"),
+
+            ("tracing {"
+             "  level: tasks"
+             "  include: [DB, Cache/Get]"
+             "  exclude: [DB/Insert]"
+             "}",
+             {"tracing": Tracing(level=Tracing.TASKS, include=["DB", "Cache/Get"], exclude=["DB/Insert"])},
+             "tracing"),
+
             ("settings {"
              "  queue: FIFO"
              "  autoscaling {"
@@ -174,6 +189,30 @@ class CorrectExpressionTests(ParserTests):
              "}",
              Sequence(DefineService("DB", Sequence(Settings(queue=LIFO()), DefineOperation("Select", Think(4)))),
                       DefineClientStub("Browser", 5, Query("DB", "Select"))),
+             "unit"),
+
+            # The keywords of tracing settings remain valid names elsewhere
+            ("service tracing { "
+             "  settings {"
+             "      tracing {"
+             "          level: requests"
+             "          include: [tracing/level]"
+             "      }"
+             "  }"
+             "  operation level { "
+             "      think 4 "
+             "  }"
+             "}"
+             "client include { "
+             "  every 5 { "
+             "      query tracing/level"
+             "      invoke tracing/exclude"
+             "  }"
+             "}",
+             Sequence(DefineService("tracing", Sequence(
+                          Settings(tracing=Tracing(Tracing.REQUESTS, include=["tracing/level"])),
+                          DefineOperation("level", Think(4)))),
+                      DefineClientStub("include", 5, Sequence(Query("tracing", "level"), Trigger("tracing", "exclude")))),
              "unit")
 
         ]
@@ -181,9 +220,13 @@ class CorrectExpressionTests(ParserTests):
 
 class ParserErrorTests(ParserTests):
 
+    def test_invalid_trace_level(self):
+        self.file_system.define(self.MAD_FILE, "tracing: verbose")
+        with self.assertRaises(MADSyntaxError):
+            self._do_parse("tracing")
+
     def test_illegal_expression(self):
         try:
-            from mad.parsing import lexer
             text = "qqqquery DB/Select"
             self.file_system.define(self.MAD_FILE, text)
             self._do_parse("query")
@@ -192,3 +235,47 @@ class ParserErrorTests(ParserTests):
         except MADSyntaxError as error:
             self.assertEqual((1, 0), error.position)
 
+
+
+class ParserTablesTests(TestCase):
+
+    MAD_FILE = "test.mad"
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.file_system = InMemoryFileSystem()
+        self.file_system.define(self.MAD_FILE, "service DB { operation Select { think 5 } }")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _parse(self, tables):
+        return Parser(self.file_system, self.MAD_FILE, tables).parse(logger=None)
+
+    def test_tables_are_built_once_and_cached(self):
+        tables = ParserTables(self.directory.name)
+        expected = self._parse(tables)
+        self.assertIs(tables.parser_for("unit", None), tables.parser_for("unit", None))
+
+        cached = sorted(listdir(self.directory.name))
+        self.assertEqual(["lexer_{0:s}.py".format(tables.signature), "parser_unit_{0:s}.py".format(tables.signature)], cached)
+        self.assertEqual(str(expected), str(self._parse(ParserTables(self.directory.name))))
+
+    def test_corrupted_tables_are_rebuilt(self):
+        tables = ParserTables(self.directory.name)
+        self._parse(tables)
+        location = join(self.directory.name, listdir(self.directory.name)[0])
+        with open(location, "wb") as table:
+            table.write(b"garbage")
+
+        self._parse(ParserTables(self.directory.name))
+
+        with open(location, "rb") as table:
+            self.assertNotEqual(b"garbage", table.read())
+
+    def test_parsing_without_cache(self):
+        tables = ParserTables(join(self.directory.name, "file"))
+        with open(join(self.directory.name, "file"), "w") as blocking:
+            blocking.write("not a directory")
+
+        self._parse(tables)
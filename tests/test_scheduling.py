@@ -107,6 +107,17 @@ class SchedulerTest(TestCase):
 
         self.verify_calls([5, 10], action)
 
+    def test_stopping_the_simulation(self):
+        schedule = Scheduler()
+        action = DummyAction(schedule)
+        schedule.every(5, action)
+        schedule.at(12, schedule.stop)
+
+        schedule.simulate_until(50)
+
+        self.assertEqual(12, schedule.time_now)
+        self.verify_calls([5, 10], action)
+
     def test_scheduling_at_a_non_integer_time(self):
         schedule = Scheduler()
         action = DummyAction(schedule)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from unittest import TestCase
+
+from random import Random
+
+from mad.statistics import Accumulator, QuantileSketch, TimeWeightedGauge, BatchMeans, MSER, PeriodBlocks, \
+    student_quantile
+
+
+class AccumulatorTests(TestCase):
+
+    def setUp(self):
+        self.accumulator = Accumulator()
+
+    def test_empty(self):
+        self.assertTrue(self.accumulator.is_empty)
+        self.assertEqual(0, self.accumulator.count)
+        self.assertIsNone(self.accumulator.mean)
+        self.assertIsNone(self.accumulator.variance)
+        self.assertIsNone(self.accumulator.minimum)
+        self.assertIsNone(self.accumulator.maximum)
+
+    def test_summary(self):
+        values = [4, 8, 15, 16, 23, 42]
+        for each_value in values:
+            self.accumulator.add(each_value)
+
+        self.assertEqual(len(values), self.accumulator.count)
+        self.assertEqual(sum(values), self.accumulator.total)
+        self.assertEqual(sum(values) / len(values), self.accumulator.mean)
+        self.assertAlmostEqual(self._variance(values), self.accumulator.variance)
+        self.assertEqual(4, self.accumulator.minimum)
+        self.assertEqual(42, self.accumulator.maximum)
+
+    def test_merge(self):
+        (left, right) = ([3, 5, 7, 11], [13, 17, 19])
+        for each_value in left:
+            self.accumulator.add(each_value)
+        other = Accumulator()
+        for each_value in right:
+            other.add(each_value)
+
+        self.accumulator.merge(other)
+
+        values = left + right
+        self.assertEqual(len(values), self.accumulator.count)
+        self.assertEqual(sum(values) / len(values), self.accumulator.mean)
+        self.assertAlmostEqual(self._variance(values), self.accumulator.variance)
+        self.assertEqual(3, self.accumulator.minimum)
+        self.assertEqual(19, self.accumulator.maximum)
+
+    def test_merge_into_empty(self):
+        other = Accumulator()
+        other.add(5)
+        other.add(7)
+
+        self.accumulator.merge(other)
+
+        self.assertEqual(2, self.accumulator.count)
+        self.assertEqual(6, self.accumulator.mean)
+
+    def test_reset(self):
+        self.accumulator.add(12)
+        self.accumulator.reset()
+
+        self.assertTrue(self.accumulator.is_empty)
+        self.assertIsNone(self.accumulator.mean)
+
+    def test_half_width(self):
+        for each_value in [4, 8, 15, 16, 23, 42]:
+            self.accumulator.add(each_value)
+
+        expected = 2.570582 * self.accumulator.standard_deviation / 6 ** 0.5
+        self.assertAlmostEqual(expected, self.accumulator.half_width(0.95), places=4)
+
+    def test_no_half_width_below_two_values(self):
+        self.accumulator.add(12)
+        self.assertIsNone(self.accumulator.half_width())
+
+    @staticmethod
+    def _variance(values):
+        mean = sum(values) / len(values)
+        return sum((x - mean) ** 2 for x in values) / (len(values) - 1)
+
+
+class StudentQuantileTests(TestCase):
+
+    def test_known_quantiles(self):
+        for (freedom, expected) in [(1, 12.7062), (2, 4.3027), (3, 3.1824), (10, 2.2281), (29, 2.0452)]:
+            self.assertAlmostEqual(expected, student_quantile(0.975, freedom), places=4)
+
+    def test_symmetry(self):
+        self.assertAlmostEqual(-student_quantile(0.95, 7), student_quantile(0.05, 7))
+
+
+class BatchMeansTests(TestCase):
+
+    def setUp(self):
+        self.random = Random(12)
+
+    def test_empty(self):
+        self.assertEqual((None, None, 0, 1, None), BatchMeans().estimate())
+
+    def test_memory_is_bounded(self):
+        batch_means = BatchMeans(capacity=16)
+        for each_value in range(1000):
+            batch_means.add(each_value)
+
+        self.assertEqual(1000, batch_means.count)
+        self.assertEqual(64, batch_means.size)
+        self.assertEqual(1000 // 64, len(batch_means._batches))
+
+    def test_independent_observations(self):
+        batch_means = BatchMeans()
+        for _ in range(2000):
+            batch_means.add(self.random.gauss(5, 1))
+
+        (mean, half_width, batches, size, correlation) = batch_means.estimate()
+
+        self.assertLessEqual(abs(mean - 5), half_width)
+        self.assertAlmostEqual(1.96 / 2000 ** 0.5, half_width, delta=0.03)
+        self.assertLessEqual(correlation, BatchMeans.DEFAULT_CORRELATION)
+
+    def test_correlated_observations_need_larger_batches(self):
+        (batch_means, value) = (BatchMeans(), 0)
+        for _ in range(4000):
+            value = 0.95 * value + self.random.gauss(0, 1)
+            batch_means.add(10 + value)
+
+        (mean, half_width, batches, size, correlation) = batch_means.estimate()
+
+        self.assertGreater(size, batch_means.size)
+        self.assertLessEqual(correlation, BatchMeans.DEFAULT_CORRELATION)
+        self.assertLessEqual(abs(mean - 10), half_width)
+        self.assertGreater(half_width, 10 * 1.96 / 4000 ** 0.5)
+
+    def test_weighted_observations(self):
+        batch_means = BatchMeans()
+        for _ in range(8):
+            batch_means.add(1, weight=3)
+            batch_means.add(5, weight=1)
+            batch_means.add(None, weight=2)
+
+        (mean, _, _, _, _) = batch_means.estimate()
+
+        self.assertEqual(16, batch_means.count)
+        self.assertAlmostEqual(2, mean)
+
+    def test_values_standing_for_several_observations(self):
+        batch_means = BatchMeans(capacity=16, size=4)
+        batch_means.add(2, weight=4, count=4)
+        for _ in range(4):
+            batch_means.add(6)
+
+        self.assertEqual(8, batch_means.count)
+        self.assertEqual([(8, 4), (24, 4)], batch_means._batches)
+
+    def test_constant_observations_are_not_correlated(self):
+        batch_means = BatchMeans()
+        for _ in range(100):
+            batch_means.add(0.1)
+
+        self.assertEqual(0, batch_means.estimate()[4])
+
+
+class MSERTests(TestCase):
+
+    def setUp(self):
+        self.random = Random(12)
+
+    def test_too_short_series(self):
+        mser = MSER()
+        for _ in range(MSER.BATCH_SIZE * MSER.MINIMUM_BATCHES - 1):
+            mser.add(1)
+
+        self.assertIsNone(mser.truncation())
+
+    def test_steady_series_need_no_truncation(self):
+        mser = MSER()
+        for _ in range(200):
+            mser.add(self.random.gauss(5, 1))
+
+        self.assertLessEqual(mser.truncation(), 50)
+
+    def test_truncates_the_initial_transient(self):
+        mser = MSER()
+        for index in range(400):
+            mser.add(10 * (1 - 0.9 ** index) + self.random.gauss(0, 0.5))
+
+        truncation = mser.truncation()
+
+        self.assertIsNotNone(truncation)
+        self.assertGreaterEqual(truncation, 20)
+        self.assertLessEqual(truncation, 200)
+
+    def test_no_truncation_while_the_transient_lasts(self):
+        mser = MSER()
+        for index in range(100):
+            mser.add(index + self.random.gauss(0, 0.5))
+
+        self.assertIsNone(mser.truncation())
+
+    def test_missing_observations_still_count_as_periods(self):
+        mser = MSER()
+        for index in range(100):
+            mser.add(None if index < 20 else 1)
+
+        self.assertEqual((100, 80), (mser.periods, mser.count))
+        self.assertEqual(0, mser.truncation())
+
+    def test_memory_is_bounded(self):
+        mser = MSER(capacity=20)
+        for index in range(10000):
+            mser.add(index)
+
+        self.assertLess(len(mser._batches), 20)
+        self.assertEqual(5 * 2 ** 7, mser.batch_size)
+        self.assertIsNone(mser.truncation())
+
+    def test_merged_batches_still_truncate_the_transient(self):
+        mser = MSER(capacity=20)
+        for index in range(2000):
+            mser.add(10 * (1 - 0.99 ** index) + self.random.gauss(0, 0.5))
+
+        truncation = mser.truncation()
+
+        self.assertIsNotNone(truncation)
+        self.assertGreaterEqual(truncation, 200)
+        self.assertLessEqual(truncation, 1000)
+
+
+class PeriodBlocksTests(TestCase):
+
+    def test_memory_is_bounded(self):
+        blocks = PeriodBlocks(capacity=8)
+        for index in range(1000):
+            blocks.add(10 * index, {"queue": (index, 1)})
+
+        self.assertLessEqual(len(blocks), 8)
+        self.assertEqual(128, blocks.size)
+
+    def test_replaying_the_blocks_after_a_period(self):
+        blocks = PeriodBlocks(capacity=4)
+        for index in range(10):
+            blocks.add(10 * index, {"queue": (index, 2), "response time": (None, 0)})
+
+        [(first_start, first), (second_start, second)] = list(blocks.since(4))
+
+        self.assertEqual(4, blocks.size)
+        self.assertEqual((40, (5.5, 8, 4)), (first_start, first["queue"]))
+        self.assertEqual((80, (8.5, 4, 2)), (second_start, second["queue"]))
+        self.assertNotIn("response time", first)
+        self.assertEqual([80], [start for (start, _) in blocks.since(5)])
+
+
+class QuantileSketchTests(TestCase):
+
+    def setUp(self):
+        self.sketch = QuantileSketch(accuracy=0.01)
+
+    def test_empty(self):
+        self.assertTrue(self.sketch.is_empty)
+        self.assertIsNone(self.sketch.quantile(0.5))
+
+    def test_quantiles_within_relative_accuracy(self):
+        values = list(range(1, 1001))
+        for each_value in values:
+            self.sketch.add(each_value)
+
+        for (q, expected) in [(0.5, 500), (0.9, 900), (0.95, 950), (0.99, 990)]:
+            self.assertAlmostEqual(expected, self.sketch.quantile(q), delta=0.02 * expected)
+
+    def test_zero_values(self):
+        for each_value in [0, 0, 0, 10]:
+            self.sketch.add(each_value)
+
+        self.assertEqual(0, self.sketch.quantile(0.5))
+
+    def test_merge(self):
+        other = QuantileSketch(accuracy=0.01)
+        for each_value in range(1, 501):
+            self.sketch.add(each_value)
+        for each_value in range(501, 1001):
+            other.add(each_value)
+
+        self.sketch.merge(other)
+
+        self.assertEqual(1000, self.sketch.count)
+        self.assertAlmostEqual(900, self.sketch.quantile(0.9), delta=18)
+
+    def test_merge_rejects_different_accuracies(self):
+        with self.assertRaises(ValueError):
+            self.sketch.merge(QuantileSketch(accuracy=0.05))
+
+    def test_bounded_memory(self):
+        sketch = QuantileSketch(accuracy=0.01, bucket_limit=10)
+        for each_value in range(1, 10000):
+            sketch.add(each_value)
+
+        self.assertLessEqual(len(sketch.buckets), 10)
+        self.assertAlmostEqual(9900, sketch.quantile(0.99), delta=200)
+
+
+class TimeWeightedGaugeTests(TestCase):
+
+    def setUp(self):
+        self.gauge = TimeWeightedGauge(time=0, level=2)
+
+    def test_integral(self):
+        self.gauge.update(10, 4)
+        self.gauge.update(15, 0)
+
+        self.assertEqual(2 * 10 + 4 * 5, self.gauge.integral(20))
+
+    def test_window_average_and_maximum(self):
+        window = self.gauge.window(0)
+        self.gauge.increment(5)
+        self.gauge.decrement(6, 3)
+
+        self.assertEqual((2 * 5 + 3 * 1) / 10, window.average(10))
+        self.assertEqual(3, window.maximum)
+
+    def test_short_bursts_are_not_missed(self):
+        window = self.gauge.window(0)
+        self.gauge.update(3, 50)
+        self.gauge.update(4, 2)
+
+        self.assertEqual(50, window.maximum)
+        self.assertEqual((2 * 9 + 50) / 10, window.average(10))
+
+    def test_window_restart(self):
+        window = self.gauge.window(0)
+        self.gauge.update(5, 10)
+        self.gauge.update(8, 1)
+        window.restart(10)
+        self.gauge.update(15, 3)
+
+        self.assertEqual(3, window.maximum)
+        self.assertEqual((1 * 5 + 3 * 5) / 10, window.average(20))
+
+    def test_average_of_empty_window(self):
+        window = self.gauge.window(10)
+
+        self.assertEqual(2, window.average(10))
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from os import environ, pathsep
+from os.path import join, exists, dirname
+from subprocess import check_output
+from sys import executable
+
+from io import StringIO, BytesIO
+from mock import patch
+
+from tests.fakes import InMemoryFileSystem
+
+from mad.storage import FileSystem, Compression, CompressedView, TextWriter, ModelCache
+import mad
+from mad.parsing import Parser
+from mad.ui import Controller, Arguments
+
+
+class CompressionTests(TestCase):
+
+    def test_parsing(self):
+        self.assertEqual(Compression(Compression.GZIP), Compression.parse("gzip"))
+        self.assertEqual(Compression(Compression.XZ, 6), Compression.parse("xz:6"))
+
+    def test_rejecting_invalid_codecs_and_levels(self):
+        for each_text in ["zip", "gzip:0", "bzip2:10", "xz:x", ""]:
+            with self.assertRaises(ValueError):
+                Compression.parse(each_text)
+
+    def test_recognising_compressed_files(self):
+        self.assertEqual(Compression(Compression.BZIP2), Compression.of("out/trace.log.bz2"))
+        self.assertIsNone(Compression.of("out/trace.log"))
+        self.assertEqual("out/trace.bin", Compression.uncompressed("out/trace.bin.xz"))
+
+
+class FileSystemTests(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.file_system = FileSystem()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compressed_text_is_read_transparently(self):
+        text = "".join("{:5d} DB Req. {:d} successful\n".format(i, i) for i in range(10000))
+        for each_codec in Compression.CODECS:
+            location = join(self.directory.name, each_codec, "trace.log")
+            with self.file_system.open_output_stream(location, Compression(each_codec)) as output:
+                output.write(text)
+
+            self.assertTrue(exists(location + Compression(each_codec).extension))
+            self.assertFalse(exists(location))
+            self.assertTrue(self.file_system.exists(location))
+            with self.file_system.open_input_stream(location) as source:
+                self.assertEqual(text, source.read())
+            self.assertEqual(text.encode("utf-8"), self.file_system.open_memory_map(location)[:])
+
+    def test_compressed_traces_are_queried_without_decompressing_them_entirely(self):
+        text = "".join("{:5d} DB Req. {:d} successful\n".format(i, i) for i in range(10000))
+        location = join(self.directory.name, "trace.log")
+        with self.file_system.open_output_stream(location, Compression(Compression.GZIP)) as output:
+            output.write(text)
+
+        trace = self.file_system.open_memory_map(location)
+        self.assertIsInstance(trace, CompressedView)
+        with patch.object(trace.source, "read", wraps=trace.source.read) as read:
+            offset = text.index("9000 DB")
+            stop = trace.find(b"\n", offset)
+            self.assertEqual(text[offset:stop + 1].encode("utf-8"), trace[offset:stop + 1])
+        self.assertTrue(all(each_call.args[0] <= CompressedView.CHUNK_SIZE for each_call in read.call_args_list))
+        trace.close()
+
+    def test_compressed_binary_output(self):
+        location = join(self.directory.name, "trace.bin")
+        with self.file_system.open_binary_output_stream(location, Compression(Compression.XZ, 1)) as output:
+            output.write(b"\x00\x01" * 1000)
+
+        with self.file_system.open_binary_input_stream(location + ".xz") as source:
+            self.assertEqual(b"\x00\x01" * 1000, source.read())
+
+    def test_uncompressed_output(self):
+        location = join(self.directory.name, "metrics.csv")
+        with self.file_system.open_output_stream(location) as output:
+            output.write("time, entity, metric, value\n")
+
+        self.assertTrue(exists(location))
+
+
+class CompressedViewTests(TestCase):
+
+    CONTENT = b"0 DB Req. 1 accepted\n12 DB Req. 1 successful\n15 Browser Req. 2 sent\n"
+
+    def test_behaves_as_bytes(self):
+        view = CompressedView(BytesIO(self.CONTENT), chunk_size=4)
+
+        self.assertEqual(len(self.CONTENT), len(view))
+        self.assertEqual(self.CONTENT[5:20], view[5:20])
+        self.assertEqual(self.CONTENT[40:], view[40:])
+        for (pattern, start, end) in [(b"\n", 0, None), (b"\n", 21, None), (b"Req. 2", 0, None),
+                                      (b"Req. 2", 0, 50), (b"\n", 30, 35), (b"none", 0, None)]:
+            self.assertEqual(self.CONTENT.find(pattern, start, end) if end else self.CONTENT.find(pattern, start),
+                             view.find(pattern, start, end))
+
+
+class TextWriterTests(TestCase):
+
+    class Writer:
+
+        def __init__(self):
+            self.chunks = []
+            self.closed = False
+
+        def write(self, chunk):
+            self.chunks.append(chunk)
+
+        def close(self):
+            self.closed = True
+
+    def test_writing_by_chunks(self):
+        writer = self.Writer()
+        text = TextWriter(writer, chunk_size=10)
+
+        for each_line in ["abc\n", "def\n", "ghi\n", "jkl\n"]:
+            text.write(each_line)
+        self.assertEqual([b"abc\ndef\nghi\n"], writer.chunks)
+
+        text.close()
+        self.assertEqual([b"abc\ndef\nghi\n", b"jkl\n"], writer.chunks)
+        self.assertTrue(writer.closed)
+
+
+class ModelCacheTests(TestCase):
+
+    SOURCE = "service DB { operation Select { think 5 } }"
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+        self.cache = ModelCache(self.file_system, "cache")
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.load(self.SOURCE))
+
+    def test_hit(self):
+        self.cache.save(self.SOURCE, ["a model"], ["a warning"])
+
+        self.assertEqual((["a model"], ["a warning"]), self.cache.load(self.SOURCE))
+        self.assertIsNone(self.cache.load(self.SOURCE + " "))
+
+    def test_key_depends_on_the_version(self):
+        key = self.cache.key_of(self.SOURCE)
+        with patch("mad.__version__", "0.0.0"):
+            self.assertNotEqual(key, self.cache.key_of(self.SOURCE))
+
+    def test_ignores_unreadable_entries(self):
+        self.cache.save(self.SOURCE, ["a model"], [])
+        location = "cache/models/{:s}.pickle".format(self.cache.key_of(self.SOURCE))
+        self.file_system.opened_files[location].truncate(10)
+
+        self.assertIsNone(self.cache.load(self.SOURCE))
+
+    def test_interrupted_save_keeps_the_previous_entry(self):
+        def interrupted(content, entry, protocol):
+            entry.write(b"\x80")
+            raise OSError("No space left on device")
+
+        with TemporaryDirectory() as directory:
+            cache = ModelCache(FileSystem(), directory)
+            cache.save(self.SOURCE, ["a model"], [])
+            with patch("pickle.dump", side_effect=interrupted):
+                cache.save(self.SOURCE, ["another model"], [])
+
+            self.assertEqual((["a model"], []), cache.load(self.SOURCE))
+
+    def test_unexpected_errors_are_not_hidden(self):
+        self.cache.save(self.SOURCE, ["a model"], [])
+        with patch("pickle.load", side_effect=MemoryError()):
+            with self.assertRaises(MemoryError):
+                self.cache.load(self.SOURCE)
+
+    def test_second_run_skips_parsing_and_validation(self):
+        Arguments._identifier = lambda s: "1"
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select { think 5 }"
+            "  operation Insert { think 5 }"
+            "}"
+            "client Browser {"
+            "  every 10 { query DB/Select }"
+            "}")
+        first = StringIO()
+        Controller(first, self.file_system).execute("test.mad", "25")
+
+        second = StringIO()
+        with patch.object(Parser, "parse", side_effect=AssertionError("Should not parse")):
+            Controller(second, self.file_system).execute("test.mad", "25")
+
+        self.assertIn("Operation 'DB::Insert' is never invoked", first.getvalue())
+        self.assertIn("Operation 'DB::Insert' is never invoked", second.getvalue())
+
+    RUN = "import sys\n" \
+          "from io import StringIO\n" \
+          "from mad.storage import FileSystem\n" \
+          "from mad.ui import Controller\n" \
+          "Controller(StringIO(), FileSystem()).execute('test.mad', '25')\n" \
+          "print('ply' in sys.modules)\n"
+
+    def test_cache_hits_do_not_import_the_parser_generator(self):
+        with TemporaryDirectory() as directory:
+            with open(join(directory, "test.mad"), "w") as model:
+                model.write("service DB { operation Select { think 5 } }"
+                            "client Browser { every 10 { query DB/Select } }")
+            variables = dict(environ, MAD_CACHE_DIR=join(directory, "cache"),
+                             PYTHONPATH=pathsep.join([dirname(dirname(mad.__file__)), environ.get("PYTHONPATH", "")]))
+
+            def run():
+                return check_output([executable, "-c", self.RUN], cwd=directory, env=variables).decode().split()[-1]
+
+            self.assertEqual("True", run())
+            self.assertEqual("False", run())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+#
+# This file is part of MAD.
+#
+# MAD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MAD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MAD.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from unittest import TestCase
+from io import StringIO
+
+from tests.fakes import InMemoryFileSystem
+
+from mad.ast.commons import Sequence
+from mad.ast.definitions import DefineService, DefineOperation, DefineClientStub
+from mad.ast.settings import Settings, TailDropSettings, Autoscaling
+from mad.ast.actions import Query, Think
+from mad.sweep import ParameterPath, Sweep, Choices, Range, InvalidSweep
+from mad.ui import Controller, Arguments
+
+
+def a_model():
+    return Sequence(
+        DefineService("Storage", Sequence(
+            Settings(throttling=TailDropSettings(50), autoscaling=Autoscaling(10, (1, 5))),
+            DefineOperation("Store", Think(5)))),
+        DefineClientStub("Browser", 2, Query("Storage", "Store", timeout=20)))
+
+
+class ParameterPathTests(TestCase):
+
+    def setUp(self):
+        self.model = a_model()
+
+    def test_setting_throttling(self):
+        ParameterPath("Storage.settings.throttling.capacity").set(self.model, 25)
+
+        self.assertEqual(25, self.model.body[0].body.body[0].throttling.capacity)
+
+    def test_setting_autoscaling_limits(self):
+        ParameterPath("Storage.settings.autoscaling.limits").set(self.model, [2, 8])
+
+        self.assertEqual((2, 8), self.model.body[0].body.body[0].autoscaling.limits)
+
+    def test_setting_client_period_and_timeout(self):
+        ParameterPath("Browser.period").set(self.model, 4)
+        ParameterPath("Browser.Storage/Store.timeout").set(self.model, 35)
+
+        self.assertEqual(4, self.model.body[1].period)
+        self.assertEqual(35, self.model.body[1].body.timeout)
+
+    def test_setting_an_operation(self):
+        ParameterPath("Storage.Store.think.duration").set(self.model, 12)
+
+        self.assertEqual(12, self.model.body[0].body.body[1].body.duration)
+
+    def test_rejecting_invalid_paths_and_values(self):
+        for (path, value) in [("Cache.period", 1),
+                              ("Storage.settings.throttling", 1),
+                              ("Storage.settings.autoscaling.period", 2.5),
+                              ("Storage.settings.autoscaling.limits", [1, 2, 3])]:
+            with self.assertRaises(InvalidSweep):
+                ParameterPath(path).set(self.model, value)
+        with self.assertRaises(InvalidSweep):
+            ParameterPath("capacity")
+
+
+class SweepTests(TestCase):
+
+    def test_grid(self):
+        sweep = Sweep([(ParameterPath("Browser.period"), Choices([1, 2])),
+                       (ParameterPath("Storage.settings.throttling.capacity"), Range(10, 30, 10))])
+
+        self.assertEqual([(1, 10), (1, 20), (1, 30), (2, 10), (2, 20), (2, 30)], sweep.points())
+
+    def test_grid_needs_steps(self):
+        sweep = Sweep([(ParameterPath("Browser.period"), Range(1, 10))])
+        with self.assertRaises(InvalidSweep):
+            sweep.points()
+
+    def test_latin_hypercube_covers_each_stratum_once(self):
+        sweep = Sweep([(ParameterPath("Browser.period"), Range(1, 10)),
+                       (ParameterPath("Storage.settings.throttling.capacity"), Range(0., 1.))],
+                      Sweep.LATIN_HYPERCUBE, samples=10, seed=4)
+
+        points = sweep.points()
+
+        self.assertEqual(list(range(1, 11)), sorted(period for (period, _) in points))
+        self.assertEqual(list(range(10)), sorted(int(capacity * 10) for (_, capacity) in points))
+        self.assertEqual(points, sweep.points())
+
+    def test_random_samples_stay_in_range(self):
+        sweep = Sweep([(ParameterPath("Browser.period"), Range(1, 3))], Sweep.RANDOM, samples=50, seed=1)
+
+        self.assertEqual({1, 2, 3}, set(period for (period,) in sweep.points()))
+
+    def test_apply_leaves_the_model_unchanged(self):
+        model = a_model()
+        sweep = Sweep([(ParameterPath("Browser.period"), Choices([7]))])
+
+        variant = sweep.apply(model, (7,))
+
+        self.assertEqual(7, variant.body[1].period)
+        self.assertEqual(a_model(), model)
+
+    def test_loading(self):
+        sweep = Sweep.load(StringIO('{"design": "random", "samples": 5, "seed": 2,'
+                                    ' "parameters": {"Browser.period": {"from": 1, "to": 4}}}'))
+
+        self.assertEqual((Sweep.RANDOM, 5, 2), (sweep.design, sweep.samples, sweep.seed))
+        self.assertEqual(["Browser.period"], [str(each) for each in sweep.paths])
+
+    def test_rejecting_invalid_sweeps(self):
+        for each_text in ['{"parameters": {}}',
+                          '{"parameters": {"Browser.period": 3}}',
+                          '{"design": "random", "parameters": {"Browser.period": [1, 2]}}',
+                          '{"design": "factorial", "parameters": {"Browser.period": [1, 2]}}',
+                          'not JSON']:
+            with self.assertRaises(InvalidSweep):
+                Sweep.load(StringIO(each_text))
+
+
+class SweepCommandTests(TestCase):
+
+    def setUp(self):
+        self.file_system = InMemoryFileSystem()
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        Arguments._identifier = lambda s: "swept"
+
+    def test_sweeping_client_period(self):
+        self.file_system.define("sweep.json", '{"parameters": {"Browser.period": [5, 10]}}')
+
+        Controller(StringIO(), self.file_system).execute("test.mad", "100", "--sweep=sweep.json", "--seed=1")
+
+        self.assertTrue(self.file_system.exists("test_swept/point-002/replication-001/metrics.csv"))
+        rows = self.file_system.open_input_stream("test_swept/replications.csv").read().splitlines()
+        self.assertEqual("Browser.period, replication, seed, entity, metric, value", rows[0])
+        self.assertIn("5, 1, 1, DB, arrival rate, 0.19", rows)
+        self.assertIn("10, 1, 1, DB, arrival rate, 0.09", rows)
+        summary = self.file_system.open_input_stream("test_swept/summary.csv").read().splitlines()
+        self.assertIn("10, DB, arrival rate, 1, 0.09, NA, NA, NA", summary)
+
+    def test_comparing_points_with_common_random_numbers(self):
+        self.file_system.define(
+            "test.mad",
+            "service DB {"
+            "  operation Select {"
+            "      think 5"
+            "      fail 0.5"
+            "   }"
+            "}"
+            "client Browser {"
+            "  every 10 {"
+            "      query DB/Select"
+            "   }"
+            "}")
+        self.file_system.define("sweep.json", '{"parameters": {"DB.think.duration": [5, 8]}}')
+
+        Controller(StringIO(), self.file_system).execute("test.mad", "500", "--sweep=sweep.json", "--replications=3")
+
+        differences = self.file_system.open_input_stream("test_swept/differences.csv").read().splitlines()
+        self.assertEqual("DB.think.duration, entity, metric, replications, difference, ci lower, ci upper", differences[0])
+        self.assertIn("8, DB, response time, 3, 3, 3, 3", differences)
+        [(_, _, _, _, _, lower, upper)] = [each.split(", ") for each in differences if "DB, reliability" in each]
+        self.assertLess(float(upper) - float(lower), 0.1)
+
+    def test_reporting_invalid_sweeps(self):
+        self.file_system.define("sweep.json", '{"parameters": {"Cache.period": [5, 10]}}')
+        output = StringIO()
+
+        Controller(output, self.file_system).execute("test.mad", "100", "--sweep=sweep.json")
+
+        self.assertIn("Error, the sweep is invalid: Parameter 'Cache.period' matches nothing", output.getvalue())
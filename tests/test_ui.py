@@ -24,7 +24,10 @@ from unittest import TestCase
 from mock import MagicMock, patch
 
 from mad import __version__ as MAD_VERSION
-from mad.ui import Display, Arguments, InvalidSimulationLength, InvalidSimulationModel, WrongNumberOfArguments
+from mad.monitoring import LongFormatReport
+from mad.storage import Compression
+from mad.ast.settings import Tracing
+from mad.ui import Display, Arguments, TraceArguments, AnalyseArguments, InvalidSimulationLength, InvalidSimulationModel, InvalidOption, WrongNumberOfArguments
 
 
 class DisplayTest(TestCase):
@@ -38,6 +41,10 @@ class DisplayTest(TestCase):
         self.display.boot_up()
         self._verify_output(MAD_VERSION)
 
+    def test_version(self):
+        self.display.version()
+        self.assertEqual("MAD v{:s}\n".format(MAD_VERSION), self.output.getvalue())
+
     def test_simulation_started(self):
         self.display.model_loaded(self.project)
         self._verify_output(self.project._file_name)
@@ -85,6 +92,150 @@ class ArgumentsTest(TestCase):
         with self.assertRaises(InvalidSimulationLength):
             Arguments(["test.mad", "25x"])
 
+    def test_default_options(self):
+        arguments = Arguments(["test.mad", "25"])
+        self.assertTrue(arguments.service_reports)
+        self.assertEqual(LongFormatReport.DEFAULT_FLUSH_SIZE, arguments.flush_size)
+
+    def test_parsing_options(self):
+        arguments = Arguments(["--no-service-reports", "test.mad", "25", "--flush-size=10"])
+        self.assertEqual("test.mad", arguments._file_name)
+        self.assertEqual(25, arguments._time_limit)
+        self.assertFalse(arguments.service_reports)
+        self.assertEqual(10, arguments.flush_size)
+
+    def test_detecting_invalid_options(self):
+        for each_option in ["--unknown", "--flush-size=abc", "--flush-size=0", "--no-service-reports=yes"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_no_tracing_by_default(self):
+        self.assertIsNone(Arguments(["test.mad", "25"]).tracing)
+
+    def test_parsing_tracing_options(self):
+        arguments = Arguments(["test.mad", "25", "--trace=requests", "--trace-exclude=DB/Select,Cache"])
+        self.assertEqual({"level": Tracing.REQUESTS, "exclude": ["DB/Select", "Cache"]}, arguments.tracing)
+
+    def test_parsing_trace_sampling(self):
+        for (text, expected) in [("0.05", 0.05), ("1/20", 0.05), ("1", 1.0)]:
+            arguments = Arguments(["test.mad", "25", "--trace-sampling=" + text])
+            self.assertAlmostEqual(expected, arguments.tracing["sampling"])
+            self.assertNotIn("level", arguments.tracing)
+
+    def test_detecting_invalid_tracing_options(self):
+        for each_option in ["--trace=verbose", "--trace-include=", "--trace-exclude=DB,,Cache",
+                            "--trace-sampling=0", "--trace-sampling=2", "--trace-sampling=1/0", "--trace-sampling=x"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_parsing_trace_queries(self):
+        arguments = TraceArguments(["out/trace.log", "--from=10", "--entity=DB"])
+        self.assertEqual("out/trace.idx", arguments.index_file)
+        self.assertIsNone(arguments.request)
+        self.assertEqual(10, arguments.start)
+        self.assertEqual(float("inf"), arguments.end)
+        self.assertEqual("DB", arguments.entity)
+
+        with self.assertRaises(InvalidOption):
+            TraceArguments(["out/trace.log", "--request=abc"])
+
+    def test_parsing_compression(self):
+        arguments = Arguments(["test.mad", "25", "--compress=gzip,trace=xz:6"])
+        self.assertEqual(Compression(Compression.XZ, 6), arguments.compression_for(Arguments.TRACE))
+        self.assertEqual(Compression(Compression.GZIP), arguments.compression_for(Arguments.REPORTS))
+        self.assertIsNone(Arguments(["test.mad", "25"]).compression_for(Arguments.TRACE))
+
+        for each_option in ["--compress=zip", "--compress=logs=gzip", "--compress=gzip:12"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_parsing_rollup(self):
+        self.assertIsNone(Arguments(["test.mad", "25"]).rollup)
+        self.assertEqual(500, Arguments(["test.mad", "25", "--rollup=500"]).rollup)
+
+        with self.assertRaises(InvalidOption):
+            Arguments(["test.mad", "25", "--rollup=5"])
+
+    def test_parsing_adaptive_sampling(self):
+        self.assertIsNone(Arguments(["test.mad", "25"]).sampling)
+        sampling = Arguments(["test.mad", "25", "--adaptive-sampling"]).sampling
+        self.assertEqual((1, 100), (sampling.finest, sampling.coarsest))
+        sampling = Arguments(["test.mad", "25", "--adaptive-sampling=5:50"]).sampling
+        self.assertEqual((5, 50), (sampling.finest, sampling.coarsest))
+
+        for each_option in ["--adaptive-sampling=50:5", "--adaptive-sampling=0:5", "--adaptive-sampling=5"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_parsing_replications(self):
+        arguments = Arguments(["test.mad", "25"])
+        self.assertEqual((1, 1, None), (arguments.replications, arguments.jobs, arguments.seed))
+
+        arguments = Arguments(["test.mad", "25", "--replications=30", "--jobs=4", "--seed=12"])
+        self.assertEqual((30, 4, 12), (arguments.replications, arguments.jobs, arguments.seed))
+
+        for each_option in ["--replications=0", "--jobs=-2", "--seed=abc"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_parsing_batch_means(self):
+        self.assertIsNone(Arguments(["test.mad", "25"]).batch_means)
+        self.assertEqual(0, Arguments(["test.mad", "25", "--batch-means"]).batch_means.warm_up)
+        self.assertEqual(100, Arguments(["test.mad", "25", "--batch-means", "--warm-up=100"]).batch_means.warm_up)
+
+        with self.assertRaises(InvalidOption):
+            Arguments(["test.mad", "25", "--warm-up=-5"])
+
+    def test_parsing_until_steady(self):
+        self.assertFalse(Arguments(["test.mad", "25"]).until_steady)
+        self.assertTrue(Arguments(["test.mad", "25", "--batch-means", "--warm-up=auto"]).batch_means.detects_warm_up)
+
+        arguments = Arguments(["test.mad", "25", "--until-steady", "--precision=0.1"])
+        self.assertTrue(arguments.until_steady)
+        self.assertTrue(arguments.batch_means.detects_warm_up)
+        self.assertEqual(0.1, arguments.precision)
+        self.assertEqual(100, Arguments(["test.mad", "25", "--until-steady", "--warm-up=100"]).batch_means.warm_up)
+
+    def test_parsing_stopping_rule(self):
+        self.assertIsNone(Arguments(["test.mad", "25"]).stopping_rule)
+
+        arguments = Arguments(["test.mad", "25", "--targets=DB:response time,Browser:reliability", "--precision=0.1"])
+        rule = arguments.stopping_rule
+        self.assertEqual([("DB", "response time"), ("Browser", "reliability")], rule.targets)
+        self.assertEqual((0.1, Arguments.DEFAULT_BUDGET), (rule.precision, rule.budget))
+        self.assertEqual(20, Arguments(["test.mad", "25", "--targets=DB:reliability", "--replications=20"]).stopping_rule.budget)
+
+        for each_option in ["--targets=DB", "--targets=:reliability,DB:throughput", "--precision=0"]:
+            with self.assertRaises(InvalidOption):
+                Arguments(["test.mad", "25", each_option])
+
+    def test_replications_write_in_their_own_directory(self):
+        with patch.object(Arguments, "_identifier", return_value="1"):
+            arguments = Arguments(["test.mad", "25", "--replications=3"])
+            replication = arguments.replication(2, 43)
+
+            self.assertEqual("test_1/replication-002/metrics.csv", replication.consolidated_report)
+            self.assertEqual((43, 1), (replication.seed, replication.replications))
+            self.assertEqual("test_1/summary.csv", arguments.summary_report)
+
+    def test_sweep_points_write_in_their_own_directory(self):
+        with patch.object(Arguments, "_identifier", return_value="1"):
+            arguments = Arguments(["test.mad", "25", "--sweep=sweep.json"])
+            replication = arguments.point(3).replication(1, 12)
+
+            self.assertEqual("sweep.json", arguments.sweep_file)
+            self.assertEqual("test_1/point-003/replication-001/metrics.csv", replication.consolidated_report)
+            self.assertIsNone(Arguments(["test.mad", "25"]).sweep_file)
+
+    def test_parsing_analyses(self):
+        arguments = AnalyseArguments(["run_1/", "run_2", "--slo=0.5", "--jobs=4"])
+        self.assertEqual(["run_1", "run_2"], arguments.directories)
+        self.assertEqual(0.5, arguments.slo)
+        self.assertEqual(4, arguments.jobs)
+
+        with self.assertRaises(InvalidOption):
+            AnalyseArguments(["run_1", "--slo=-1"])
+
     def test_output_directory_is_in_the_current_directory(self):
         Arguments._identifier = MagicMock(return_value="1")
 